@@ -0,0 +1,98 @@
+"""
+Benchmark of offering the blocks of a filter one by one, the list that get_next_block used to pop
+the front of against the candidate cursor, and of the highlight message made from every block
+against the entries kept by the cursor, on a catalogue made of copies of a lego catalogue.
+Example:
+    python benchmarks/bench_candidates.py
+"""
+import csv
+import os
+import sys
+import tempfile
+import timeit
+from os.path import abspath, dirname, join
+
+ROOT = dirname(dirname(abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from src.data_handler import DataHandler
+
+CATALOGUE = join(ROOT, "lego", "Lego_DB1_shuffle1.csv")
+
+
+def write_catalogue(path, copies):
+    """ Write a catalogue of copies of CATALOGUE, the copies spread out over the table.
+    """
+    with open(CATALOGUE, newline="") as f:
+        rows = list(csv.reader(f, delimiter=";"))
+    header, rows = rows[0], rows[1:]
+    x_idx, y_idx = header.index("X"), header.index("Y")
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f, delimiter=";")
+        writer.writerow(header)
+        for copy in range(copies):
+            for row in rows:
+                row = list(row)
+                row[x_idx] = "{:.3f}".format(float(row[x_idx]) + copy % 100)
+                row[y_idx] = "{:.3f}".format(float(row[y_idx]) + copy // 100)
+                writer.writerow(row)
+
+
+def highlight_message(data_handler):
+    """ The highlight message as the interpreter made it before the cursor.
+    """
+    msg = []
+    for item in data_handler.get_all_considered():
+        msg.append("{},{},{}".format(item["id"], item["x"][:5], item["y"][:5]))
+    return "{};{}$".format("hololens", ";".join(msg))
+
+
+def main(copies=(1, 10, 100, 1000)):
+    print("{:>8} {:>10} {:>14} {:>14} {:>14} {:>14}".format(
+        "rows", "blocks", "list pop(0)", "cursor next", "highlight", "kept entries"))
+    directory = tempfile.mkdtemp()
+    for count in copies:
+        path = join(directory, "catalogue_{}.csv".format(count))
+        write_catalogue(path, count)
+        data_handler = DataHandler(path)
+        os.remove(path)
+        data_handler.filter(["brick"])
+        blocks = len(data_handler.current_filter)
+
+        def run_list():
+            selection = list(data_handler.current_filter)
+            while selection:
+                block = selection.pop(0)
+                {"id": block[data_handler.id_idx], "x": block[data_handler.x_idx],
+                 "y": block[data_handler.y_idx]}
+
+        def run_cursor():
+            data_handler.filter(["brick"])
+            while data_handler.current_filter:
+                data_handler.get_next_block()
+
+        def run_kept():
+            # A block is taken, as after a "no", and the highlight is sent again
+            data_handler.get_next_block()
+            return "{};{}$".format("hololens", ";".join(data_handler.get_highlight()))
+
+        timings = [min(timeit.repeat(run, number=1, repeat=3)) * 1e3
+                   for run in (run_list, run_cursor)]
+
+        def highlighted():
+            data_handler.reset_filter()
+            data_handler.filter(["brick"])
+            data_handler.get_highlight()
+
+        highlighted()
+        assert run_kept() == highlight_message(data_handler)
+        number = min(10, blocks - 1)
+        timings += [min(timeit.repeat(run, highlighted, number=number, repeat=3)) / number * 1e3
+                    for run in (lambda: highlight_message(data_handler), run_kept)]
+        print("{:>8} {:>10} {:>11.3f} ms {:>11.3f} ms {:>11.3f} ms {:>11.3f} ms".format(
+            len(data_handler.data), blocks, *timings))
+    os.rmdir(directory)
+
+
+if __name__ == "__main__":
+    main()
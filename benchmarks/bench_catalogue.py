@@ -0,0 +1,96 @@
+"""
+Benchmark of loading a catalogue made of copies of a lego catalogue. Compares the CSV reader
+DataHandler used before with parsing the CSV into columns and with reading the columns from the
+cache file, for the catalogue alone and for the whole DataHandler constructor.
+Example:
+    python benchmarks/bench_catalogue.py
+"""
+import csv
+import re
+import shutil
+import sys
+import tempfile
+import timeit
+from os.path import abspath, dirname, join
+
+ROOT = dirname(dirname(abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from src.catalogue import load_catalogue
+from src.data_handler import DataHandler
+
+CATALOGUE = join(ROOT, "lego", "Lego_DB1_shuffle1.csv")
+
+
+def read_rows(path):
+    """ The rows as DataHandler read them before the catalogue, a regex and a lowercase copy of
+        every row.
+    """
+    with open(path, newline='') as csvfile:
+        raw_data = list(csv.reader(csvfile, delimiter=";"))
+    header = raw_data.pop(0)
+    nam_idx = header.index("#Name")
+    id_idx = [head.lower() for head in header].index("id")
+    data = []
+    for i, data_row in enumerate(raw_data):
+        data_row[id_idx] = str(i)
+        name = data_row[nam_idx]
+        if "Roof Tile" in name:
+            shape = "slope"
+        elif re.match(r"^Brick \d+[X]\d+", name, re.M | re.I):
+            shape = "regular"
+        else:
+            shape = "round"
+        data_row.append(shape)
+        data.append([cell.lower() for cell in data_row])
+    return data
+
+
+def write_catalogue(path, copies):
+    """ Write a catalogue of copies of CATALOGUE, the copies spread out over the table.
+    """
+    with open(CATALOGUE, newline="") as f:
+        rows = list(csv.reader(f, delimiter=";"))
+    header, rows = rows[0], rows[1:]
+    x_idx, y_idx = header.index("X"), header.index("Y")
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f, delimiter=";")
+        writer.writerow(header)
+        for copy in range(copies):
+            for row in rows:
+                row = list(row)
+                row[x_idx] = "{:.3f}".format(float(row[x_idx]) + copy % 100)
+                row[y_idx] = "{:.3f}".format(float(row[y_idx]) + copy // 100)
+                writer.writerow(row)
+
+
+def main():
+    directory = tempfile.mkdtemp()
+    cache_dir = join(directory, "cache")
+    print("{:>7} {:>12} {:>12} {:>12} {:>12} {:>14} {:>14}".format(
+        "rows", "csv reader", "columns", "from cache", "cache rows", "DataHandler",
+        "from cache"))
+    try:
+        for copies in (10, 100, 1000, 4000):
+            path = join(directory, "catalogue{}.csv".format(copies))
+            write_catalogue(path, copies)
+            # Writes the cache file
+            load_catalogue(path, cache_dir)
+
+            def run(function):
+                return min(timeit.repeat(function, number=1, repeat=3)) * 1e3
+
+            timings = (run(lambda: read_rows(path)),
+                       run(lambda: load_catalogue(path)),
+                       run(lambda: load_catalogue(path, cache_dir)),
+                       run(lambda: load_catalogue(path, cache_dir).rows()),
+                       run(lambda: DataHandler(path)),
+                       run(lambda: DataHandler(path, cache_dir=cache_dir)))
+            print("{:>7} {:>9.1f} ms {:>9.1f} ms {:>9.1f} ms {:>9.1f} ms {:>11.1f} ms "
+                  "{:>11.1f} ms".format(copies * 28, *timings))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main()
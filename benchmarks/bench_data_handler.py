@@ -0,0 +1,131 @@
+"""
+Benchmark of DataHandler.filter on a catalogue made of copies of a lego catalogue, the scan of
+every row that filter used to do against the inverted attribute index it uses now, without and
+with the filter cache. Then refinements of a description, filtered from scratch and from the
+result they refine.
+Example:
+    python benchmarks/bench_data_handler.py
+"""
+import csv
+import os
+import sys
+import tempfile
+import timeit
+from os.path import abspath, dirname, join
+
+ROOT = dirname(dirname(abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench_ngram_index import write_catalogue as write_varied_catalogue
+from src.data_handler import DataHandler
+
+CATALOGUE = join(ROOT, "lego", "Lego_DB1_shuffle1.csv")
+QUERIES = [["red"], ["bright red"], ["brick", "green"], ["yellow", "regular", "brick 2x4"]]
+REFINEMENTS = [(["brick"], ["green"]), (["round"], ["bright"]), (["red"], ["2x4"]),
+               (["brick", "dark"], ["regular"])]
+
+
+def scan_filter(data_handler, current_attributes):
+    """ The rows that filter selected before the index, every row scored on its own.
+    """
+    relevant = set(data_handler._get_attributes())
+    current_attributes = [attribute for attribute in current_attributes if
+                          attribute in relevant]
+    selected = []
+    for data_row in data_handler.data:
+        score = 0
+        for data_attribute in set(data_row[idx] for idx in
+                                  data_handler.searchable_fields_idx):
+            for filter_attribute in current_attributes:
+                if filter_attribute in data_attribute:
+                    score += 1
+                    break
+        if score >= len(current_attributes):
+            selected.append(data_row)
+    return selected
+
+
+def write_catalogue(path, copies):
+    """ Write a catalogue of copies of CATALOGUE, the copies spread out over the table.
+    """
+    with open(CATALOGUE, newline="") as f:
+        rows = list(csv.reader(f, delimiter=";"))
+    header, rows = rows[0], rows[1:]
+    x_idx, y_idx = header.index("X"), header.index("Y")
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f, delimiter=";")
+        writer.writerow(header)
+        for copy in range(copies):
+            for row in rows:
+                row = list(row)
+                row[x_idx] = "{:.3f}".format(float(row[x_idx]) + copy % 100)
+                row[y_idx] = "{:.3f}".format(float(row[y_idx]) + copy // 100)
+                writer.writerow(row)
+
+
+def filter_cache(copies):
+    """ The index filter without and with the filter cache.
+    """
+    print("{:>8} {:>14} {:>14} {:>14}".format("rows", "scan filter", "index filter", "cached"))
+    directory = tempfile.mkdtemp()
+    for count in copies:
+        path = join(directory, "catalogue_{}.csv".format(count))
+        write_catalogue(path, count)
+        data_handler = DataHandler(path, filter_cache_size=0)
+        cached = DataHandler(path)
+        os.remove(path)
+
+        def run_index(handler):
+            for query in QUERIES:
+                handler.reset_filter()
+                handler.filter(query)
+
+        def run_scan():
+            for query in QUERIES:
+                scan_filter(data_handler, query)
+
+        for query in QUERIES:
+            data_handler.reset_filter()
+            assert list(data_handler.filter(query)) == scan_filter(data_handler, query)
+        run_index(cached)
+        timings = [min(timeit.repeat(run, number=1, repeat=3)) / len(QUERIES) * 1e3
+                   for run in (run_scan, lambda: run_index(data_handler),
+                               lambda: run_index(cached))]
+        print("{:>8} {:>11.3f} ms {:>11.3f} ms {:>11.3f} ms".format(len(data_handler.data),
+                                                                   *timings))
+    print("Filter cache of the last catalogue: {}".format(cached.filters.stats()))
+    os.rmdir(directory)
+
+
+def refinements(copies=1000):
+    """ An attribute added to the result of the others, the way a user refines a description,
+        filtered from scratch and from the cached result it refines. On the catalogue of
+        bench_ngram_index, where an attribute can be contained in many distinct values.
+    """
+    directory = tempfile.mkdtemp()
+    path = join(directory, "catalogue.csv")
+    write_varied_catalogue(path, copies)
+    data_handler = DataHandler(path)
+    os.remove(path)
+    os.rmdir(directory)
+    print("{:>22} {:>11} {:>14} {:>14}".format("refinement", "parent rows", "from scratch",
+                                               "refined"))
+    for parent, added in REFINEMENTS:
+        attributes = tuple(sorted(parent + added))
+        result = data_handler._filter_result(tuple(sorted(parent)))
+        assert (data_handler._filter_result(attributes, result).selection ==
+                data_handler._filter_result(attributes).selection)
+        timings = [min(timeit.repeat(run, number=10, repeat=3)) / 10 * 1e3 for run in
+                   (lambda: data_handler._filter_result(attributes),
+                    lambda: data_handler._filter_result(attributes, result))]
+        print("{:>22} {:>11} {:>11.3f} ms {:>11.3f} ms".format(
+            " + ".join(parent + added), bin(result.rows).count("1"), *timings))
+
+
+def main(copies=(1, 10, 100, 1000)):
+    filter_cache(copies)
+    print()
+    refinements()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Benchmark of finding the catalogue values that contain an attribute, on a synthetic catalogue
+1000 times the size of lego/Lego_DB1_shuffle1.csv. Compares the substring test against every
+searchable cell that DataHandler._score does, a scan of the distinct values, and the n-gram
+index DataHandler uses now.
+Example:
+    python benchmarks/bench_ngram_index.py
+"""
+import csv
+import os
+import random
+import re
+import sys
+import tempfile
+import timeit
+import zlib
+from os.path import abspath, dirname, join
+
+ROOT = dirname(dirname(abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from src.data_handler import DataHandler
+from src.ngram_index import NgramIndex
+
+CATALOGUE = join(ROOT, "lego", "Lego_DB1_shuffle1.csv")
+SHADES = ["Bright", "Dark", "Medium", "Light", "Transparent", "Sand", "Pearl", "Metallic"]
+COLORS = ["Red", "Green", "Blue", "Yellow", "Orange", "Purple", "Brown", "Grey", "White", "Black"]
+QUERIES = ["red", "bright red", "brick", "2x4", "roof tile", "x1", "w/bow", "round", "e"]
+
+
+def write_catalogue(path, copies, seed=1):
+    """ Write a catalogue of copies of CATALOGUE where each copy gets new part sizes and colors,
+        so that the number of distinct values grows with the catalogue like in a real one.
+    """
+    rand = random.Random(seed)
+    with open(CATALOGUE, newline="") as f:
+        rows = list(csv.reader(f, delimiter=";"))
+    header, rows = rows[0], rows[1:]
+    name, color = header.index("#Name"), header.index("#Color")
+    shade, rgb = header.index("#Descriptive Color"), header.index("#Color RGB")
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f, delimiter=";")
+        writer.writerow(header)
+        for _ in range(copies):
+            for row in rows:
+                row = list(row)
+                row[name] = re.sub(r"\d+X\d+", lambda _: "{}X{}".format(rand.randint(1, 16),
+                                                                         rand.randint(1, 16)),
+                                   row[name])
+                row[color] = rand.choice(COLORS)
+                row[shade] = "{} {}".format(rand.choice(SHADES), row[color])
+                row[rgb] = "{:06X}".format(zlib.crc32(row[shade].encode("utf-8")) & 0xFFFFFF)
+                writer.writerow(row)
+
+
+def main(copies=1000):
+    directory = tempfile.mkdtemp()
+    path = join(directory, "catalogue.csv")
+    write_catalogue(path, copies)
+    data_handler = DataHandler(path)
+    os.remove(path)
+    os.rmdir(directory)
+    cells = [data_row[idx] for data_row in data_handler.data for idx in
+             data_handler.searchable_fields_idx]
+    values = list(data_handler.attributes.postings)
+    ngrams = NgramIndex()
+    for value in values:
+        ngrams.add(value)
+    print("{} rows, {} searchable cells, {} distinct values".format(
+        len(data_handler.data), len(cells), len(values)))
+    print("{:>12} {:>8} {:>14} {:>14} {:>14} {:>14}".format(
+        "query", "values", "every cell", "every value", "n-gram index", "filter"))
+    for query in QUERIES:
+        expected = sorted(value for value in values if query in value)
+        assert sorted(ngrams.containing(query)) == expected
+
+        def run(function, number):
+            return min(timeit.repeat(function, number=number, repeat=3)) / number * 1e3
+
+        def cold_filter():
+            # Without the attributes remembered from earlier filters
+            data_handler.attributes.containing = {}
+            data_handler.reset_filter()
+            data_handler.filter([query])
+
+        timings = (run(lambda: [cell for cell in cells if query in cell], 3),
+                   run(lambda: [value for value in values if query in value], 10),
+                   run(lambda: ngrams.containing(query), 100),
+                   run(cold_filter, 10))
+        print("{:>12} {:>8} {:>11.3f} ms {:>11.3f} ms {:>11.3f} ms {:>11.3f} ms".format(
+            query, len(expected), *timings))
+
+
+if __name__ == "__main__":
+    main()
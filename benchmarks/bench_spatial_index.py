@@ -0,0 +1,63 @@
+"""
+Benchmark of the nearest-object lookup, the linear scan that Interpreter._disambiguate and
+DataHandler.update used to do against the GridIndex they use now.
+Example:
+    python benchmarks/bench_spatial_index.py
+"""
+import math
+import random
+import sys
+import timeit
+from os.path import abspath, dirname
+
+sys.path.insert(0, dirname(dirname(abspath(__file__))))
+
+from src.spatial_index import MATCH_TOLERANCE, GridIndex
+
+
+def scan_nearest(points, x, y):
+    """ The nearest object as found before the index, first object wins ties.
+    """
+    min_dist = 1000
+    nearest = None
+    for i, (px, py) in enumerate(points):
+        dist = math.sqrt((px - x) ** 2 + (py - y) ** 2)
+        if dist < min_dist:
+            min_dist = dist
+            nearest = i
+    return nearest
+
+
+def scan_within(points, x, y, radius):
+    return [i for i, (px, py) in enumerate(points)
+            if math.sqrt((px - x) ** 2 + (py - y) ** 2) <= radius]
+
+
+def main(sizes=(10, 100, 1000, 10000), queries=1000, seed=1):
+    rand = random.Random(seed)
+    print("{:>8} {:>14} {:>14} {:>14} {:>14}".format("objects", "scan nearest", "grid nearest",
+                                                     "scan within", "grid within"))
+    for size in sizes:
+        # Objects spread over a table of roughly a meter per 1000 objects, like the lego scene
+        side = max(1.0, math.sqrt(size / 1000.0))
+        points = [(rand.uniform(0, side), rand.uniform(0, side)) for _ in range(size)]
+        index = GridIndex()
+        for i, (x, y) in enumerate(points):
+            index.insert(i, x, y)
+        gaze = [(rand.uniform(0, side), rand.uniform(0, side)) for _ in range(queries)]
+        for x, y in gaze[:100]:
+            assert index.nearest(x, y, 1000)[0] == scan_nearest(points, x, y)
+
+        def run(function):
+            return min(timeit.repeat(lambda: [function(x, y) for x, y in gaze],
+                                     number=1, repeat=3)) / queries * 1e6
+
+        timings = (run(lambda x, y: scan_nearest(points, x, y)),
+                   run(lambda x, y: index.nearest(x, y, 1000)),
+                   run(lambda x, y: scan_within(points, x, y, MATCH_TOLERANCE)),
+                   run(lambda x, y: index.within(x, y, MATCH_TOLERANCE)))
+        print("{:>8} {:>11.1f} us {:>11.1f} us {:>11.1f} us {:>11.1f} us".format(size, *timings))
+
+
+if __name__ == "__main__":
+    main()
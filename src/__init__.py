@@ -1,4 +1,5 @@
 from .kernel import Kernel
 from .server import Server
 from .client import Client
+from .async_client import AsyncClient, SyncClient
 from .data_handler import DataHandler
\ No newline at end of file
@@ -0,0 +1,348 @@
+""" In-process clients for the kernel server. The clients own the socket directly and deliver
+    whole frames, i.e. one message at a time without the end-message symbol, to the owner.
+
+    AsyncClient is used from asyncio code, either with a callback or as an async iterator:
+
+        client = AsyncClient("the_architecture")
+        await client.connect()
+        client.send("interpreter", 'data;{"P1GP": [0.3, 0.1]}')
+        async for message in client:
+            ...
+
+    SyncClient runs an AsyncClient in a background thread and can be used from any thread.
+"""
+
+import asyncio
+import platform
+import queue
+import socket
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from subprocess import check_output
+
+from .client import RECONNECT_RESET, backoff_delays
+from .framing import TERMINATOR, TEXT_MESSAGE, BinaryFrameBuffer, FrameBuffer, encode_frame
+
+
+def get_local_ip(system):
+    """ The socket.gethostbyname(socket.gethostname()) - method does, apparently, not work on
+        the raspberry pi. The call only returns the "localhost" address so we need some extra
+        work to be able to detect the ip.
+    """
+    if system == "Linux":
+        # This is a bit ugly but it works
+        ips = check_output(['hostname', '--all-ip-addresses']).decode("utf-8")
+        return ips.split(" ")[0]
+    else:
+        return socket.gethostbyname(socket.gethostname())
+
+
+class AsyncClient(object):
+    """ An asyncio client of the kernel server.
+        Messages are delivered to on_message if it is given and can otherwise be read by iterating
+        over the client. With text framing a message is a String, e.g. 'pick;0.31;0.12', with
+        binary framing it is a framing.BinaryFrame. on_message is called with None, and the
+        iteration stops, when the connection is closed.
+        If the server goes away the client reconnects with exponential backoff and presents
+        itself again. The backoff also applies to the first attempt after a lost connection, and
+        only starts over once a connection has lasted RECONNECT_RESET seconds, so a client whose
+        connections keep being closed doesn't reconnect in a tight loop. Messages sent in the
+        meantime are kept in a ring buffer of buffer_size messages, the oldest are dropped if it
+        fills up, and are sent once the connection is back.
+        The server logs a client that presents itself while another connection with the same
+        client_type is open, unless multiple is True, e.g. for one of several hololenses.
+    """
+    def __init__(self,
+                 client_type,
+                 host="localhost",
+                 port=5000,
+                 topics=(),
+                 binary=False,
+                 on_message=None,
+                 reconnect=True,
+                 connection_attempts=None,
+                 buffer_size=1000,
+                 multiple=False):
+        self.client_type = client_type
+        if host == "localhost":
+            host = get_local_ip(platform.system())
+        self.host = host
+        self.port = port
+        self.topics = list(topics)
+        self.binary = binary
+        self.multiple = multiple
+        self.on_message = on_message
+        self.reconnect = reconnect
+        self.connection_attempts = connection_attempts
+        self.recv_buffer = 4096
+        self.reader = None
+        self.writer = None
+        self.frame_buffer = None
+        self.messages = None
+        self.read_task = None
+        self.closing = False
+        # Messages sent while the client is disconnected
+        self.pending = deque(maxlen=buffer_size)
+        # The delays before reconnecting after a lost connection
+        self.backoff = backoff_delays()
+        self.connected_at = None
+
+    @property
+    def connected(self):
+        return self.writer is not None and not self.writer.transport.is_closing()
+
+    async def connect(self):
+        """ Connect to the server and present the client. Raises OSError if the server could not
+            be reached in connection_attempts attempts.
+            param: N/A
+            return: None
+        """
+        if self.messages is None:
+            # Created here so that the queue belongs to the loop the client runs in
+            self.messages = asyncio.Queue()
+        await self._open()
+        self.read_task = asyncio.ensure_future(self._read_loop())
+
+    async def _open(self):
+        """ Open the connection, waiting a little longer after each failed attempt, present the
+            client and send what was buffered while disconnected.
+        """
+        attempt = 0
+        for delay in backoff_delays():
+            attempt += 1
+            try:
+                reader, writer = await asyncio.open_connection(self.host, self.port)
+                break
+            except OSError:
+                print("Unable to connect to server {} at port {}. Trial {}/{}"\
+                      .format(self.host, self.port, attempt, self.connection_attempts))
+                if self.closing or (self.connection_attempts is not None and
+                                    attempt >= self.connection_attempts):
+                    raise
+            await asyncio.sleep(delay)
+        self.frame_buffer = BinaryFrameBuffer() if self.binary else FrameBuffer()
+        writer.write(self._handshake())
+        while self.pending:
+            writer.write(self.pending.popleft())
+        self.reader, self.writer = reader, writer
+        self.connected_at = time.monotonic()
+
+    def _handshake(self):
+        fields = ["client_type", self.client_type]
+        if self.topics:
+            fields.append("topics=" + ",".join(self.topics))
+        if self.binary:
+            fields.append("framing=binary")
+        if self.multiple:
+            fields.append("multiple")
+        return ";".join(fields).encode("utf-8") + TERMINATOR
+
+    async def _read_loop(self):
+        """ Read from the socket and deliver every complete frame. Reconnect when the connection
+            is lost, unless the client is closing.
+        """
+        while True:
+            await self._read_until_closed()
+            self.writer = None
+            if self.closing or not self.reconnect:
+                break
+            if time.monotonic() - self.connected_at >= RECONNECT_RESET:
+                self.backoff = backoff_delays()
+            delay = next(self.backoff)
+            print("Disconnected from server, reconnecting in {:.2f} s".format(delay))
+            await asyncio.sleep(delay)
+            try:
+                await self._open()
+            except OSError:
+                break
+        self._deliver(None)
+
+    async def _read_until_closed(self):
+        while True:
+            try:
+                data = await self.reader.read(self.recv_buffer)
+            except OSError:
+                data = b""
+            if not data:
+                break
+            self.frame_buffer.feed(data)
+            frame = self.frame_buffer.next_frame()
+            while frame is not None:
+                if not self.binary:
+                    frame = frame.decode("utf-8", "replace")
+                self._deliver(frame)
+                frame = self.frame_buffer.next_frame()
+
+    def _deliver(self, message):
+        if self.on_message is None:
+            self.messages.put_nowait(message)
+            return
+        try:
+            self.on_message(message)
+        except Exception:
+            # A failing handler must not take the connection down
+            traceback.print_exc()
+
+    def send(self, recipient, payload, msg_type=TEXT_MESSAGE):
+        """ Send a message to a client, or the subscribers of a topic, through the server.
+            param: recipient [String]
+                   payload [String or bytes]
+                   msg_type [int, only used with binary framing]
+            return: None
+        """
+        if not isinstance(payload, (bytes, bytearray, memoryview)):
+            payload = payload.encode("utf-8")
+        if self.binary:
+            data = encode_frame(msg_type, recipient, payload)
+        else:
+            data = recipient.encode("utf-8") + b";" + bytes(payload) + TERMINATOR
+        if self.connected:
+            self.writer.write(data)
+        else:
+            self.pending.append(data)
+
+    def subscribe(self, topic):
+        """ Subscribe to a topic. The subscription is renewed when the client reconnects.
+            param: topic [String]
+            return: None
+        """
+        if topic not in self.topics:
+            self.topics.append(topic)
+            self.send("server", "subscribe;{}".format(topic))
+
+    async def drain(self):
+        """ Wait until the data written by send has been handed to the socket.
+        """
+        if self.writer is not None:
+            await self.writer.drain()
+
+    async def close(self):
+        """ Tell the server that the client is leaving and close the connection.
+        """
+        self.closing = True
+        if self.connected:
+            if self.binary:
+                self.send("close me", b"")
+            else:
+                self.writer.write(b"close me" + TERMINATOR)
+            await self.writer.drain()
+            self.writer.close()
+        elif self.read_task is not None:
+            # Stop waiting for the server to come back
+            self.read_task.cancel()
+        if self.read_task is not None:
+            try:
+                await self.read_task
+            except asyncio.CancelledError:
+                pass
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        message = await self.messages.get()
+        if message is None:
+            raise StopAsyncIteration
+        return message
+
+
+class SyncClient(object):
+    """ A thread safe client of the kernel server for code that does not use asyncio. The
+        connection is handled by an AsyncClient running in a background thread. Messages are
+        delivered to on_message, called in the background thread, if it is given and are
+        otherwise read with receive(). See AsyncClient for the reconnection parameters.
+    """
+    def __init__(self,
+                 client_type,
+                 host="localhost",
+                 port=5000,
+                 topics=(),
+                 binary=False,
+                 on_message=None,
+                 reconnect=True,
+                 connection_attempts=None,
+                 buffer_size=1000,
+                 multiple=False):
+        self.on_message = on_message
+        self.messages = queue.Queue()
+        self.loop = asyncio.new_event_loop()
+        self.client = AsyncClient(client_type, host, port, topics, binary,
+                                  on_message=self._deliver,
+                                  reconnect=reconnect,
+                                  connection_attempts=connection_attempts,
+                                  buffer_size=buffer_size,
+                                  multiple=multiple)
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def start(self, timeout=None):
+        """ Start the background thread and connect to the server.
+            param: timeout [float, seconds]
+            return: None
+        """
+        self.thread.start()
+        future = asyncio.run_coroutine_threadsafe(self.client.connect(), self.loop)
+        try:
+            future.result(timeout)
+        except OSError:
+            print("Unable to connect to server {} at port {}".format(self.client.host,
+                                                                     self.client.port))
+            sys.exit()
+
+    def _deliver(self, message):
+        if self.on_message is None:
+            self.messages.put(message)
+        else:
+            self.on_message(message)
+
+    def send(self, recipient, payload, msg_type=TEXT_MESSAGE):
+        """ Send a message, see AsyncClient.send. Can be called from any thread.
+        """
+        self.loop.call_soon_threadsafe(self.client.send, recipient, payload, msg_type)
+
+    def subscribe(self, topic):
+        """ Subscribe to a topic, see AsyncClient.subscribe. Can be called from any thread.
+        """
+        self.loop.call_soon_threadsafe(self.client.subscribe, topic)
+
+    def receive(self, timeout=None, block=True):
+        """ Return the next message, or None if the connection is closed or no message arrived
+            within the timeout.
+            param: timeout [float, seconds]
+                   block [bool]
+            return: message [String, BinaryFrame or None]
+        """
+        try:
+            return self.messages.get(block, timeout)
+        except queue.Empty:
+            return None
+
+    def receive_many(self, max_messages=None, timeout=None):
+        """ Wait for the next message and return it together with the messages that are already
+            waiting, oldest first. A None in the list means that the connection is closed.
+            param: max_messages [int]
+                   timeout [float, seconds]
+            return: messages [list, empty if no message arrived within the timeout]
+        """
+        messages = []
+        try:
+            messages.append(self.messages.get(True, timeout))
+            while messages[-1] is not None and (max_messages is None or
+                                                len(messages) < max_messages):
+                messages.append(self.messages.get_nowait())
+        except queue.Empty:
+            pass
+        return messages
+
+    def close(self, timeout=None):
+        """ Close the connection and stop the background thread.
+        """
+        future = asyncio.run_coroutine_threadsafe(self.client.close(), self.loop)
+        future.result(timeout)
+        self.loop.call_soon_threadsafe(self.loop.stop)
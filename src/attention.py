@@ -0,0 +1,544 @@
+""" The attention model of the interpreter, i.e. the objects seen by the vision system together
+    with the attention they have been given.
+"""
+
+import time
+from array import array
+from itertools import compress
+
+from .spatial_index import GridIndex
+
+# The attributes every block has, anything else that arrives in an update message is kept in extra
+COLUMNS = ("x", "y", "c", "at", "include")
+
+# With a half-life the weight of new gaze doubles every half-life, the attention is rescaled
+# before it has doubled this many times
+REBASE_DOUBLINGS = 64
+
+
+class Block(object):
+    """ A view of one object in the attention table. A block can be read and written like the
+        dictionaries the table used to hold, e.g. block["lh"], or through its attributes.
+    """
+    __slots__ = ("table", "id")
+
+    def __init__(self, table, bid):
+        self.table = table
+        self.id = bid
+
+    def __getattr__(self, key):
+        if key in COLUMNS:
+            return getattr(self.table, key)[self.table.slots[self.id]]
+        if key == "lh":
+            return self.table.likelihood(self.table.slots[self.id])
+        raise AttributeError(key)
+
+    def __setattr__(self, key, value):
+        if key in Block.__slots__:
+            object.__setattr__(self, key, value)
+        elif key in COLUMNS:
+            self.table.set(self.id, key, value)
+        else:
+            raise AttributeError(key)
+
+    def __getitem__(self, key):
+        if key == "id":
+            return self.id
+        if key in COLUMNS:
+            return getattr(self.table, key)[self.table.slots[self.id]]
+        if key == "lh":
+            return self.table.likelihood(self.table.slots[self.id])
+        extra = self.table.extra[self.table.slots[self.id]]
+        if extra is not None and key in extra:
+            return extra[key]
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        self.table.set(self.id, key, value)
+
+    def __contains__(self, key):
+        if key == "id" or key == "lh" or key in COLUMNS:
+            return True
+        extra = self.table.extra[self.table.slots[self.id]]
+        return extra is not None and key in extra
+
+    def __eq__(self, other):
+        return isinstance(other, Block) and other.table is self.table and other.id == self.id
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self.id)
+
+    def as_dict(self):
+        """ Return the block as a dictionary.
+            param: N/A
+            return: [dictionary]
+        """
+        return self.table.row(self.table.slots[self.id])
+
+
+class GazeHistory(object):
+    """ The latest gaze hits, (time, block, weight), in a ring buffer of capacity hits. The
+        arrays are allocated up front and a full buffer drops its oldest hit, so the memory
+        used does not grow with the length of a session.
+    """
+    def __init__(self, capacity=4096):
+        self.capacity = capacity
+        self.times = array("d", [0.0]) * capacity
+        self.weights = array("d", [0.0]) * capacity
+        self.blocks = [None] * capacity
+        self.start = 0
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def oldest(self):
+        """ Return the time of the oldest hit.
+            param: N/A
+            return: [float]
+        """
+        return self.times[self.start]
+
+    def push(self, now, block, weight):
+        """ Add a hit.
+            param: now [float, seconds]
+                   block [the key of the block]
+                   weight [float]
+            return: [(block, weight) of the hit that was dropped to make room, or None]
+        """
+        dropped = None
+        if self.size == self.capacity:
+            dropped = self.pop()
+        end = (self.start + self.size) % self.capacity
+        self.times[end] = now
+        self.weights[end] = weight
+        self.blocks[end] = block
+        self.size += 1
+        return dropped
+
+    def pop(self):
+        """ Remove the oldest hit.
+            param: N/A
+            return: (block, weight)
+        """
+        start = self.start
+        hit = (self.blocks[start], self.weights[start])
+        self.blocks[start] = None
+        self.start = (start + 1) % self.capacity
+        self.size -= 1
+        return hit
+
+    def scale(self, factor):
+        """ Multiply the weight of every hit by factor.
+        """
+        weights = self.weights
+        for i in range(self.capacity):
+            weights[i] *= factor
+
+    def clear(self):
+        """ Remove every hit.
+        """
+        self.blocks = [None] * self.capacity
+        self.start = 0
+        self.size = 0
+
+
+class AttentionTable(object):
+    """ The blocks of the attention model stored as parallel columns, one entry per block in the
+        order the blocks were first seen, with an index from block id to position (slot).
+        version is increased whenever a block is added or removed or its position or color
+        changes, so that derived data such as arrays know when to rebuild. The positions are also
+        kept in a spatial index that is updated as the blocks move.
+
+        The likelihood of a block is not stored. Among the included blocks it is at/tot_att, or
+        1/n_included while no included block has any attention, and it is 0 for the others.
+        n_included, tot_att and the slot of the most likely block are kept up to date as the
+        attention and the include flags change, so reading the best block costs constant time.
+
+        By default at counts every gaze hit since the last forget(). With a window only the hits
+        of the last window seconds count, they are kept in a GazeHistory of history_size hits.
+        With a half_life (in seconds) a hit counts half as much as one half_life newer. The
+        likelihoods only depend on the ratios of the attention, so rather than decaying the
+        old attention every hit is added with a weight that doubles every half_life.
+    """
+    def __init__(self, window=None, half_life=None, history_size=4096):
+        self.slots = {}
+        self.ids = []
+        self.x = []
+        self.y = []
+        self.c = []
+        self.at = []
+        self.include = []
+        self.extra = []
+        self.version = 0
+        self.spatial = GridIndex()
+        # Number of included blocks and the sum of their attention
+        self.n_included = 0
+        self.tot_att = 0
+        # Slot of the block with the highest likelihood, None if it has to be searched for
+        self.best_slot = None
+        self.window = window
+        self.half_life = half_life
+        # The time at which a hit has the weight 1
+        self.origin = None
+        self.history = GazeHistory(history_size) if window is not None else None
+        # Block id -> a number that is new every time a block with the id is added, so that the
+        # hits of a removed block are not taken from a later block with the same id
+        self.serials = {}
+        self.added = 0
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __bool__(self):
+        return bool(self.ids)
+
+    def __iter__(self):
+        return (Block(self, bid) for bid in self.ids)
+
+    def __contains__(self, bid):
+        return bid in self.slots
+
+    def get(self, bid):
+        """ Return the block with the given id, or None.
+            param: bid [id of the block]
+            return: [Block or None]
+        """
+        if bid in self.slots:
+            return Block(self, bid)
+        return None
+
+    def set(self, bid, key, value):
+        """ Set one attribute of a block.
+            param: bid [id of the block]
+                   key [String]
+                   value [any]
+            return: None
+        """
+        slot = self.slots[bid]
+        if key == "at":
+            self._set_attention(slot, value)
+        elif key == "include":
+            self._set_include(slot, value)
+        elif key in COLUMNS:
+            getattr(self, key)[slot] = value
+            self.version += 1
+            if key in ("x", "y") and bid in self.spatial:
+                self.spatial.move(bid, self.x[slot], self.y[slot])
+        elif key not in ("id", "lh"):
+            if self.extra[slot] is None:
+                self.extra[slot] = {}
+            self.extra[slot][key] = value
+
+    def _set_attention(self, slot, value):
+        old = self.at[slot]
+        self.at[slot] = value
+        if self.include[slot]:
+            if value >= old:
+                self.tot_att += value - old
+                self._consider(slot)
+            else:
+                self._reduce_total(old - value)
+                if slot == self.best_slot:
+                    self.best_slot = None
+
+    def _set_include(self, slot, value):
+        value = bool(value)
+        if value == self.include[slot]:
+            return
+        self.include[slot] = value
+        if value:
+            self.n_included += 1
+            self.tot_att += self.at[slot]
+            if self.n_included == 1:
+                # The other blocks all had a likelihood of 0
+                self.best_slot = None
+            self._consider(slot)
+        else:
+            self.n_included -= 1
+            self._reduce_total(self.at[slot])
+            if slot == self.best_slot:
+                self.best_slot = None
+
+    def _reduce_total(self, amount):
+        """ Subtract amount from tot_att. Weighted attention is a float, so the total is summed
+            again when most of it is subtracted, before the rounding errors become significant.
+        """
+        self.tot_att -= amount
+        if self.tot_att < amount * 1e-6:
+            self.tot_att = sum(compress(self.at, self.include))
+
+    def _consider(self, slot):
+        """ Make the included block in slot the best block if it now has a higher likelihood.
+        """
+        best = self.best_slot
+        if best is None:
+            return
+        at = self.at
+        if not self.include[best] or at[slot] > at[best] or (at[slot] == at[best] and
+                                                             slot < best):
+            self.best_slot = slot
+
+    def add_attention(self, slot, now=None):
+        """ Give the block in slot one more gaze hit.
+            param: slot [int]
+                   now [float, the time of the hit as given by time.monotonic()]
+            return: None
+        """
+        weight = 1
+        if self.history is not None or self.half_life is not None:
+            if now is None:
+                now = time.monotonic()
+            if self.half_life is not None:
+                weight = self._weight(now)
+            if self.history is not None:
+                self.expire(now)
+                dropped = self.history.push(now, (self.ids[slot], self.serials[self.ids[slot]]),
+                                            weight)
+                if dropped is not None:
+                    self._take_attention(*dropped)
+        self.at[slot] += weight
+        if self.include[slot]:
+            self.tot_att += weight
+            self._consider(slot)
+
+    def _weight(self, now):
+        """ The weight of a hit at time now, relative to the origin.
+        """
+        if self.origin is None:
+            self.origin = now
+        doublings = (now - self.origin) / self.half_life
+        if doublings > REBASE_DOUBLINGS:
+            # Move the origin to now, the ratios and thereby the likelihoods stay the same
+            factor = 2.0 ** -doublings
+            self.at = [value * factor for value in self.at]
+            if self.history is not None:
+                self.history.scale(factor)
+            self.tot_att = sum(compress(self.at, self.include))
+            self.origin = now
+            return 1.0
+        return 2.0 ** doublings
+
+    def expire(self, now=None):
+        """ Take away the attention of the hits that are older than the window.
+            param: now [float, as given by time.monotonic()]
+            return: None
+        """
+        history = self.history
+        if history is None or not history.size:
+            return
+        if now is None:
+            now = time.monotonic()
+        limit = now - self.window
+        while history.size and history.oldest() <= limit:
+            self._take_attention(*history.pop())
+        if not history.size:
+            # Get rid of the rounding errors of the weights that have come and gone
+            self.tot_att = sum(compress(self.at, self.include))
+
+    def _take_attention(self, block, weight):
+        bid, serial = block
+        if self.serials.get(bid) != serial:
+            # The block has been removed
+            return
+        slot = self.slots[bid]
+        value = self.at[slot] - weight
+        if value < weight * 1e-9:
+            value = 0
+        self._set_attention(slot, value)
+
+    def set_include(self, include):
+        """ Replace the include flags of every block.
+            param: include [list of bool, one per slot]
+            return: None
+        """
+        self.include = include
+        self.n_included = include.count(True)
+        self.tot_att = sum(compress(self.at, include))
+        self.best_slot = None
+
+    def upsert(self, values):
+        """ Update the block with the id given in values, or add it if it is new.
+            param: values [dictionary, must contain "id"]
+            return: block [Block]
+        """
+        bid = values["id"]
+        new = bid not in self.slots
+        if new:
+            self.slots[bid] = len(self.ids)
+            self.ids.append(bid)
+            self.x.append(0.0)
+            self.y.append(0.0)
+            self.c.append(None)
+            self.at.append(0)
+            self.include.append(True)
+            self.extra.append(None)
+            self.serials[bid] = self.added
+            self.added += 1
+            self.n_included += 1
+            if self.n_included == 1:
+                self.best_slot = None
+            self._consider(self.slots[bid])
+        for key, value in values.items():
+            self.set(bid, key, value)
+        if new:
+            slot = self.slots[bid]
+            self.spatial.insert(bid, self.x[slot], self.y[slot])
+        self.version += 1
+        return Block(self, bid)
+
+    def remove(self, bid):
+        """ Remove the block with the given id. The order of the other blocks is kept, which
+            makes this linear in the size of the table.
+            param: bid [id of the block]
+            return: [dictionary or None, the removed block]
+        """
+        slot = self.slots.pop(bid, None)
+        if slot is None:
+            return None
+        block = self.row(slot)
+        self.spatial.remove(bid)
+        del self.serials[bid]
+        included, at = self.include[slot], self.at[slot]
+        for column in (self.ids, self.x, self.y, self.c, self.at, self.include, self.extra):
+            del column[slot]
+        if included:
+            self.n_included -= 1
+            self._reduce_total(at)
+        for i in range(slot, len(self.ids)):
+            self.slots[self.ids[i]] = i
+        if self.best_slot is not None:
+            if self.best_slot == slot:
+                self.best_slot = None
+            elif self.best_slot > slot:
+                self.best_slot -= 1
+        self.version += 1
+        return block
+
+    def forget(self):
+        """ Reset the attention of every block.
+            param: N/A
+            return: None
+        """
+        size = len(self.ids)
+        self.at = [0] * size
+        self.include = [True] * size
+        self.origin = None
+        if self.history is not None:
+            self.history.clear()
+        self.n_included = size
+        self.tot_att = 0
+        self.best_slot = 0 if size else None
+
+    def nearest(self, x, y, max_dist=None):
+        """ Return the slot of the block closest to (x, y), ties go to the block seen first.
+            param: x, y [float]
+                   max_dist [float, only blocks strictly closer than this are considered]
+            return: [int or None]
+        """
+        bid, _ = self.spatial.nearest(x, y, max_dist)
+        if bid is None:
+            return None
+        return self.slots[bid]
+
+    def likelihood(self, slot):
+        """ Return the likelihood of the block in slot.
+            param: slot [int]
+            return: [float]
+        """
+        if not self.include[slot]:
+            return 0.0
+        if self.tot_att:
+            return self.at[slot]/float(self.tot_att)
+        return 1/float(self.n_included)
+
+    @property
+    def lh(self):
+        """ The likelihoods of all blocks, in slot order.
+        """
+        return [self.likelihood(slot) for slot in range(len(self.ids))]
+
+    def row(self, slot):
+        """ Return the block in the given slot as a dictionary.
+            param: slot [int]
+            return: [dictionary]
+        """
+        block = {"id": self.ids[slot], "x": self.x[slot], "y": self.y[slot], "c": self.c[slot],
+                 "at": self.at[slot], "include": self.include[slot], "lh": self.likelihood(slot)}
+        if self.extra[slot]:
+            block.update(self.extra[slot])
+        return block
+
+    def best(self):
+        """ Return the block with the highest likelihood. Ties go to the block seen first.
+            param: N/A
+            return: [Block or None]
+        """
+        if not self.ids:
+            return None
+        if self.best_slot is None:
+            # The included block with the most attention, or the first block if none is included
+            self.best_slot = max(compress(range(len(self.ids)), self.include),
+                                 key=self.at.__getitem__, default=0)
+        return Block(self, self.ids[self.best_slot])
+
+    def snapshot(self):
+        """ Return a copy of the table as a list of dictionaries.
+            param: N/A
+            return: [list of dictionaries]
+        """
+        return [self.row(slot) for slot in range(len(self.ids))]
+
+    def state(self, now=None):
+        """ Return the contents of the table, including the gaze history, as plain lists and
+            dictionaries that can be stored as JSON. The times are stored as ages, seconds before
+            now, since time.monotonic() starts over when the machine restarts.
+            param: now [float, as given by time.monotonic()]
+            return: [dictionary]
+        """
+        if now is None:
+            now = time.monotonic()
+        history = []
+        if self.history is not None:
+            gaze = self.history
+            for i in range(gaze.size):
+                j = (gaze.start + i) % gaze.capacity
+                bid, serial = gaze.blocks[j]
+                if self.serials.get(bid) == serial:
+                    history.append([now - gaze.times[j], bid, gaze.weights[j]])
+        origin_age = None if self.origin is None else now - self.origin
+        return {"ids": list(self.ids), "x": list(self.x), "y": list(self.y), "c": list(self.c),
+                "at": list(self.at), "include": list(self.include), "extra": list(self.extra),
+                "window": self.window, "half_life": self.half_life, "origin_age": origin_age,
+                "history": history}
+
+    def restore(self, state, now=None):
+        """ Fill an empty table with the contents returned by state(). The attention is only
+            restored if the table has the same window and half-life as the one it came from. The
+            ages in the state are taken to be relative to now.
+            param: state [dictionary]
+                   now [float, as given by time.monotonic()]
+            return: None
+        """
+        if now is None:
+            now = time.monotonic()
+        for i, bid in enumerate(state["ids"]):
+            values = {"id": bid, "x": state["x"][i], "y": state["y"][i], "c": state["c"][i]}
+            if state["extra"][i]:
+                values.update(state["extra"][i])
+            self.upsert(values)
+        if state["window"] != self.window or state["half_life"] != self.half_life:
+            return
+        self.at = list(state["at"])
+        self.origin = None if state["origin_age"] is None else now - state["origin_age"]
+        if self.history is not None:
+            for age, bid, weight in state["history"]:
+                dropped = self.history.push(now - age, (bid, self.serials[bid]), weight)
+                if dropped is not None:
+                    bid, _ = dropped[0]
+                    slot = self.slots[bid]
+                    self.at[slot] = max(0, self.at[slot] - dropped[1])
+        self.set_include(list(state["include"]))
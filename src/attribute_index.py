@@ -0,0 +1,196 @@
+""" An inverted index from the values of the searchable fields of the catalogue to the rows that
+    hold them, used by DataHandler to filter the catalogue on the attributes a user mentions.
+"""
+from itertools import compress
+
+from .ngram_index import NgramIndex
+
+_SELECTORS = bytes.maketrans(b"01", b"\x00\x01")
+
+
+def compress_bits(items, bits):
+    """ Return the items at the positions of the set bits of an int.
+        param: items [list]
+               bits [int]
+        return: [list]
+    """
+    # The bits as a bytes object of 0s and 1s, lowest bit first, to select with
+    return list(compress(items, bin(bits)[:1:-1].encode("ascii").translate(_SELECTORS)))
+
+
+def row_bits(rows, size):
+    """ Return the bitset of the given row numbers.
+        param: rows [iterable of int]
+               size [int, the number of rows]
+        return: [int]
+    """
+    # Setting one bit at a time would copy the bitset for every row
+    bits = bytearray((size + 7) // 8)
+    for row in rows:
+        bits[row >> 3] |= 1 << (row & 7)
+    return int.from_bytes(bits, "little")
+
+
+def count_bits(bitsets, counts=()):
+    """ Add up the bitsets, bit by bit, in a binary counter whose digits are themselves bitsets,
+        so the cost depends on the number of bitsets and not on the number of bits.
+        param: bitsets [list of int]
+               counts [list of int, a counter to add the bitsets to]
+        return: [list of int, digit i holds bit i of the count of every position]
+    """
+    digits = list(counts)
+    for bits in bitsets:
+        carry = bits
+        for i, digit in enumerate(digits):
+            if not carry:
+                break
+            digits[i] = digit ^ carry
+            carry &= digit
+        if carry:
+            digits.append(carry)
+    return digits
+
+
+def count_at_least(digits, k, universe):
+    """ Return the bits whose count is at least k.
+        param: digits [list of int, a counter from count_bits]
+               k [int]
+               universe [int, every bit that may be set]
+        return: [int]
+    """
+    if k <= 0:
+        return universe
+    # Compare the counts with k, from the most significant digit down
+    greater = 0
+    equal = universe
+    for i in range(max(len(digits), k.bit_length()) - 1, -1, -1):
+        digit = digits[i] if i < len(digits) else 0
+        if (k >> i) & 1:
+            equal &= digit
+        else:
+            greater |= equal & digit
+            equal &= ~digit
+    return greater | equal
+
+
+def at_least(bitsets, k, universe):
+    """ Return the bits that are set in at least k of the bitsets.
+        param: bitsets [list of int]
+               k [int]
+               universe [int, every bit that may be set]
+        return: [int]
+    """
+    if k <= 0:
+        return universe
+    return count_at_least(count_bits(bitsets), k, universe)
+
+
+class AttributeIndex(object):
+    """ Value -> bitset of the rows that hold the value in any of their searchable fields. A row
+        holding a value in several fields is only counted once, as in DataHandler._score.
+    """
+    def __init__(self, rows=(), postings=None):
+        """ Constructor
+            param: rows [iterable of lists of String, the searchable fields of every row]
+                   postings [dictionary, value -> bitset of rows, to use instead of indexing rows,
+                             rows is then only looked at for the old values of a row that is
+                             set, e.g. catalogue.RowValues]
+            return: AttributeIndex
+        """
+        # The values of every row, so that a row can be taken out of the index when it changes
+        self.row_values = rows if postings is not None else []
+        # The values, for finding the ones that contain an attribute without looking at each
+        self.ngrams = NgramIndex()
+        # Attribute -> the values that contain it, cleared when a value is added or removed
+        self.containing = {}
+        if postings is not None:
+            self.postings = dict(postings)
+        else:
+            self.postings = {}
+            positions = {}
+            for row, values in enumerate(rows):
+                values = set(values)
+                self.row_values.append(values)
+                for value in values:
+                    positions.setdefault(value, []).append(row)
+            for value, value_rows in positions.items():
+                self.postings[value] = row_bits(value_rows, len(self.row_values))
+        self.universe = (1 << len(self.row_values)) - 1
+        for value in self.postings:
+            self.ngrams.add(value)
+
+    def __len__(self):
+        return len(self.postings)
+
+    def __contains__(self, value):
+        return value in self.postings
+
+    def add(self, values):
+        """ Add a row.
+            param: values [list of String, the searchable fields of the row]
+            return: [int, the row number]
+        """
+        row = len(self.row_values)
+        self.row_values.append(set())
+        self.universe |= 1 << row
+        self.set(row, values)
+        return row
+
+    def set(self, row, values):
+        """ Replace the values of a row.
+            param: row [int]
+                   values [list of String]
+            return: None
+        """
+        values = set(values)
+        old = self.row_values[row]
+        bit = 1 << row
+        for value in old - values:
+            bits = self.postings[value] & ~bit
+            if bits:
+                self.postings[value] = bits
+            else:
+                del self.postings[value]
+                self.ngrams.discard(value)
+                self.containing = {}
+        for value in values - old:
+            if value not in self.postings:
+                self.postings[value] = 0
+                self.ngrams.add(value)
+                self.containing = {}
+            self.postings[value] |= bit
+        self.row_values[row] = values
+
+    def matching(self, attribute):
+        """ Return the values that contain attribute.
+            param: attribute [String]
+            return: [list of String]
+        """
+        values = self.containing.get(attribute)
+        if values is None:
+            values = self.ngrams.containing(attribute)
+            self.containing[attribute] = values
+        return values
+
+    def count(self, attributes, values=frozenset(), counts=()):
+        """ Count, for every row, the distinct values that contain one of the attributes, on top
+            of the count of values made by an earlier call.
+            param: attributes [list of String]
+                   values [set of String, the values counted by the earlier call]
+                   counts [list of int, the counts of the earlier call]
+            return: [(set of String, the values counted, list of int, see count_bits)]
+        """
+        added = set()
+        for attribute in attributes:
+            added.update(self.matching(attribute))
+        added.difference_update(values)
+        return (added.union(values),
+                count_bits([self.postings[value] for value in added], counts))
+
+    def select(self, attributes, k):
+        """ Return the rows with at least k distinct values that contain one of the attributes.
+            param: attributes [list of String]
+                   k [int]
+            return: [int, bitset of rows]
+        """
+        return count_at_least(self.count(attributes)[1], k, self.universe)
@@ -0,0 +1,94 @@
+""" The catalogue items still considered for an action, in the order they are offered to the
+    user, and the highlight entries of them that are sent to the HoloLens.
+"""
+
+from collections import deque
+
+
+class CandidateCursor(object):
+    """ Candidates ranked by score, the lowest first, or in the order they were given without a
+        score. The next candidate is taken from the front of a deque, so next() and peek() don't
+        depend on the number of candidates.
+
+        The highlight entry of every row is made once and kept until the row changes, e.g. is
+        moved by an update, so highlight() only formats the rows that changed.
+    """
+    def __init__(self, key, entry, score=None):
+        """ Constructor
+            param: key [function, row -> id of the row]
+                   entry [function, row -> highlight entry of the row]
+                   score [function, row -> number, or None]
+            return: CandidateCursor
+        """
+        self.key = key
+        self.entry = entry
+        self.score = score
+        self.rows = deque()
+        # id -> highlight entry of the rows seen
+        self.entries = {}
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def assign(self, rows):
+        """ Replace the candidates.
+            param: rows [list of lists]
+            return: None
+        """
+        if self.score is not None:
+            rows = sorted(rows, key=self.score)
+        self.rows = deque(rows)
+
+    def clear(self):
+        """ Drop the candidates, e.g. when the user starts over.
+            param: N/A
+            return: None
+        """
+        self.rows = deque()
+
+    def rank(self, score):
+        """ Rank the candidates by a new score.
+            param: score [function, row -> number, or None to keep the current order]
+            return: None
+        """
+        self.score = score
+        self.assign(self.rows)
+
+    def peek(self):
+        """ Return the next candidate without taking it.
+            param: N/A
+            return: [list, the row]
+        """
+        return self.rows[0]
+
+    def next(self):
+        """ Take the next candidate.
+            param: N/A
+            return: [list, the row]
+        """
+        return self.rows.popleft()
+
+    def touch(self, row):
+        """ Note that a row changed, e.g. moved by an update.
+            param: row [list]
+            return: None
+        """
+        self.entries.pop(self.key(row), None)
+
+    def _entry(self, key, row):
+        entry = self.entries.get(key)
+        if entry is None:
+            entry = self.entry(row)
+            self.entries[key] = entry
+        return entry
+
+    def highlight(self):
+        """ Return the highlight entries of every candidate, in rank order.
+            param: N/A
+            return: [list of String]
+        """
+        key = self.key
+        return [self._entry(key(row), row) for row in self.rows]
@@ -0,0 +1,262 @@
+""" A typed, columnar form of a catalogue CSV for DataHandler, and a cache of it in a file that is
+    memory mapped when it is loaded, so that a restart doesn't parse the CSV again.
+
+    Every column is stored as the distinct values it holds, lowercased as DataHandler compares
+    them, and a uint32 code per row. The coordinates are also kept as float32 arrays, and the
+    #Shape column is derived from #Name once per distinct name. The rows that hold each value of
+    a column are found from the codes, so that the attribute index doesn't look at every row. The
+    cache file is named after the SHA-256 of the CSV, so a changed CSV is parsed again:
+
+        header      "ICAT", version, SHA-256 of the CSV, rows, length of the directory
+        directory   JSON, the header and the distinct values of every column
+        codes       uint32 per row, every column in turn, from a multiple of 4 bytes
+        x, y        float32 per row
+"""
+
+import csv
+import hashlib
+import io
+import json
+import mmap
+import os
+import re
+import struct
+import sys
+from array import array
+from os.path import join
+
+from .attribute_index import row_bits
+
+CACHE_MAGIC = b"ICAT"
+# Changed whenever the CSV is turned into columns differently, so that old caches are not used
+CACHE_VERSION = 1
+CACHE_HEADER = struct.Struct("<4sH32sII")
+SHAPE_FIELD = "#Shape"
+_REGULAR = re.compile(r"^Brick \d+[X]\d+", re.M | re.I)
+
+
+def part_shape(name):
+    """ Return the shape description according to the name of a part.
+        param: name [String]
+        return: [String]
+    """
+    if "Roof Tile" in name:
+        return "slope"
+    elif _REGULAR.match(name):
+        return "regular"
+    return "round"
+
+
+def _encode(cells):
+    """ Return the distinct cells, in order of appearance, and the code of every cell.
+    """
+    codes_by_value = {}
+    codes = array("I", [codes_by_value.setdefault(cell, len(codes_by_value)) for cell in cells])
+    return list(codes_by_value), codes
+
+
+def _align(offset):
+    return (offset + 3) & ~3
+
+
+def code_bits(values, codes):
+    """ Return the bitset of the rows of every code of a column.
+        param: values [list of String]
+               codes [array or memoryview of uint32]
+        return: [list of int, the bitset of code i at i]
+    """
+    if len(values) > 256:
+        rows = [[] for _ in values]
+        for row, code in enumerate(codes):
+            rows[code].append(row)
+        return [row_bits(code_rows, len(codes)) for code_rows in rows]
+    # A byte per row, turned into a string of binary digits for every code, lowest row last
+    indicator = array("B", codes).tobytes()[::-1]
+    bits = []
+    for code in range(len(values)):
+        table = bytearray(b"0" * 256)
+        table[code] = ord("1")
+        bits.append(int(indicator.translate(table) or b"0", 2))
+    return bits
+
+
+class RowValues(object):
+    """ The distinct values every row holds in some columns, a set per row as AttributeIndex keeps
+        them. The set of a row is made from the codes when it is looked at, and kept once the row
+        is replaced.
+    """
+    def __init__(self, columns, size):
+        self.columns = columns
+        self.size = size
+        # row -> the values of a row that was replaced or appended
+        self.replaced = {}
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, row):
+        values = self.replaced.get(row)
+        if values is not None:
+            return values
+        if not 0 <= row < self.size:
+            raise IndexError(row)
+        return set(values[codes[row]] for values, codes in self.columns)
+
+    def __setitem__(self, row, values):
+        self.replaced[row] = values
+
+    def append(self, values):
+        self.replaced[self.size] = values
+        self.size += 1
+
+
+class Catalogue(object):
+    """ The columns of a catalogue. columns[i] is (values, codes) of field header[i], so the value
+        of field i of row r is values[codes[r]]. The ID of every row is its row number.
+    """
+    def __init__(self, header, columns, x, y):
+        self.header = header
+        self.columns = columns
+        self.x = x
+        self.y = y
+        # If the catalogue was read from a cache file
+        self.cached = False
+
+    def __len__(self):
+        return len(self.x)
+
+    def rows(self):
+        """ Return the catalogue as rows of strings, one list per row.
+            param: N/A
+            return: [list of lists of String]
+        """
+        cells = [map(values.__getitem__, codes) for values, codes in self.columns]
+        return [list(row) for row in zip(*cells)]
+
+    def postings(self, fields):
+        """ Return the rows that hold every value in any of the fields.
+            param: fields [list of int]
+            return: [dictionary, value -> bitset of rows]
+        """
+        postings = {}
+        for field in fields:
+            values, codes = self.columns[field]
+            for value, bits in zip(values, code_bits(values, codes)):
+                if bits:
+                    postings[value] = postings.get(value, 0) | bits
+        return postings
+
+    def row_values(self, fields):
+        """ Return the values every row holds in any of the fields.
+            param: fields [list of int]
+            return: [RowValues]
+        """
+        return RowValues([self.columns[field] for field in fields], len(self))
+
+
+def parse_catalogue(csvfile):
+    """ Parse a catalogue CSV.
+        param: csvfile [file object, opened with newline='']
+        return: [Catalogue]
+    """
+    raw_data = list(csv.reader(csvfile, delimiter=";"))
+    header = raw_data.pop(0)
+    fields = [head.lower() for head in header]
+    name_idx = header.index("#Name")
+    x_idx = fields.index("x")
+    y_idx = fields.index("y")
+    id_idx = fields.index("id")
+    columns = []
+    for idx in range(len(header)):
+        if idx == id_idx:
+            columns.append(([str(i) for i in range(len(raw_data))],
+                            array("I", range(len(raw_data)))))
+        else:
+            columns.append(_encode([data_row[idx].lower() for data_row in raw_data]))
+    # The shape of every distinct name rather than of every row
+    names, name_codes = _encode([data_row[name_idx] for data_row in raw_data])
+    shapes, shape_codes = _encode([part_shape(name) for name in names])
+    columns.append((shapes, array("I", [shape_codes[code] for code in name_codes])))
+    header.append(SHAPE_FIELD)
+    x = array("f", [float(data_row[x_idx]) for data_row in raw_data])
+    y = array("f", [float(data_row[y_idx]) for data_row in raw_data])
+    return Catalogue(header, columns, x, y)
+
+
+def _read_cache(path, digest):
+    """ Return the Catalogue in a cache file, raises ValueError if it isn't a complete cache of
+        the CSV with the given digest.
+    """
+    with open(path, "rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, version, file_digest, rows, directory_size = CACHE_HEADER.unpack_from(mapped)
+    if magic != CACHE_MAGIC or version != CACHE_VERSION or file_digest != digest:
+        raise ValueError("Not a cache of this catalogue: {}".format(path))
+    start = CACHE_HEADER.size
+    directory = json.loads(mapped[start:start + directory_size].decode("utf-8"))
+    if directory["byteorder"] != sys.byteorder:
+        raise ValueError("Cache written with another byte order: {}".format(path))
+    offset = _align(start + directory_size)
+    if len(mapped) != offset + 4 * rows * (len(directory["values"]) + 2):
+        raise ValueError("Truncated cache: {}".format(path))
+    view = memoryview(mapped)
+    columns = []
+    for values in directory["values"]:
+        # The codes are read from the mapped file as they are
+        codes = view[offset:offset + 4 * rows].cast("I")
+        if rows and max(codes) >= len(values):
+            raise ValueError("Corrupt cache: {}".format(path))
+        columns.append((values, codes))
+        offset += 4 * rows
+    x = array("f")
+    x.frombytes(view[offset:offset + 4 * rows])
+    y = array("f")
+    y.frombytes(view[offset + 4 * rows:])
+    catalogue = Catalogue(directory["header"], columns, x, y)
+    catalogue.cached = True
+    return catalogue
+
+
+def _write_cache(path, digest, catalogue):
+    """ Write a catalogue to a cache file.
+    """
+    directory = json.dumps({"byteorder": sys.byteorder, "header": catalogue.header,
+                            "values": [values for values, _ in catalogue.columns]},
+                           separators=(",", ":")).encode("utf-8")
+    # Another process may be writing the same cache
+    tmp = "{}.{}.tmp".format(path, os.getpid())
+    with open(tmp, "wb") as f:
+        f.write(CACHE_HEADER.pack(CACHE_MAGIC, CACHE_VERSION, digest, len(catalogue),
+                                  len(directory)))
+        f.write(directory)
+        f.write(bytes(_align(f.tell()) - f.tell()))
+        for _, codes in catalogue.columns:
+            f.write(codes)
+        f.write(catalogue.x)
+        f.write(catalogue.y)
+    os.replace(tmp, path)
+
+
+def load_catalogue(path, cache_dir=None):
+    """ Return the catalogue in a CSV file. With a cache_dir the catalogue is read from the cache
+        file of the CSV in cache_dir, which is written if it is missing or unreadable. cache_dir
+        is created if it doesn't exist.
+        param: path [String]
+               cache_dir [String or None]
+        return: [Catalogue]
+    """
+    if cache_dir is None:
+        with open(path, newline='') as csvfile:
+            return parse_catalogue(csvfile)
+    with open(path, "rb") as f:
+        content = f.read()
+    digest = hashlib.sha256(content).digest()
+    cache = join(cache_dir, "{}.cat".format(digest.hex()))
+    try:
+        return _read_cache(cache, digest)
+    except (OSError, ValueError, KeyError, TypeError, struct.error):
+        pass
+    catalogue = parse_catalogue(io.TextIOWrapper(io.BytesIO(content), newline=''))
+    os.makedirs(cache_dir, exist_ok=True)
+    _write_cache(cache, digest, catalogue)
+    return catalogue
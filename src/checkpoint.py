@@ -0,0 +1,175 @@
+""" Checkpoints of the interpreter state in a memory mapped file, so that a restarted
+    interpreter can continue where the last one stopped instead of waiting for the scene to be
+    reported again.
+
+    The file holds two slots after a file header. A checkpoint is written to the slot that does
+    not hold the latest one, payload first and slot header last, and the slot header carries a
+    sequence number and a CRC-32 of the sequence number, length and payload. A write that is
+    torn by a crash leaves a slot that fails its CRC, and the other slot still holds the
+    previous checkpoint.
+
+        file header   "ICKP", version, slot capacity
+        slot 0        magic, sequence, length, crc32, payload (zlib compressed JSON)
+        slot 1        ...
+"""
+
+import json
+import mmap
+import os
+import struct
+import zlib
+
+FILE_MAGIC = b"ICKP"
+FILE_VERSION = 1
+FILE_HEADER = struct.Struct("<4sHI")
+SLOT_MAGIC = b"SLOT"
+SLOT_HEADER = struct.Struct("<4sQII")
+# Bytes of payload each slot has room for to begin with, the file grows when needed
+DEFAULT_CAPACITY = 1 << 16
+
+
+def _checksum(sequence, payload):
+    return zlib.crc32(payload, zlib.crc32(struct.pack("<QI", sequence, len(payload))))
+
+
+class Checkpoint(object):
+    """ The checkpoint file at path. load() returns the latest checkpoint that was completely
+        written and save() writes a new one. An existing file is never replaced unless it is a
+        checkpoint file.
+    """
+    def __init__(self, path, capacity=DEFAULT_CAPACITY):
+        """ Constructor
+            param: path [String]
+                   capacity [int, bytes of payload each slot has room for in a new file]
+            return: Checkpoint
+            raises: ValueError if capacity isn't positive
+        """
+        if capacity < 1:
+            raise ValueError("The capacity of a checkpoint must be positive: {}".format(capacity))
+        self.path = path
+        self.capacity = capacity
+        self.sequence = 0
+        self.file = None
+        self.map = None
+        self.saved = 0
+
+    def _offset(self, slot):
+        return FILE_HEADER.size + slot * (SLOT_HEADER.size + self.capacity)
+
+    def open(self):
+        """ Map the file, it is created if it doesn't exist. A file that is shorter than its two
+            slots, e.g. after a full disk, is extended, and the missing part of a slot reads as an
+            empty slot.
+            param: N/A
+            return: None
+            raises: ValueError if the file isn't a checkpoint file
+        """
+        if self.map is not None:
+            return
+        if not os.path.exists(self.path):
+            self._create(self.capacity)
+        self.file = open(self.path, "r+b")
+        try:
+            header = self.file.read(FILE_HEADER.size)
+            if len(header) < FILE_HEADER.size:
+                raise ValueError("Not a checkpoint file: {}".format(self.path))
+            magic, version, capacity = FILE_HEADER.unpack(header)
+            if magic != FILE_MAGIC or version != FILE_VERSION:
+                raise ValueError("Not a checkpoint file: {}".format(self.path))
+        except ValueError:
+            self.file.close()
+            self.file = None
+            raise
+        self.capacity = capacity
+        if os.fstat(self.file.fileno()).st_size < self._offset(2):
+            self.file.truncate(self._offset(2))
+        self.map = mmap.mmap(self.file.fileno(), 0)
+        latest = self._latest()
+        self.sequence = 0 if latest is None else latest[0]
+
+    def _create(self, capacity, payload=None):
+        """ Write a new file with room for capacity bytes per slot, and with payload in the slot
+            of the current sequence number, and move it in place of the old one.
+        """
+        self.close()
+        self.capacity = capacity
+        tmp = self.path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(FILE_HEADER.pack(FILE_MAGIC, FILE_VERSION, capacity))
+            f.truncate(self._offset(2))
+            if payload is not None:
+                f.seek(self._offset(self.sequence % 2))
+                f.write(SLOT_HEADER.pack(SLOT_MAGIC, self.sequence, len(payload),
+                                         _checksum(self.sequence, payload)) + payload)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+    def _read(self, slot):
+        """ Return (sequence, payload) of a slot, or None if it isn't completely written.
+        """
+        offset = self._offset(slot)
+        if offset + SLOT_HEADER.size > len(self.map):
+            return None
+        magic, sequence, length, crc = SLOT_HEADER.unpack_from(self.map, offset)
+        if magic != SLOT_MAGIC or length > self.capacity:
+            return None
+        start = offset + SLOT_HEADER.size
+        payload = self.map[start:start + length]
+        if _checksum(sequence, payload) != crc:
+            return None
+        return sequence, payload
+
+    def _latest(self):
+        """ Return (sequence, payload) of the latest complete checkpoint, or None.
+        """
+        slots = [entry for entry in (self._read(0), self._read(1)) if entry is not None]
+        if not slots:
+            return None
+        return max(slots, key=lambda entry: entry[0])
+
+    def load(self):
+        """ Return the latest checkpoint.
+            param: N/A
+            return: [the state given to save(), or None if there is no checkpoint]
+        """
+        self.open()
+        latest = self._latest()
+        if latest is None:
+            return None
+        return json.loads(zlib.decompress(latest[1]).decode("utf-8"))
+
+    def save(self, state):
+        """ Write a checkpoint.
+            param: state [anything that can be stored as JSON]
+            return: None
+        """
+        self.open()
+        payload = zlib.compress(json.dumps(state, separators=(",", ":")).encode("utf-8"), 1)
+        self.sequence += 1
+        self.saved += 1
+        if len(payload) > self.capacity:
+            # Larger slots move the second slot, so the file is replaced as a whole
+            # The capacity read from an existing file may be 0
+            capacity = max(self.capacity, 1)
+            while capacity < len(payload):
+                capacity *= 2
+            self._create(capacity, payload)
+            return
+        # The slot that doesn't hold the latest checkpoint
+        offset = self._offset(self.sequence % 2)
+        start = offset + SLOT_HEADER.size
+        self.map[start:start + len(payload)] = payload
+        self.map.flush()
+        self.map[offset:start] = SLOT_HEADER.pack(SLOT_MAGIC, self.sequence, len(payload),
+                                                  _checksum(self.sequence, payload))
+        self.map.flush()
+
+    def close(self):
+        """ Unmap the file.
+        """
+        if self.map is not None:
+            self.map.close()
+            self.file.close()
+            self.map = None
+            self.file = None
@@ -9,14 +9,40 @@ import socket
 import select
 import sys
 import os
+import random
 import time
 import platform
+from collections import deque
 from subprocess import check_output
 from multiprocessing import Process
 
+
+# A connection that lasted this many seconds starts the backoff of the next reconnection over
+RECONNECT_RESET = 10.0
+
+
+def backoff_delays(base=0.1, maximum=10.0):
+    """ Generate the delays between connection attempts, an exponential backoff with full jitter
+        so that clients that lost the server at the same time do not reconnect in lockstep.
+        param: base [float, seconds]
+               maximum [float, seconds]
+        return: [generator of float]
+    """
+    delay = base
+    while True:
+        yield random.uniform(0, delay)
+        # Capped, 2 ** attempt would overflow a float after a long outage
+        delay = min(maximum, delay * 2)
+
+
 class Client(Process):
     """ A client process that communicates with its parent through the pipe "pipe_in" and stores
         messages in "self.messages".
+        This is kept for the python 2 components, e.g. the ROS subscriber, new components should
+        use the in-process clients in async_client.py.
+        If the connection to the server is lost the client reconnects after a backoff delay, and
+        messages from the parent are kept in a ring buffer of buffer_size messages until the
+        connection is back.
     """
     def __init__(self,
                  client_type,
@@ -24,35 +50,78 @@ class Client(Process):
                  pipe_out,
                  port=5000,
                  host="localhost",
-                 connection_attempts=10):
+                 connection_attempts=10,
+                 buffer_size=1000):
         Process.__init__(self)
         self.client_type = client_type
         self.pipe_in = pipe_in
         self.pipe_out = pipe_out
-        self.messages = []
-        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.server.settimeout(2)
+        self.messages = deque(maxlen=buffer_size)
+        # The delays before reconnecting after a lost connection
+        self.backoff = backoff_delays()
+        self.connected_at = None
 
         if host == "localhost":
             host = self.get_local_ip(platform.system())
-            
+        self.host = host
+        self.port = port
+
         # Connect to remote host
+        if not self.connect(connection_attempts):
+            print("Connection failed.")
+            sys.exit()
+
+    def connect(self, connection_attempts=None):
+        """ Connect to the server, waiting a little longer after each failed attempt, and present
+            the client.
+            param: connection_attempts [int, None to try until it succeeds]
+            return: [bool, True if connected]
+        """
         attempt = 0
-        while attempt <= connection_attempts:
+        for delay in backoff_delays():
             attempt += 1
+            self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.server.settimeout(2)
             try:
-                self.server.connect((host, port))
-                break
-            except:
+                self.server.connect((self.host, self.port))
+                # Present the client for the server so that the server knowns what kind of client
+                # this is.
+                time.sleep(1)
+                self.server.send("client_type;{}$".format(self.client_type).encode("utf-8"))
+                # Send what the parent process wrote while the client was disconnected
+                while self.messages:
+                    self.server.send(self.messages[0])
+                    self.messages.popleft()
+                self.connected_at = time.time()
+                return True
+            except socket.error:
+                self.server.close()
                 print("Unable to connect to server {} at port {}. Trial {}/{}"\
-                      .format(host, port, attempt, connection_attempts))
-        if attempt > connection_attempts:
-            print("Connection failed.")
-            sys.exit()
+                      .format(self.host, self.port, attempt, connection_attempts))
+            if connection_attempts is not None and attempt >= connection_attempts:
+                return False
+            self._wait(delay)
 
-        # Present the client for the server so that the server knowns what kind of client this is.
-        time.sleep(1)
-        self.server.send("client_type;{}".format(client_type).encode("utf-8"))
+    def _wait(self, delay):
+        """ Wait between connection attempts while buffering messages from the parent process.
+        """
+        deadline = time.time() + delay
+        remaining = delay
+        while remaining > 0:
+            read_sockets, _, _ = select.select([self.pipe_in], [], [], remaining)
+            if read_sockets:
+                self.messages.append(os.read(self.pipe_in, 4096))
+            remaining = deadline - time.time()
+
+    def _reconnect(self):
+        """ Reconnect after the connection was lost, once the next backoff delay has passed.
+        """
+        print("Disconnected from server, reconnecting")
+        self.server.close()
+        if time.time() - self.connected_at >= RECONNECT_RESET:
+            self.backoff = backoff_delays()
+        self._wait(next(self.backoff))
+        self.connect()
 
     def run(self):
         while True:
@@ -63,16 +132,24 @@ class Client(Process):
             for sock in read_sockets:
                 #incoming message from remote server
                 if sock == self.server:
-                    data = sock.recv(4096)
+                    try:
+                        data = sock.recv(4096)
+                    except socket.error:
+                        data = None
                     if not data:
-                        print("Disconnected from server")
-                        sys.exit()
+                        self._reconnect()
+                        break
                     else:
                         os.write(self.pipe_out, data)
                 # Parent process entered a message
                 else:
                     msg = os.read(self.pipe_in, 4096)
-                    self.server.send(msg)
+                    try:
+                        self.server.send(msg)
+                    except socket.error:
+                        self.messages.append(msg)
+                        self._reconnect()
+                        break
 
     def get_local_ip(self, system):
         """ The socket.gethostbyname(socket.gethostname()) - method does, apparently, not work on
@@ -0,0 +1,220 @@
+""" The attention table dashboard. It runs in its own process and is fed snapshots of the table
+    by the interpreter, so that formatting and printing never compete with message handling.
+
+    The table is drawn in the terminal and only the lines that changed since the last snapshot
+    are redrawn. The latest snapshot can also be served as JSON on localhost:
+
+        Dashboard(port=8080)  ->  curl http://127.0.0.1:8080/
+"""
+import json
+import os
+import queue
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from multiprocessing import Process, Queue
+
+HEADER = ["id", "x", "y", "c", "at", "include", "lh"]
+WIDTH = 124
+# The most seconds publish() waits for a stale snapshot to arrive in the queue, to replace it
+PUBLISH_WAIT = 0.05
+
+# ANSI escape sequences
+CLEAR_SCREEN = "\x1b[2J"
+MOVE_TO = "\x1b[{};1H"
+CLEAR_LINE = "\x1b[K"
+CLEAR_BELOW = "\x1b[J"
+
+
+def snapshot(session, decoder, scene=None):
+    """ Take a snapshot of the state of a participant session for the dashboard. The columns of
+        the attention table are copied as they are, the rows are built by the dashboard.
+        param: session [session.Session]
+               decoder [decoder.Decoder]
+               scene [dictionary, session.Sessions.stats()]
+        return: [dictionary]
+    """
+    table = session.attention_table
+    best = table.best()
+    return {"id": list(table.ids),
+            "x": list(table.x),
+            "y": list(table.y),
+            "c": list(table.c),
+            "at": list(table.at),
+            "include": list(table.include),
+            "lh": table.lh,
+            "best": None if best is None else best.id,
+            "action": session.current_action,
+            "decoder": decoder.stats(),
+            "scene": scene or {}}
+
+
+def rows(snapshot):
+    """ Return the blocks of a snapshot as a list of dictionaries, sorted on id.
+        param: snapshot [dictionary]
+        return: [list of dictionaries]
+    """
+    blocks = [dict(zip(HEADER, values)) for values in
+              zip(*(snapshot[col] for col in HEADER))]
+    try:
+        blocks.sort(key=lambda block: block["id"])
+    except TypeError:
+        # Mixed id types, keep the order of the table
+        pass
+    return blocks
+
+
+def format_table(snapshot):
+    """ Format a snapshot as the lines of the dashboard.
+        param: snapshot [dictionary]
+        return: lines [list of String]
+    """
+    lines = ["_" * WIDTH]
+    blocks = rows(snapshot)
+    if blocks:
+        lines.append("".join("{:<11}".format(col) for col in HEADER))
+    for block in blocks:
+        row_str = ""
+        for col in HEADER:
+            if col == "lh":
+                nr_lines = int(block[col]*50)
+                nr_white = 50 - nr_lines
+                str_ = "[" + "|"*nr_lines + " "*nr_white + "] {0:.2f}%".format(block[col]*100)
+            elif isinstance(block[col], float):
+                str_ = "{0:.4f}".format(block[col])
+            else:
+                str_ = str(block[col])
+            row_str += "{:<11}".format(str_)
+        if snapshot["best"] == block["id"]:
+            row_str += "\t<=="
+        lines.append(row_str)
+    lines.append("")
+    if snapshot["decoder"]["malformed"]:
+        lines.append("Malformed messages: " + ", ".join(
+            "{} {}".format(count, key[len("malformed_"):]) for key, count in
+            sorted(snapshot["decoder"].items()) if key.startswith("malformed_")))
+    if snapshot["scene"].get("evicted"):
+        lines.append("Evicted objects: {}".format(snapshot["scene"]["evicted"]))
+    lines.append("_" * WIDTH)
+    return lines
+
+
+class Dashboard(Process):
+    """ Renders the snapshots published by the interpreter, if render is True, and serves the
+        latest one as JSON on 127.0.0.1:port if a port is given. Only the most recent snapshot is
+        kept, publish() replaces a snapshot that is still waiting rather than wait for a slow
+        terminal.
+    """
+    def __init__(self, render=True, port=None, stream=None):
+        super(Dashboard, self).__init__()
+        self.daemon = True
+        self.render = render
+        self.port = port
+        self.stream = stream
+        self.queue = Queue(maxsize=1)
+        self.latest = None
+        self.previous = None
+
+    def publish(self, snapshot):
+        """ Hand a snapshot to the dashboard process, in place of the one it hasn't taken yet.
+            Waits at most PUBLISH_WAIT seconds.
+            param: snapshot [dictionary]
+            return: None
+        """
+        try:
+            self.queue.get_nowait()
+        except queue.Empty:
+            pass
+        try:
+            self.queue.put_nowait(snapshot)
+            return
+        except queue.Full:
+            pass
+        # The stale snapshot was still on its way into the queue, from the thread that feeds it
+        try:
+            self.queue.get(timeout=PUBLISH_WAIT)
+            self.queue.put_nowait(snapshot)
+        except (queue.Empty, queue.Full):
+            pass
+
+    def stop(self):
+        """ Ask the dashboard process to stop.
+        """
+        try:
+            self.queue.put(None, timeout=1.0)
+        except queue.Full:
+            self.terminate()
+
+    def run(self):
+        if self.stream is None:
+            self.stream = sys.stdout
+        if self.port is not None:
+            self._serve()
+        parent = os.getppid()
+        while True:
+            try:
+                snapshot = self.queue.get(timeout=1.0)
+            except queue.Empty:
+                # Don't outlive an interpreter that was killed
+                if os.getppid() != parent:
+                    break
+                continue
+            if snapshot is None:
+                break
+            self.latest = snapshot
+            if self.render:
+                self._draw(format_table(snapshot))
+
+    def _draw(self, lines):
+        """ Redraw the lines that changed since the last frame. Terminals that do not understand
+            ANSI escape sequences, e.g. a log file, get the whole frame when anything changed.
+        """
+        previous = self.previous
+        if lines == previous:
+            return
+        self.previous = lines
+        if not self.stream.isatty():
+            self.stream.write("\n".join(lines) + "\n")
+            self.stream.flush()
+            return
+        out = []
+        if previous is None:
+            out.append(CLEAR_SCREEN)
+            previous = []
+        for i, line in enumerate(lines):
+            if i >= len(previous) or previous[i] != line:
+                out.append(MOVE_TO.format(i + 1) + line + CLEAR_LINE)
+        if len(lines) < len(previous):
+            out.append(MOVE_TO.format(len(lines) + 1) + CLEAR_BELOW)
+        self.stream.write("".join(out))
+        self.stream.flush()
+
+    def _serve(self):
+        """ Serve the latest snapshot as JSON from a background thread. With port 0 a free port
+            is picked and port is set to it.
+            return: [HTTPServer]
+        """
+        dashboard = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                snapshot = dashboard.latest
+                body = json.dumps({} if snapshot is None else
+                                  {"blocks": rows(snapshot),
+                                   "best": snapshot["best"],
+                                   "action": snapshot["action"],
+                                   "decoder": snapshot["decoder"],
+                                   "scene": snapshot["scene"]}).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = HTTPServer(("127.0.0.1", self.port), Handler)
+        self.port = server.server_address[1]
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
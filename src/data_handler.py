@@ -1,40 +1,57 @@
-import csv
-import re
+from collections import Counter
 from math import pow, sqrt
 from os.path import dirname, join
 
+from .attribute_index import AttributeIndex, compress_bits, count_at_least
+from .candidates import CandidateCursor
+from .catalogue import load_catalogue, part_shape
+from .filter_cache import FilterCache, FilterResult
+from .spatial_index import MATCH_TOLERANCE, GridIndex
+
 
 class DataHandler(object):
-    def __init__(self, data_file=None, log_queue=None):
-        """ Constructor. Reads the data file into a multidimensional list.
+    def __init__(self, data_file=None, log_queue=None, cache_dir=None, filter_cache_size=64,
+                 score=None):
+        """ Constructor. Reads the data file into a multidimensional list. With a cache_dir the
+            parsed data file is kept in a cache file in cache_dir, and read from there the next
+            time instead of parsing the data file again.
             param: data_file [String]
+                   cache_dir [String]
+                   filter_cache_size [int, the number of filter results to remember]
+                   score [function, row -> number, the blocks of a filter are offered lowest
+                          score first, or None for catalogue order]
             return: self [DataHandler]
         """
         self.log_queue = log_queue
         self.data_dir = dirname(data_file)
-        # Read the given CSV file
-        with open(data_file, newline='') as csvfile:
-            raw_data = list(csv.reader(csvfile, delimiter=";"))
-
-        # Pop the header to use as a reference for the fields in the data base
-        self.header = raw_data.pop(0)
-        self.header.append("#Shape")
+        catalogue = load_catalogue(data_file, cache_dir)
+        if catalogue.cached:
+            self.log("Read the catalogue from the cache in {}".format(cache_dir))
 
-        # Iterate through the raw data and insert it to the data table
-        self.data = []
-        nam_idx = self.header.index("#Name")
+        self.header = catalogue.header
+        self.data = catalogue.rows()
         self.x_idx = [head.lower() for head in self.header].index("x")
         self.y_idx = [head.lower() for head in self.header].index("y")
         self.id_idx = [head.lower() for head in self.header].index("id")
-        for i, data_row in enumerate(raw_data):
-            data_row[self.id_idx] = str(i)
-            data_row.append(self._get_shape(data_row[nam_idx]))
-            self.data.append([cell.lower() for cell in data_row])
+        # The positions of the items as numbers, kept current by update
+        self.x = catalogue.x
+        self.y = catalogue.y
+
+        # Index the positions of the items so that update doesn't have to look at every row
+        self.spatial = GridIndex()
+        self.spatial.extend(range(len(self.x)), self.x, self.y)
 
         # Check which fields are searchable, they are indicated with a #-sign in the header.
         self.searchable_fields_idx = [i for i, field in enumerate(self.header) if
                                       field.startswith("#")]
-        self.current_filter = []
+        # Index the values of the searchable fields so that filter doesn't have to look at every
+        # row, the rows of every value are found from the codes of the columns
+        self.attributes = AttributeIndex(catalogue.row_values(self.searchable_fields_idx),
+                                         catalogue.postings(self.searchable_fields_idx))
+        self.filters = FilterCache(filter_cache_size)
+        # The rows of the current filter, ranked by score
+        self.current_filter = CandidateCursor(lambda data_row: data_row[self.id_idx],
+                                              self._highlight_entry, score)
         self.current_attributes = []
         self.reset_filter()
 
@@ -43,7 +60,7 @@ class DataHandler(object):
             param: N/A
             return: None
         """
-        self.current_filter = []
+        self.current_filter.clear()
         self.current_attributes = []
 
     def _get_shape(self, name):
@@ -51,12 +68,7 @@ class DataHandler(object):
             param: name [String]
             return: [String]
         """
-        regex = r"^Brick \d+[X]\d+"
-        if "Roof Tile" in name:
-            return "slope"
-        elif re.match(regex, name, re.M|re.I):
-            return "regular"
-        return "round"
+        return part_shape(name)
 
     def _get_col(self, data, col_idx):
         """ Removes the column indicated by the col_index
@@ -88,14 +100,51 @@ class DataHandler(object):
             param: attributes [list]
             return: None
         """
+        parent = tuple(sorted(self.current_attributes))
         # Remove irrelevant attributes, i.e. those that doesn't occur in the data.
-        relevant_attributes = self._get_attributes()
         self.current_attributes += [attribute for attribute in attributes if attribute in
-                                    relevant_attributes]
-        self.current_filter = [data_row for data_row in self.data if\
-                               self._score(data_row) >= len(self.current_attributes)]
+                                    self.attributes]
+        key = tuple(sorted(self.current_attributes))
+        result = self.filters.get(key)
+        if result is None:
+            parent = self.filters.peek(parent)
+            result = self._filter_result(key, parent)
+            self.filters.put(result, refined=parent is not None)
+        self.current_filter.assign(result.selection)
         return self.current_filter
 
+    def _filter_result(self, attributes, parent=None):
+        """ Select the rows for which _score() >= len(attributes). With the result of a parent,
+            a subset of the attributes, only the values of the other attributes are counted.
+            param: attributes [tuple of String, sorted]
+                   parent [FilterResult or None]
+            return: [FilterResult]
+        """
+        if parent is None:
+            values, counts = self.attributes.count(attributes)
+        else:
+            added = (Counter(attributes) - Counter(parent.attributes)).elements()
+            values, counts = self.attributes.count(added, parent.values, parent.counts)
+        rows = count_at_least(counts, len(attributes), self.attributes.universe)
+        return FilterResult(attributes, frozenset(values), counts, rows,
+                            compress_bits(self.data, rows))
+
+    def _searchable_values(self, data_row):
+        return [data_row[idx] for idx in self.searchable_fields_idx]
+
+    def _set_cell(self, row_idx, field_idx, value):
+        """ Set a field of a row and keep the indexes up to date.
+        """
+        data_row = self.data[row_idx]
+        data_row[field_idx] = value
+        if field_idx in self.searchable_fields_idx:
+            old = self.attributes.row_values[row_idx]
+            new = set(self._searchable_values(data_row))
+            self.attributes.set(row_idx, new)
+            self.filters.invalidate(row_idx, old - new, new - old)
+        else:
+            self.filters.invalidate(row_idx)
+
     def _score(self, data_row):
         """ Meassure if the data_row maches the current filter.
             param: data_row [list]
@@ -116,19 +165,17 @@ class DataHandler(object):
             param: update_dict [dictionary]
             return: None
         """
-        min_dist = 1000
-        update_idx = None
-        x_col = self._get_col(self.data, self.x_idx)
-        y_col = self._get_col(self.data, self.y_idx)
-        for i, (x_pos, y_pos) in enumerate(zip(x_col, y_col)):
-            dist = self._euclidian(update_dict["x"], update_dict["y"], x_pos, y_pos)
-            if dist < min_dist:
-                min_dist = dist
-                update_idx = i
-        if update_idx and min_dist <= 0.02:
-            self.data[update_idx][self.x_idx] = update_dict["x"]
-            self.data[update_idx][self.y_idx] = update_dict["y"]
+        update_idx, min_dist = self.spatial.nearest(update_dict["x"], update_dict["y"], 1000)
+        if update_idx is not None and min_dist <= MATCH_TOLERANCE:
+            self._set_cell(update_idx, self.x_idx, update_dict["x"])
+            self._set_cell(update_idx, self.y_idx, update_dict["y"])
+            self.x[update_idx] = float(update_dict["x"])
+            self.y[update_idx] = float(update_dict["y"])
+            self.spatial.move(update_idx, self.x[update_idx], self.y[update_idx])
+            self.current_filter.touch(self.data[update_idx])
         else:
+            if min_dist is None:
+                min_dist = 1000
             self.log("Min closest block was {:.02f}cm away, no update".format(min_dist*100))
 
     def log(self, message):
@@ -151,20 +198,56 @@ class DataHandler(object):
         """
         pass
 
+    def distance_to(self, x, y):
+        """ Return a score that ranks the blocks by their distance to a position, e.g. of the
+            robot, the closest first.
+            param: x, y [float]
+            return: [function, row -> float]
+        """
+        def score(data_row):
+            idx = int(data_row[self.id_idx])
+            return (self.x[idx] - x) ** 2 + (self.y[idx] - y) ** 2
+        return score
+
+    def rank(self, score):
+        """ Rank the blocks of the current filter, and of the filters to come, by a new score.
+            param: score [function, row -> number, or None]
+            return: None
+        """
+        self.current_filter.rank(score)
+
+    def _block(self, data_row):
+        return {"id":data_row[self.id_idx], "x":data_row[self.x_idx], "y":data_row[self.y_idx]}
+
+    def _highlight_entry(self, data_row):
+        return "{},{},{}".format(data_row[self.id_idx], str(data_row[self.x_idx])[:5],
+                                 str(data_row[self.y_idx])[:5])
+
+    def peek_next_block(self):
+        """ Return the next block as a dictionary without taking it
+            param: N/A
+            return: block [dictionary]
+        """
+        return self._block(self.current_filter.peek())
+
     def get_next_block(self):
         """ Pops the next block as a dictionary
             param: N/A
             return: block [dictionary] 
         """
-        block = self.current_filter.pop(0)
-        return {"id":block[self.id_idx], "x":block[self.x_idx], "y":block[self.y_idx]}
+        return self._block(self.current_filter.next())
 
     def get_all_considered(self):
         """ Return all blocks considered as a list of dictionaries
             param: N/A
             return: blocks [list of dictionaries]
         """
-        blocks = []
-        for block in self.current_filter:
-            blocks.append({"id":block[self.id_idx], "x":block[self.x_idx], "y":block[self.y_idx]})
-        return blocks
\ No newline at end of file
+        return [self._block(block) for block in self.current_filter]
+
+    def get_highlight(self):
+        """ Return the highlight entries, "id,x,y", of all blocks considered. The entries are
+            kept from one call to the next and only made again for the blocks that changed.
+            param: N/A
+            return: [list of String]
+        """
+        return self.current_filter.highlight()
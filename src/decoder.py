@@ -0,0 +1,301 @@
+""" Decoding of the messages sent to the interpreter into typed records.
+
+    A text message is "type;field;field...", e.g. 'data;{"P1GP": [0.3, 0.1]}' or
+    'update;{"id": 3, "x": 0.31, "y": 0.12, "c": 120}'. A whole scene is sent in one message,
+    'scene;[{"id": 3, ...}, {"id": 4, ...}]', and so are the changes to it,
+    'delta;{"added": [...], "moved": [...], "removed": [5]}'. The keys of a data message are
+    prefixed with the participant they concern, P1A, P2GP and so on, and a data message is
+    decoded into one record per participant. The fields are JSON, older senders may use python
+    literals, e.g. single quoted strings, which are decoded with ast.literal_eval when JSON
+    fails. The fields are validated against the schema of the message type and every message
+    that can not be decoded is counted, by reason, before DecodeError is raised.
+"""
+
+import ast
+import json
+import math
+import re
+import struct
+from collections import Counter, namedtuple
+
+from .framing import GAZE_MESSAGE, REMOVE_MESSAGE, SCENE_MESSAGE, UPDATE_MESSAGE, unpack_gaze, \
+    unpack_remove, unpack_update
+
+
+class DecodeError(ValueError):
+    """ Raised when a message can not be decoded. reason is one of "syntax", "schema" and
+        "unknown".
+    """
+    def __init__(self, reason, message):
+        super(DecodeError, self).__init__(message)
+        self.reason = reason
+
+
+class BlockUpdate(namedtuple("BlockUpdate", ["id", "x", "y", "c", "extra"])):
+    """ One block of an update message. x, y and c are None if they were not given, extra holds
+        the keys that are not part of the schema.
+    """
+    __slots__ = ()
+
+    def as_dict(self):
+        """ Return the given values as a dictionary, like the message field they came from.
+            param: N/A
+            return: [dictionary]
+        """
+        values = {"id": self.id}
+        for key in ("x", "y", "c"):
+            value = getattr(self, key)
+            if value is not None:
+                values[key] = value
+        if self.extra:
+            values.update(self.extra)
+        return values
+
+    def merge(self, other):
+        """ Return this block with the values given in a later update of it.
+            param: other [BlockUpdate]
+            return: [BlockUpdate]
+        """
+        extra = self.extra
+        if other.extra:
+            extra = dict(extra or {}, **other.extra)
+        return BlockUpdate(self.id,
+                           self.x if other.x is None else other.x,
+                           self.y if other.y is None else other.y,
+                           self.c if other.c is None else other.c,
+                           extra)
+
+
+# The part of a data message that concerns one participant, the P<n>A, P<n>GP and P<n>F keys.
+# attributes, gaze and feedback are None if they were not given, extra holds the other keys,
+# e.g. P1V and P1N, without the participant prefix, and the keys that have no prefix.
+DataMessage = namedtuple("DataMessage", ["participant", "attributes", "gaze", "feedback",
+                                         "extra"])
+
+# kind is "update", "scene" or "delta", with a list of BlockUpdate as records, or "data", with a
+# list of DataMessage, one per participant. removed is the list of the ids of the blocks that a
+# delta message removes, and None for the other kinds.
+Message = namedtuple("Message", ["kind", "records", "removed"])
+
+# The participant a data message is about if none of its keys say
+DEFAULT_PARTICIPANT = 1
+
+
+def _schema_error(key, value):
+    return DecodeError("schema", "Invalid value for {}: {!r}".format(key, value))
+
+
+def _number(key, value):
+    # JSON allows NaN and Infinity, and an int may be too large for a float
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise _schema_error(key, value)
+    try:
+        number = float(value)
+    except OverflowError:
+        raise _schema_error(key, value)
+    if not math.isfinite(number):
+        raise _schema_error(key, value)
+    return number
+
+
+def _identifier(key, value):
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise _schema_error(key, value)
+    return value
+
+
+def _color(key, value):
+    # A color name or an HSV hue
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise _schema_error(key, value)
+    return value
+
+
+def _strings(key, value):
+    if not isinstance(value, (list, tuple)) or \
+       not all(isinstance(item, str) for item in value):
+        raise _schema_error(key, value)
+    return list(value)
+
+
+def _position(key, value):
+    if not isinstance(value, (list, tuple)) or len(value) not in (0, 2):
+        raise _schema_error(key, value)
+    return [_number(key, item) for item in value]
+
+
+# Field name -> validator, the keys not listed here are passed on in extra
+BLOCK_SCHEMA = {"x": _number, "y": _number, "c": _color}
+# Key, without the participant prefix -> (DataMessage field, validator)
+DATA_SCHEMA = {"A": ("attributes", _strings), "GP": ("gaze", _position),
+               "F": ("feedback", _strings)}
+PARTICIPANT_KEY = re.compile(r"^P(\d+)(.+)$")
+
+_decode_json = json.JSONDecoder().decode
+
+
+class Decoder(object):
+    """ Decodes the messages sent to the interpreter and keeps count of how they were decoded.
+        fallbacks is the number of fields that needed ast.literal_eval and malformed counts the
+        messages that were rejected, by reason.
+    """
+    def __init__(self):
+        self.decoded = 0
+        self.fallbacks = 0
+        self.malformed = Counter()
+
+    def stats(self):
+        """ Return the counters.
+            param: N/A
+            return: [dictionary]
+        """
+        stats = {"decoded": self.decoded, "fallbacks": self.fallbacks,
+                 "malformed": sum(self.malformed.values())}
+        for reason, count in self.malformed.items():
+            stats["malformed_" + reason] = count
+        return stats
+
+    def decode(self, frame):
+        """ Decode a text message.
+            param: frame [String, e.g. 'data;{"P1GP": [0.3, 0.1]}']
+            return: [Message]
+        """
+        try:
+            fields = frame.replace("$", "").split(";")
+            kind = fields[0]
+            removed = None
+            if kind == "update":
+                records = [self._block(self._field(field)) for field in fields[1:]]
+            elif kind == "scene":
+                if len(fields) < 2:
+                    raise DecodeError("schema", "Scene message without a payload")
+                records = self._blocks("scene", self._field(fields[1]))
+            elif kind == "delta":
+                if len(fields) < 2:
+                    raise DecodeError("schema", "Delta message without a payload")
+                records, removed = self._delta(self._field(fields[1]))
+            elif kind == "data":
+                if len(fields) < 2:
+                    raise DecodeError("schema", "Data message without a payload")
+                records = self._data(self._field(fields[1]))
+            else:
+                raise DecodeError("unknown", "Unknown message type: {}".format(kind))
+        except DecodeError as error:
+            self.malformed[error.reason] += 1
+            raise
+        self.decoded += 1
+        return Message(kind, records, removed)
+
+    def decode_frame(self, frame):
+        """ Decode a binary frame, see framing.py.
+            param: frame [BinaryFrame]
+            return: [list of Message, a gaze frame holds one data message per sample]
+        """
+        try:
+            if frame.msg_type == UPDATE_MESSAGE:
+                messages = [Message("update", [self._block(block) for block in
+                                               unpack_update(frame.payload)], None)]
+            elif frame.msg_type == SCENE_MESSAGE:
+                messages = [Message("scene", [self._block(block) for block in
+                                              unpack_update(frame.payload)], None)]
+            elif frame.msg_type == REMOVE_MESSAGE:
+                messages = [Message("delta", [], unpack_remove(frame.payload))]
+            elif frame.msg_type == GAZE_MESSAGE:
+                messages = [Message("data", [DataMessage(DEFAULT_PARTICIPANT, None,
+                                                         _position("GP", point), None, None)],
+                                    None)
+                            for point in unpack_gaze(frame.payload)]
+            else:
+                raise DecodeError("unknown",
+                                  "Unknown binary message type: {}".format(frame.msg_type))
+        except DecodeError as error:
+            self.malformed[error.reason] += 1
+            raise
+        except struct.error as error:
+            # The payload is not a whole number of records
+            self.malformed["syntax"] += 1
+            raise DecodeError("syntax", str(error))
+        self.decoded += len(messages)
+        return messages
+
+    def _field(self, field):
+        """ Decode one field, as JSON if possible and as a python literal otherwise.
+        """
+        try:
+            return _decode_json(field)
+        except ValueError:
+            pass
+        try:
+            value = ast.literal_eval(field)
+        except (SyntaxError, ValueError, TypeError, MemoryError, RecursionError):
+            raise DecodeError("syntax", "Unable to decode field: {!r}".format(field[:80]))
+        self.fallbacks += 1
+        return value
+
+    def _block(self, values):
+        if not isinstance(values, dict) or "id" not in values:
+            raise _schema_error("update", values)
+        bid = _identifier("id", values["id"])
+        typed = {"x": None, "y": None, "c": None}
+        extra = None
+        for key, value in values.items():
+            if not isinstance(key, str):
+                # Python literals may have keys that aren't strings, JSON may not
+                raise _schema_error("key", key)
+            if key in BLOCK_SCHEMA:
+                typed[key] = BLOCK_SCHEMA[key](key, value)
+            elif key != "id":
+                if extra is None:
+                    extra = {}
+                extra[key] = value
+        return BlockUpdate(bid, typed["x"], typed["y"], typed["c"], extra)
+
+    def _blocks(self, key, values):
+        if not isinstance(values, list):
+            raise _schema_error(key, values)
+        return [self._block(block) for block in values]
+
+    def _delta(self, values):
+        """ Return the added and moved blocks, and the ids of the removed ones.
+        """
+        if not isinstance(values, dict):
+            raise _schema_error("delta", values)
+        blocks = self._blocks("added", values.get("added", []))
+        blocks.extend(self._blocks("moved", values.get("moved", [])))
+        removed = values.get("removed", [])
+        if not isinstance(removed, list):
+            raise _schema_error("removed", removed)
+        return blocks, [_identifier("removed", bid) for bid in removed]
+
+    def _data(self, values):
+        if not isinstance(values, dict):
+            raise _schema_error("data", values)
+        # participant -> DataMessage field -> value
+        participants = {}
+        shared = None
+        for key, value in values.items():
+            if not isinstance(key, str):
+                raise _schema_error("key", key)
+            match = PARTICIPANT_KEY.match(key)
+            if match is None:
+                if shared is None:
+                    shared = {}
+                shared[key] = value
+                continue
+            fields = participants.setdefault(int(match.group(1)), {})
+            name = match.group(2)
+            if name in DATA_SCHEMA:
+                field, validator = DATA_SCHEMA[name]
+                fields[field] = validator(key, value)
+            else:
+                fields.setdefault("extra", {})[name] = value
+        if not participants:
+            participants[DEFAULT_PARTICIPANT] = {}
+        records = []
+        for participant, fields in sorted(participants.items()):
+            extra = fields.get("extra")
+            if shared:
+                extra = dict(shared, **(extra or {}))
+            records.append(DataMessage(participant, fields.get("attributes"), fields.get("gaze"),
+                                       fields.get("feedback"), extra))
+        return records
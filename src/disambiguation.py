@@ -0,0 +1,98 @@
+""" Disambiguation engines of the interpreter. An engine applies the verbal filter and the gaze of
+    one data message to the attention table, which keeps the likelihoods up to date.
+
+    Both engines give exactly the same results, PythonEngine loops over the blocks while
+    NumpyEngine does the filtering as one vectorized pass and is the better choice for scenes
+    with many objects. NumpyEngine needs numpy. The block closest to the gaze is found with the
+    spatial index of the attention table by both engines.
+"""
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# A gaze further than this from every block is not attributed to any block
+MAX_GAZE_DIST = 10000
+
+
+def apply_gaze(table, positions):
+    """ Give the block closest to each gaze position one more unit of attention.
+        param: table [AttentionTable]
+               positions [list of gaze positions, each a list of float]
+        return: None
+    """
+    for pos in positions:
+        slot = table.nearest(pos[0], pos[1], MAX_GAZE_DIST)
+        if slot is not None:
+            table.add_attention(slot)
+
+
+class PythonEngine(object):
+    """ Disambiguation with plain python loops over the columns of the attention table.
+    """
+    def disambiguate(self, table, p1a, attention_pos):
+        """ Filter the blocks on the verbal attributes and give the block closest to the gaze one
+            more unit of attention. The table keeps the likelihoods up to date.
+            param: table [AttentionTable]
+                   p1a [list of String, the known attributes given by the user]
+                   attention_pos [list of float, the position of the gaze or empty]
+            return: None
+        """
+        # Filter on the verbal attributes
+        if p1a:
+            table.set_include([c in p1a for c in table.c])
+        # Handle gaze
+        if attention_pos:
+            apply_gaze(table, (attention_pos,))
+
+
+class NumpyEngine(object):
+    """ Disambiguation with numpy. The color codes of the blocks are kept as a numpy column that
+        is rebuilt only when the table version changes, i.e. after update messages, and the
+        filter is one vectorized comparison against it.
+    """
+    def __init__(self):
+        if numpy is None:
+            raise ImportError("The numpy engine needs numpy")
+        self.table = None
+        self.version = None
+        self.code = None
+        # Color name -> color code
+        self.codes = {}
+
+    def _columns(self, table):
+        """ Rebuild the cached columns if the table has changed since they were built.
+        """
+        if table is self.table and table.version == self.version:
+            return
+        codes = self.codes
+        self.code = numpy.array([codes.setdefault(c, len(codes)) for c in table.c],
+                                dtype=numpy.int64)
+        self.table = table
+        self.version = table.version
+
+    def disambiguate(self, table, p1a, attention_pos):
+        """ See PythonEngine.disambiguate.
+        """
+        # Filter on the verbal attributes
+        if p1a and len(table):
+            self._columns(table)
+            p1a_codes = [self.codes[attr] for attr in p1a if attr in self.codes]
+            table.set_include(numpy.isin(self.code, p1a_codes).tolist())
+        # Give the block closest to the gaze one more unit of attention
+        if attention_pos:
+            apply_gaze(table, (attention_pos,))
+
+
+ENGINES = {"python": PythonEngine, "numpy": NumpyEngine}
+
+
+def make_engine(name):
+    """ Create the disambiguation engine with the given name.
+        param: name [String, "python" or "numpy"]
+        return: engine
+    """
+    if name not in ENGINES:
+        raise ValueError("Unknown disambiguation engine: {}".format(name))
+    return ENGINES[name]()
@@ -1,13 +1,11 @@
 import json
-import os
 import random
-import select
-import sys
 import threading
 import time
 from multiprocessing import Process
 
-from .client import Client
+from .async_client import SyncClient
+from .framing import REMOVE_MESSAGE, SCENE_MESSAGE, BinaryFrame, pack_remove, pack_update
 
 
 class ArchitectureDummy(Process):
@@ -16,14 +14,8 @@ class ArchitectureDummy(Process):
         """
         super(ArchitectureDummy ,self).__init__()
 
-        # Create a pipe to communicate to the client process
-        self.pipe_in_client, self.pipe_out = os.pipe()
-        self.pipe_in, self.pipe_out_client = os.pipe()
-        # Create a client object to communicate with the server
-        self.client = Client(client_type="the_architecture",
-                             pipe_in=self.pipe_in_client,
-                             pipe_out=self.pipe_out_client)
-        self.client.start()
+        # The client that communicates with the server is created in run()
+        self.client = None
 
         # Initialize the things that can be sent
         self.y_range = (-30, 30)
@@ -41,9 +33,12 @@ class ArchitectureDummy(Process):
         self.p1gp_freq = 0.2
 
     def run(self):
-        p1a = Process(target=self._p1a_loop)
+        self.client = SyncClient(client_type="the_architecture")
+        self.client.start()
+        # The client is thread safe so both loops can share it
+        p1a = threading.Thread(target=self._p1a_loop)
         p1a.start()
-        p1gp = Process(target=self._p1gp_loop)
+        p1gp = threading.Thread(target=self._p1gp_loop)
         p1gp.start()
 
     def _p1a_loop(self):
@@ -55,9 +50,7 @@ class ArchitectureDummy(Process):
                        "P1F":[random.choice(self.p1f)],
                        "P1G":[random.choice(self.p1g)],
                        "P1H":[random.choice(self.p1h)]}
-            message = "interpreter;data;{}$".format(json.dumps(message))
-            os.write(self.pipe_out, message.encode("utf-8"))
-            sys.stdout.flush()
+            self.client.send("interpreter", "data;{}".format(json.dumps(message)))
             time.sleep(self.p1a_freq)
     
     def _p1gp_loop(self):
@@ -65,25 +58,19 @@ class ArchitectureDummy(Process):
         while True:
             message = {"P1GP":[random.randint(self.x_range[0],self.x_range[1])/100,
                                random.randint(self.y_range[0],self.y_range[1])/100]}
-            message = "interpreter;data;{}$".format(json.dumps(message))
-            os.write(self.pipe_out, message.encode("utf-8"))
-            sys.stdout.flush()
+            self.client.send("interpreter", "data;{}".format(json.dumps(message)))
             time.sleep(self.p1gp_freq)
 
 class YuMiDummy(Process):
-    def __init__(self):
+    def __init__(self, binary=False):
         """ Constructor
+        param: binary [bool, send the scene as a SCENE_MESSAGE and a pick as a REMOVE_MESSAGE]
         """
         super(YuMiDummy ,self).__init__()
+        self.binary = binary
 
-        # Create a pipe to communicate to the client process
-        self.pipe_in_client, self.pipe_out = os.pipe()
-        self.pipe_in, self.pipe_out_client = os.pipe()
-        # Create a client object to communicate with the server
-        self.client = Client(client_type="yumi",
-                             pipe_in=self.pipe_in_client,
-                             pipe_out=self.pipe_out_client)
-        self.client.start()
+        # The client that communicates with the server is created in run()
+        self.client = None
 
         # Initialize the things that can be sent
         self.y_range = (-30, 30)
@@ -96,25 +83,18 @@ class YuMiDummy(Process):
         self.upd_freq = 5
 
     def run(self):
-        listener = Process(target=self._tcp_listener, args=(self,))
-        listener.start()
+        # Incomming messages are handled by _on_message in the client thread
+        self.client = SyncClient(client_type="yumi", binary=self.binary,
+                                 on_message=self._on_message)
+        self.client.start()
         self._update_loop()
 
-    def _tcp_listener(self, parent):
-        while True:
-            # Wait for incomming message from the server (via the client)
-            socket_list = [self.pipe_in]
-            # Get the list sockets which are readable
-            read_sockets, _, _ = select.select(socket_list, [], [])
-            for sock in read_sockets:
-                # Incoming message from server
-                if sock == self.pipe_in:
-                    data = os.read(self.pipe_in, 4096)
-                    if not data:
-                        #self.log("Disconnected from server")
-                        sys.exit()
-                    else:
-                        parent._remove_block(data.decode("utf-8"))
+    def _on_message(self, data):
+        if isinstance(data, BinaryFrame):
+            # The commands of the interpreter are text messages
+            data = bytes(data.payload).decode("utf-8", "replace")
+        if data is not None:
+            self._remove_block(data)
 
     def _update_loop(self):
         self.blocks = []
@@ -124,18 +104,19 @@ class YuMiDummy(Process):
                                 "y":random.randint(self.y_range[0], self.y_range[1])/100,
                                 "c":random.randint(self.c_range[0], self.c_range[1])})
         while True:
-            for block in self.blocks:
-                message = "interpreter;update;{}$".format(json.dumps(block))
-                os.write(self.pipe_out, message.encode("utf-8"))
-                sys.stdout.flush()
-                time.sleep(0.1)
+            # The whole scene in one message, copied since blocks are removed by the client thread
+            if self.binary:
+                self.client.send("interpreter", pack_update(list(self.blocks)), SCENE_MESSAGE)
+            else:
+                self.client.send("interpreter", "scene;{}".format(json.dumps(list(self.blocks))))
             time.sleep(self.upd_freq)
 
     def _remove_block(self, message):
+        # The position is sent either as "action;x;y" or as "action;x,y"
         message = message.replace("$", "")
-        message = message.split(";")
-        x_cord = float(message[1].split(",")[0])
-        y_cord = float(message[1].split(",")[1])
+        message = message.replace(",", ";").split(";")
+        x_cord = float(message[1])
+        y_cord = float(message[2])
         print(len(self.blocks))
         for i, block in enumerate(self.blocks):
             print("{} == {} and {} == {}: {}".format(block["x"],
@@ -143,7 +124,13 @@ class YuMiDummy(Process):
                                                      block["y"], 
                                                      y_cord, block["x"] == x_cord and block["y"] == y_cord))
             if block["x"] == x_cord and block["y"] == y_cord:
-                print("Removing block {} at ({0:.4f}, {0:.4f})".\
+                print("Removing block {} at ({:.4f}, {:.4f})".\
                       format(block["id"], block["x"], block["y"]))
                 self.blocks.pop(i)
+                # Tell the interpreter right away rather than with the next scene
+                if self.binary:
+                    self.client.send("interpreter", pack_remove([block["id"]]), REMOVE_MESSAGE)
+                else:
+                    self.client.send("interpreter",
+                                     "delta;{}".format(json.dumps({"removed": [block["id"]]})))
                 break
@@ -0,0 +1,96 @@
+""" A least recently used cache of the results of DataHandler.filter, keyed by the attributes
+    filtered on, so that a user repeating a description doesn't filter the catalogue again.
+"""
+
+from collections import OrderedDict, namedtuple
+
+# attributes: the sorted attributes filtered on, the key of the result
+# values: the values that contain one of the attributes
+# counts: the number of those values every row holds, see attribute_index.count_bits
+# rows: bitset of the selected rows
+# selection: the selected rows
+FilterResult = namedtuple("FilterResult", ["attributes", "values", "counts", "rows",
+                                           "selection"])
+
+
+class FilterCache(object):
+    """ At most capacity filter results, the least recently used one is dropped to make room for
+        a new one. A result is dropped as soon as a row it depends on changes, see invalidate().
+    """
+    def __init__(self, capacity=64):
+        self.capacity = capacity
+        self.results = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        # Misses that were filtered from the result of fewer attributes
+        self.refinements = 0
+        self.invalidated = 0
+
+    def __len__(self):
+        return len(self.results)
+
+    def __contains__(self, attributes):
+        return attributes in self.results
+
+    def get(self, attributes):
+        """ Return the result of filtering on attributes and count the hit or miss.
+            param: attributes [tuple of String, sorted]
+            return: [FilterResult, or None if it isn't cached]
+        """
+        result = self.peek(attributes)
+        if result is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return result
+
+    def peek(self, attributes):
+        """ Return the result of filtering on attributes without counting a hit or miss.
+            param: attributes [tuple of String, sorted]
+            return: [FilterResult or None]
+        """
+        result = self.results.get(attributes)
+        if result is not None:
+            self.results.move_to_end(attributes)
+        return result
+
+    def put(self, result, refined=False):
+        """ Add a result.
+            param: result [FilterResult]
+                   refined [bool, if it was filtered from the result of fewer attributes]
+            return: None
+        """
+        if refined:
+            self.refinements += 1
+        if self.capacity <= 0:
+            return
+        self.results[result.attributes] = result
+        self.results.move_to_end(result.attributes)
+        while len(self.results) > self.capacity:
+            self.results.popitem(last=False)
+
+    def invalidate(self, row, removed=(), added=()):
+        """ Drop the results that contain a row that changed, and the results whose counts
+            change because the row lost or gained a value that contains one of their
+            attributes.
+            param: row [int]
+                   removed [set of String, the searchable values the row no longer holds]
+                   added [set of String, the searchable values the row holds now]
+            return: None
+        """
+        stale = [attributes for attributes, result in self.results.items() if
+                 (result.rows >> row) & 1 or not result.values.isdisjoint(removed) or
+                 any(attribute in value for value in added for attribute in attributes)]
+        for attributes in stale:
+            del self.results[attributes]
+        self.invalidated += len(stale)
+
+    def stats(self):
+        """ Return the counters.
+            param: N/A
+            return: [dictionary]
+        """
+        lookups = self.hits + self.misses
+        return {"results": len(self.results), "hits": self.hits, "misses": self.misses,
+                "refinements": self.refinements, "invalidated": self.invalidated,
+                "hit_rate": self.hits / lookups if lookups else 0.0}
@@ -0,0 +1,277 @@
+""" Framing of the protocols used between the kernel server and its clients.
+
+    Text frames are strings of the form "recipient;payload" followed by the end-message symbol
+    "$". This is what every client speaks by default.
+
+    Binary frames are negotiated in the handshake, "client_type;<name>;framing=binary$", and
+    consist of a header
+        payload length  [uint32, network byte order]
+        message type    [uint8, one of the *_MESSAGE constants]
+        recipient size  [uint8]
+    followed by the utf-8 encoded recipient and the payload. The server routes binary frames on
+    the header alone and never looks at the payload.
+"""
+
+import struct
+from collections import namedtuple
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# Control characters are not part of the protocol and are removed from every text frame.
+CONTROL_CHARS = bytes(range(32))
+TERMINATOR = b"$"
+
+# Commands that older clients send without the end-message symbol.
+LEGACY_COMMANDS = (b"client_type;", b"close me")
+
+# Binary message types
+TEXT_MESSAGE = 0        # A utf-8 payload in the text protocol, e.g. 'data;{"P1GP": [0.3, 0.1]}'
+MSGPACK_MESSAGE = 1     # A msgpack encoded payload
+GAZE_MESSAGE = 2        # One or more GAZE_RECORDs
+UPDATE_MESSAGE = 3      # One or more UPDATE_RECORDs
+SCENE_MESSAGE = 4       # Every block in the scene as UPDATE_RECORDs, the others are gone
+REMOVE_MESSAGE = 5      # One or more REMOVE_RECORDs
+
+HEADER = struct.Struct("!IBB")
+# x, y
+GAZE_RECORD = struct.Struct("!dd")
+# id, x, y, c
+UPDATE_RECORD = struct.Struct("!iddi")
+# id
+REMOVE_RECORD = struct.Struct("!i")
+# Frames larger than this are treated as a broken stream
+MAX_FRAME_SIZE = 16 * 1024 * 1024
+
+BinaryFrame = namedtuple("BinaryFrame", ["msg_type", "recipient", "payload", "raw"])
+
+
+class FramingError(ValueError):
+    """ Raised when a stream can not be split into frames.
+    """
+    pass
+
+
+class FrameBuffer(object):
+    """ The receive buffer of one text connection. Chunks read from the socket are appended to a
+        bytearray and complete frames are cut out of it at the end-message symbol, so a frame that
+        is split over several reads is reassembled and a read that holds several frames yields all
+        of them.
+    """
+    def __init__(self, data=b"", terminator=TERMINATOR):
+        self.terminator = terminator
+        self.buffer = bytearray(data)
+        # Start of the first frame that has not been returned yet
+        self.start = 0
+        # Everything before this offset is known not to contain the terminator
+        self.scanned = 0
+
+    def __len__(self):
+        return len(self.buffer) - self.start
+
+    def feed(self, data):
+        """ Append a chunk of received data.
+            param: data [bytes]
+            return: None
+        """
+        self.buffer += data
+
+    def next_frame(self):
+        """ Cut the next complete frame out of the buffer.
+            param: N/A
+            return: frame [bytes without the end-message symbol, or None]
+        """
+        end = self.buffer.find(self.terminator, max(self.start, self.scanned))
+        if end == -1:
+            # Compact the buffer once every complete frame has been returned
+            del self.buffer[:self.start]
+            self.start = 0
+            # A terminator may be split over two reads, its first bytes are scanned again
+            self.scanned = max(0, len(self.buffer) - len(self.terminator) + 1)
+            return None
+        with memoryview(self.buffer) as view:
+            frame = view[self.start:end].tobytes().translate(None, CONTROL_CHARS)
+        self.start = end + len(self.terminator)
+        return frame
+
+    def frames(self, data):
+        """ Append a chunk of received data and return all the frames completed by it.
+            param: data [bytes]
+            return: frames [list of bytes]
+        """
+        self.feed(data)
+        frames = []
+        frame = self.next_frame()
+        while frame is not None:
+            frames.append(frame)
+            frame = self.next_frame()
+        return frames
+
+    def is_legacy_command(self):
+        """ Test if the data waiting in the buffer is a command that is sent without the
+            end-message symbol, i.e. the client_type handshake or "close me".
+            param: N/A
+            return: [bool]
+        """
+        pending = bytes(self.buffer[self.start:]).translate(None, CONTROL_CHARS)
+        return pending.startswith(LEGACY_COMMANDS[0]) or pending == LEGACY_COMMANDS[1]
+
+    def take_pending(self):
+        """ Empty the buffer and return what was in it.
+            param: N/A
+            return: [bytes]
+        """
+        pending = bytes(self.buffer[self.start:])
+        self.buffer.clear()
+        self.start = 0
+        self.scanned = 0
+        return pending
+
+
+class BinaryFrameBuffer(object):
+    """ The receive buffer of one connection that uses binary framing.
+    """
+    def __init__(self, data=b""):
+        self.buffer = bytearray(data)
+        self.start = 0
+
+    def __len__(self):
+        return len(self.buffer) - self.start
+
+    def feed(self, data):
+        """ Append a chunk of received data.
+            param: data [bytes]
+            return: None
+        """
+        self.buffer += data
+
+    def next_frame(self):
+        """ Cut the next complete frame out of the buffer.
+            param: N/A
+            return: frame [BinaryFrame or None]
+        """
+        available = len(self.buffer) - self.start
+        if available >= HEADER.size:
+            length, msg_type, recipient_size = HEADER.unpack_from(self.buffer, self.start)
+            if length > MAX_FRAME_SIZE:
+                raise FramingError("Frame of {} bytes exceeds the maximum size".format(length))
+            size = HEADER.size + recipient_size + length
+            if available >= size:
+                with memoryview(self.buffer) as view:
+                    raw = view[self.start:self.start + size].tobytes()
+                self.start += size
+                offset = HEADER.size + recipient_size
+                recipient = raw[HEADER.size:offset].decode("utf-8", "replace")
+                return BinaryFrame(msg_type, recipient, memoryview(raw)[offset:], raw)
+        del self.buffer[:self.start]
+        self.start = 0
+        return None
+
+    def frames(self, data):
+        """ Append a chunk of received data and return all the frames completed by it.
+            param: data [bytes]
+            return: frames [list of BinaryFrame]
+        """
+        self.feed(data)
+        frames = []
+        frame = self.next_frame()
+        while frame is not None:
+            frames.append(frame)
+            frame = self.next_frame()
+        return frames
+
+    def is_legacy_command(self):
+        return False
+
+    def take_pending(self):
+        """ Empty the buffer and return what was in it.
+            param: N/A
+            return: [bytes]
+        """
+        pending = bytes(self.buffer[self.start:])
+        self.buffer.clear()
+        self.start = 0
+        return pending
+
+
+def encode_frame(msg_type, recipient, payload):
+    """ Encode a binary frame.
+        param: msg_type [int]
+               recipient [String]
+               payload [bytes]
+        return: [bytes]
+    """
+    recipient = recipient.encode("utf-8")
+    return HEADER.pack(len(payload), msg_type, len(recipient)) + recipient + bytes(payload)
+
+
+def pack_gaze(points):
+    """ Pack gaze points into the payload of a GAZE_MESSAGE.
+        param: points [list of (x, y)]
+        return: [bytes]
+    """
+    return b"".join(GAZE_RECORD.pack(x, y) for x, y in points)
+
+
+def unpack_gaze(payload):
+    """ Unpack the payload of a GAZE_MESSAGE.
+        param: payload [bytes]
+        return: [list of (x, y)]
+    """
+    return list(GAZE_RECORD.iter_unpack(payload))
+
+
+def pack_update(blocks):
+    """ Pack blocks into the payload of an UPDATE_MESSAGE.
+        param: blocks [list of dictionaries with the keys id, x, y and c]
+        return: [bytes]
+    """
+    return b"".join(UPDATE_RECORD.pack(block["id"], block["x"], block["y"], block["c"])
+                    for block in blocks)
+
+
+def unpack_update(payload):
+    """ Unpack the payload of an UPDATE_MESSAGE.
+        param: payload [bytes]
+        return: [list of dictionaries]
+    """
+    return [{"id": bid, "x": x, "y": y, "c": c} for bid, x, y, c in
+            UPDATE_RECORD.iter_unpack(payload)]
+
+
+def pack_remove(ids):
+    """ Pack block ids into the payload of a REMOVE_MESSAGE.
+        param: ids [list of int]
+        return: [bytes]
+    """
+    return b"".join(REMOVE_RECORD.pack(bid) for bid in ids)
+
+
+def unpack_remove(payload):
+    """ Unpack the payload of a REMOVE_MESSAGE.
+        param: payload [bytes]
+        return: [list of int]
+    """
+    return [bid for bid, in REMOVE_RECORD.iter_unpack(payload)]
+
+
+def pack_msgpack(obj):
+    """ Pack an object into the payload of a MSGPACK_MESSAGE.
+        param: obj [any msgpack serializable object]
+        return: [bytes]
+    """
+    if msgpack is None:
+        raise ImportError("The msgpack package is needed for MSGPACK_MESSAGE payloads")
+    return msgpack.packb(obj, use_bin_type=True)
+
+
+def unpack_msgpack(payload):
+    """ Unpack the payload of a MSGPACK_MESSAGE.
+        param: payload [bytes]
+        return: [object]
+    """
+    if msgpack is None:
+        raise ImportError("The msgpack package is needed for MSGPACK_MESSAGE payloads")
+    return msgpack.unpackb(bytes(payload), raw=False)
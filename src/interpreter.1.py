@@ -139,12 +139,10 @@ class Interpreter(Process):
             self.send("yumi;{};{},{}$".format(self.current_action,
                                               current_block["x"],
                                               current_block["y"]))
-        # If there are many objects left the hololens will highlight the ones considered
+        # If there are many objects left the hololens will highlight the ones considered. The
+        # message is built from the highlight entries kept for the blocks that didn't change.
         else:
-            msg = []
-            for item in self.data_handler.get_all_considered():
-                msg.append("{},{},{}".format(item["id"], item["x"][:5], item["y"][:5]))
-            msg = ";".join(msg)
+            msg = ";".join(self.data_handler.get_highlight())
             msg = "{};{}$".format("hololens", msg)
             self.send(msg)
 
@@ -196,6 +194,8 @@ class Interpreter(Process):
         print("======Interpeter state======")
         print("current action:\t{}".format(self.current_action))
         print("nr items      :\t{}".format(len(self.data_handler.current_filter)))
+        print("filter cache  :\t{hit_rate:.0%} hits, {results} results".format(
+            **self.data_handler.filters.stats()))
         print("current attributes:")
         for attribute in self.data_handler.current_attributes:
             print("\t{}".format(attribute))
@@ -1,274 +1,220 @@
 """ Module doc string
 """
-import ast
-import math
-import os
-import select
+import struct
 import sys
 from multiprocessing import Process
 import time
-import threading
-from .client import Client
+import zlib
+from .async_client import SyncClient
+from .checkpoint import Checkpoint
+from .dashboard import Dashboard, snapshot
+from .decoder import DEFAULT_PARTICIPANT, Decoder, DecodeError
+from .disambiguation import make_engine
+from .framing import TEXT_MESSAGE, BinaryFrame
+from .session import Sessions
+from .shards import ShardPool
 
 
 class Interpreter(Process):
     """ The Interpreter-class is a intermediator between the arcitecture and the ROS-network.
+        Every participant has its own attention model, a session.Session. The sessions are kept
+        in the interpreter process, or spread over workers processes if workers is given.
     """
-    def __init__(self, log_queue=None):
+    def __init__(self, log_queue=None, engine="python", gaze_batch_size=64, gaze_latency=0.05,
+                 dashboard=True, dashboard_port=None, workers=0, attention_window=None,
+                 attention_half_life=None, attention_history=4096, object_ttl=None,
+                 checkpoint=None, checkpoint_every=1.0, binary=False):
         """ Constructor
-        param: data_base_file [path]
+        param: log_queue [Queue]
+               engine [String, the disambiguation engine, "python" or "numpy"]
+               gaze_batch_size [int, the most gaze samples applied together, 1 turns batching off]
+               gaze_latency [float, seconds a gaze sample may wait for the rest of its batch]
+               dashboard [bool, draw the attention table in the terminal]
+               dashboard_port [int, serve the attention table as JSON on this port]
+               workers [int, the number of worker processes for the sessions, 0 for none]
+               attention_window [float, seconds that a gaze hit counts, None for ever]
+               attention_half_life [float, seconds until a gaze hit counts half, None for never]
+               attention_history [int, the most gaze hits kept for the window]
+               object_ttl [float, seconds until a block missing from the updates is removed]
+               checkpoint [String, path of the file the state is saved in and restored from]
+               checkpoint_every [float, the most seconds between two checkpoints]
+               binary [bool, use binary framing, so that gaze, update, scene and remove frames
+                       are received as well as text messages]
         return: Interpreter [Process]
+        raises: ValueError if both workers and checkpoint are given, checkpoints are not
+                available with workers
         """
+        if workers and checkpoint is not None:
+            raise ValueError("Checkpoints are not available with workers")
         super(Interpreter, self).__init__()
         self.log_queue = log_queue
-        # Create a pipe to communicate to the client process
-        self.pipe_in_client, self.pipe_out = os.pipe()
-        self.pipe_in, self.pipe_out_client = os.pipe()
-
-        # Create a client object to communicate with the server
-        self.client = Client(client_type="interpreter",
-                             pipe_in=self.pipe_in_client,
-                             pipe_out=self.pipe_out_client)
-        self.client.start()
+        # The client that communicates with the server is created in run(), in the interpreter
+        # process, since it owns the socket.
+        self.client = None
+        # The dashboard process, also created in run(). Without a dashboard no snapshots are
+        # taken at all.
+        self.show_dashboard = dashboard
+        self.dashboard_port = dashboard_port
+        self.dashboard = None
+        # The checkpoint file, opened in run()
+        self.checkpoint_path = checkpoint
+        self.checkpoint_every = checkpoint_every
+        self.checkpoint = None
 
         # Create and initialize the variables
+        self.engine = make_engine(engine)
+        self.decoder = Decoder()
+        self.gaze_batch_size = gaze_batch_size
+        self.gaze_latency = gaze_latency
+        self.attention_window = attention_window
+        self.attention_half_life = attention_half_life
+        self.attention_history = attention_history
+        self.object_ttl = object_ttl
         self.print_every = 1.0
         self.likelihood_threshold = 1.2
-        self.current_action = "pick"
         self.known_attr = ["red", "blue", "green", "yellow"]
-        self.attention_table = []
-        self.first_verbal = False
-        self.first_disamb = False
-        self._reset()
-
-    def _reset(self):
-        self.current_action = "pick"
-        self.attention_table = []
-        self.first_verbal = False
-        self.first_disamb = False
+        self.workers = workers
+        self.binary = binary
+        # The sessions of the participants, replaced by a ShardPool in run() if there are workers
+        self.sessions = Sessions(self, self._send)
+
+    @property
+    def attention_table(self):
+        """ The attention table of the default participant. Not available when the sessions are
+            kept by worker processes, the tables are in the workers then.
+            raises: RuntimeError with workers, once run() started them
+        """
+        if isinstance(self.sessions, ShardPool):
+            raise RuntimeError("The attention tables are kept by {} worker processes and can't "
+                               "be read from the interpreter".format(len(self.sessions)))
+        return self.sessions.get(DEFAULT_PARTICIPANT).attention_table
 
     def run(self):
         """ Main loop. Simply read messages from the server and send them to self._parse() to take
-        appropriate action. 
+        appropriate action. The messages that are waiting are read together so that the gaze
+        among them can be applied as one batch. Every print_every seconds a snapshot of the
+        attention table of the default participant is handed to the dashboard, which is not
+        used when the sessions are kept by worker processes. Likewise, the state of the sessions
+        is saved to the checkpoint file, at most every checkpoint_every seconds, and restored
+        from it when the interpreter starts.
         param: N/A
         return: N/A
         """
-        self._print_blocks()
+        self.client = SyncClient(client_type="interpreter", binary=self.binary)
+        self.client.start()
+        if self.workers:
+            self.sessions = ShardPool(self.workers, self, self._send)
+            self.sessions.start()
+        else:
+            if self.show_dashboard or self.dashboard_port is not None:
+                self.dashboard = Dashboard(render=self.show_dashboard, port=self.dashboard_port)
+                self.dashboard.start()
+            if self.checkpoint_path is not None:
+                self._restore()
+        next_snapshot = time.monotonic()
+        # Time of the next checkpoint, None while nothing has changed since the last one
+        next_checkpoint = None
         while True:
-            # Wait for incomming message from the server (via the client)
-            socket_list = [self.pipe_in]
-            # Get the list sockets which are readable
-            read_sockets, _, _ = select.select(socket_list, [], [])
-            for sock in read_sockets:
-                # Incoming message from server
-                if sock == self.pipe_in:
-                    data = os.read(self.pipe_in, 4096)
-                    if not data:
-                        #self.log("Disconnected from server")
-                        sys.exit()
-                    else:
-                        self._parse(data.decode("utf-8"))
+            timeout = None
+            if self.dashboard is not None:
+                timeout = max(0.0, next_snapshot - time.monotonic())
+            if next_checkpoint is not None:
+                wait = max(0.0, next_checkpoint - time.monotonic())
+                timeout = wait if timeout is None else min(timeout, wait)
+            # Wait for incomming messages from the server
+            for data in self.client.receive_many(timeout=timeout):
+                if data is None:
+                    #self.log("Disconnected from server")
+                    self.sessions.flush_gaze()
+                    if self.workers:
+                        self.sessions.stop()
+                    if self.dashboard is not None:
+                        self.dashboard.stop()
+                    if self.checkpoint is not None:
+                        self.checkpoint.save(self.sessions.state())
+                        self.checkpoint.close()
+                    sys.exit()
+                self._parse(data)
+                if self.checkpoint is not None and next_checkpoint is None:
+                    next_checkpoint = time.monotonic() + self.checkpoint_every
+            self.sessions.flush_gaze()
+            self.sessions.evict()
+            if next_checkpoint is not None and time.monotonic() >= next_checkpoint:
+                self.checkpoint.save(self.sessions.state())
+                next_checkpoint = None
+            if self.dashboard is not None and time.monotonic() >= next_snapshot:
+                self.dashboard.publish(snapshot(self.sessions.get(DEFAULT_PARTICIPANT),
+                                                self.decoder, self.sessions.stats()))
+                next_snapshot = time.monotonic() + self.print_every
+
+    def _restore(self):
+        """ Open the checkpoint file and continue from the state saved in it, if any.
+        """
+        self.checkpoint = Checkpoint(self.checkpoint_path)
+        try:
+            self.checkpoint.open()
+        except (OSError, ValueError) as error:
+            # Not a file of ours, it is left alone and no checkpoints are saved
+            self.log("Unable to open the checkpoint, checkpoints are off: {}".format(error))
+            self.checkpoint = None
+            return
+        try:
+            state = self.checkpoint.load()
+            if state is None:
+                return
+            self.sessions.restore(state)
+        except (ValueError, KeyError, TypeError, struct.error, zlib.error) as error:
+            self.log("Unable to restore the checkpoint: {}".format(error))
+            self.sessions = Sessions(self, self._send)
+            return
+        self.log("Restored {} sessions and {} blocks from {}".format(
+            len(self.sessions), len(self.sessions.scene), self.checkpoint_path))
 
     def _parse(self, data):
         """ Interperet the incomming message and take appropriate action.
-        param: data [String, format defined in README.md]
+        param: data [String, format defined in README.md, or BinaryFrame with binary framing]
         return: N/A
         """
         #self.log("Parsing data: {}".format(data))
-        
-        # Preporcess the data message.
-        data = data.replace("$", "")
-        data = data.split(";")
-        for i in range(1, len(data)):
-            try:
-                data[i] = ast.literal_eval(data[i])
-            except SyntaxError:
-                return
-        if data[0] == "update":
-            self._update_block_array(data)
-        elif data[0] == "data":
-            self._disambiguate(data)
-        else:
-            self.log("Unknown message type: {}".format(data[0]))
-
-    def _disambiguate(self, data):
-        data = data[1]
-        p1a = []
-        attention_pos = []
-        # Extract verbal requests
-        if "P1A" in data.keys():
-            p1a = [attr for attr in data["P1A"] if attr in self.known_attr]
-        # Extract gaze
-        if "P1GP" in data.keys():
-            attention_pos = data["P1GP"]
-        min_dist = None
-        attention_block = None
-        if attention_pos:
-            min_dist = 10000
-        # Set the first_disamb flag to indicate that there exists information.
-        if p1a and self.attention_table:
-            self.first_disamb = True
-
-        # Iterate through the blocks and filter
-        for block in self.attention_table:
-            # Handle verbal attribute
-            if p1a and not block["c"] in p1a:
-                block["include"] = False
-            elif p1a and block["c"] in p1a:
-                block["include"] = True
-            # Handle gaze
-            if attention_pos:
-                dist = self._dist([block["x"], block["y"]], attention_pos)
-                if dist < min_dist:
-                    min_dist = dist
-                    attention_block = block
-        if attention_block:
-            attention_block["at"] += 1
-
-        # Iterate through the blocks and calculate likelihood
-        inc_list = [block["at"] for block in self.attention_table if block["include"]]
-        nr_block = len(inc_list)
-        tot_att = sum(inc_list)
-        tot_lh = 0
-        for block in self.attention_table:
-            if block["include"]:
-                if not tot_att == 0:
-                    lh = (1/float(nr_block)) * (block["at"]/float(tot_att))
-                else:
-                    lh = (1/float(nr_block))
-                tot_lh += lh
-                block["lh"] = lh
+        try:
+            if not isinstance(data, BinaryFrame):
+                messages = [self.decoder.decode(data)]
+            elif data.msg_type == TEXT_MESSAGE:
+                messages = [self.decoder.decode(bytes(data.payload).decode("utf-8", "replace"))]
             else:
-                block["lh"] = 0.0
-        if not tot_lh:
-            tot_lh = len(self.attention_table)
-        for block in self.attention_table:
-            block["lh"] = block["lh"]/tot_lh
-        
-        # Test if the likelihood is high enough, if so execute command. If the likelihood is not 
-        # high enough but there is a positive feedback in the P1F message then the action should 
-        # be executed any way.
-        if "P1F" in data.keys():
-            if "yes" in data["P1F"]:
-                self._test_if_execute(th=0)
-            elif "no" in data["P1F"]:
-                self._forget_info()
-                return
-            else:
-                self._test_if_execute()
-        else:
-            self._test_if_execute()
-        #self._test_if_execute()
-
-    def _forget_info(self):
-        """ Forget the information and start over.
-        """
-        if self.attention_table:
-            for block in self.attention_table:
-                block["lh"] = 0
-                block["at"] = 0
-                block["include"] = True
-        self.first_disamb = False
-
-    def _test_if_execute(self, th=None):
-        """ Test if the likelihood is high enough, if so send a execute command to YuMi.
-        """
-        if th is None:
-            th = self.likelihood_threshold
-
-        if not self.first_disamb:
-            return True
-        # Extract the block with the highest likelihood
-        most_likely_block = sorted(self.attention_table, key=lambda k: k['lh'], reverse=True)[0]
-        if most_likely_block["lh"] >= th:
-            self._send("yumi;{};{};{}$".format(self.current_action,
-                                              most_likely_block["x"],
-                                              most_likely_block["y"]))
-            self._reset()
-            return True
-        return False
-
-    def _dist(self, pos1, pos2):
-        """ Calculate and return the euclidean distance.
-        """
-        return math.sqrt(sum([(a - b) ** 2 for a, b in zip(pos1, pos2)]))
-    
-    def _update_block_array(self, data):
-        """ Update the self.attention_table list either add new blocks or edit their positions and colors. 
+                messages = self.decoder.decode_frame(data)
+        except DecodeError as error:
+            self.log(str(error))
+            return
+        for message in messages:
+            self._apply(message)
+
+    def _apply(self, message):
+        """ Take the action of a decoded message.
+        param: message [Message]
+        return: N/A
         """
-        data.pop(0)
-        for new_block in data:
-            # Test if the object has been seen before using its id.
-            block_in_list = next((item for item in self.attention_table if item["id"] == new_block["id"]), None)
-            if block_in_list:
-                # This block is already in the list, update the list
-                for key, value in new_block.items():
-                     block_in_list[key] = value
-            else:
-                # This block was not in the list, add it
-                new_block["lh"] = 0
-                new_block["at"] = 0
-                new_block["include"] = True
-                self.attention_table.append(new_block)
-        # Iterate through the blocks and comform the HSV colors to string values.
-        for block in self.attention_table:
-            if isinstance(block["c"], int):
-                block["c"] = self._hsv_to_string(block["c"])
-        #self._print_blocks()
-    
-    def _print_blocks(self):
-        threading.Timer(self.print_every, self._print_blocks).start()
-        clear = "\n" * 100
-        #while True:
-        print(clear)
-        print("_"*124)
-        print_list = []
-        if self.attention_table:
-            print_list = sorted(self.attention_table, key=lambda k: k['id'])
-            highest_lh = sorted(self.attention_table, key=lambda k: k['lh'], reverse=True)[0]
-            header = ["id", "x", "y", "c", "at", "include", "lh"]  
-            header_str = ""
-            for col in header:
-                header_str += "{:<11}".format(col)
-            print(header_str)
-        row_str = ""
-        for block in print_list:
-            for col in header:
-                if col == "lh":
-                    nr_lines = int(block[col]*50)
-                    nr_white = 50 - nr_lines
-                    str_ = "[" + "|"*nr_lines + " "*nr_white + "] {0:.2f}%".format(block[col]*100)
-                elif isinstance(block[col], float):
-                    str_ = "{0:.4f}".format(block[col])
-                else:
-                    str_ = str(block[col])
-                row_str += "{:<11}".format(str_)
-            if highest_lh["id"] == block["id"]:
-                row_str += "\t<=="
-            row_str += "\n"
-        print(row_str)
-        print("_"*124)
-
-    def _hsv_to_string(self, hsv):
-        hsv *= 2
-        # Test if yellow
-        if hsv > 30 and hsv <= 90:
-            return "yellow"
-        # Test if green
-        elif hsv > 90 and hsv <= 180:
-            return "green"
-        elif hsv > 180 and hsv <= 300:
-            return "blue"
-        return "red"
+        if message.kind == "update":
+            self.sessions.update(message.records)
+        elif message.kind == "scene":
+            self.sessions.replace_scene(message.records)
+        elif message.kind == "delta":
+            if message.removed:
+                self.sessions.remove(message.removed)
+            if message.records:
+                self.sessions.update(message.records)
+        else:
+            for data in message.records:
+                self.sessions.handle(data)
 
-    def _send(self, msg):
+    def _send(self, recipient, msg):
         """ Sends a message
-            param: msg [String]
+            param: recipient [String]
+                   msg [String]
             return: None
         """
         #self.log("Interpreter is sending: {}".format(msg))
-        os.write(self.pipe_out, msg.encode("utf-8"))
-        sys.stdout.flush()
+        self.client.send(recipient, msg)
 
     def log(self, message):
         """ Send the message to the log queue
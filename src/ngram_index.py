@@ -0,0 +1,74 @@
+""" An n-gram index over a set of strings for finding the strings that contain a substring, e.g.
+    the catalogue values that contain an attribute the user mentioned, "red" in "bright red".
+"""
+
+
+class NgramIndex(object):
+    """ Every string is indexed under each of its substrings of length 1 to n. A query of at
+        most n characters is looked up directly. A longer query is looked up under each of its
+        n-grams and the strings of the rarest one are checked with the in operator, so the
+        answer is exactly the strings that contain the query.
+    """
+    def __init__(self, n=3):
+        self.n = n
+        # n-gram -> the strings that contain it
+        self.grams = {}
+        self.strings = set()
+
+    def __len__(self):
+        return len(self.strings)
+
+    def __contains__(self, string):
+        return string in self.strings
+
+    def _grams(self, string, n):
+        return set(string[i:i + n] for i in range(len(string) - n + 1))
+
+    def add(self, string):
+        """ Add a string.
+            param: string [String]
+            return: None
+        """
+        if string in self.strings:
+            return
+        self.strings.add(string)
+        for n in range(1, self.n + 1):
+            for gram in self._grams(string, n):
+                self.grams.setdefault(gram, set()).add(string)
+
+    def discard(self, string):
+        """ Remove a string if it is in the index.
+            param: string [String]
+            return: None
+        """
+        if string not in self.strings:
+            return
+        self.strings.discard(string)
+        for n in range(1, self.n + 1):
+            for gram in self._grams(string, n):
+                strings = self.grams[gram]
+                strings.discard(string)
+                if not strings:
+                    del self.grams[gram]
+
+    def containing(self, query):
+        """ Return the strings that contain query.
+            param: query [String]
+            return: [list of String]
+        """
+        if not query:
+            return list(self.strings)
+        n = min(self.n, len(query))
+        if n == len(query):
+            # The query is one of the n-grams
+            return list(self.grams.get(query, ()))
+        # Every string that contains the query is in the postings of each of its n-grams,
+        # checking the shortest postings is cheaper than intersecting them
+        candidates = None
+        for gram in self._grams(query, n):
+            strings = self.grams.get(gram)
+            if strings is None:
+                return []
+            if candidates is None or len(strings) < len(candidates):
+                candidates = strings
+        return [string for string in candidates if query in string]
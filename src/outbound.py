@@ -0,0 +1,110 @@
+""" Outbound buffering for the kernel server. Every connection has an OutboundQueue that holds the
+    frames that have not yet been written to its socket, so a slow client never blocks the
+    server from routing messages to the others.
+"""
+
+from collections import deque
+
+# Drop the oldest queued droppable frames, i.e. gaze, when the queue grows past the high watermark.
+DROP_OLDEST = "drop_oldest"
+# Never drop anything, e.g. the commands sent to yumi.
+KEEP_ALL = "keep_all"
+
+
+class OutboundQueue(object):
+    """ A FIFO of frames waiting to be written to a non-blocking socket. Partial writes are
+        resumed from where they stopped. When more than high_watermark bytes are queued the queue
+        is under backpressure until it has been flushed below low_watermark; with the DROP_OLDEST
+        policy the oldest of the frames pushed as droppable are dropped to get there, the others
+        are always sent. A dropped frame is only marked as such, so that dropping a frame from
+        the middle of the queue doesn't depend on the length of the queue.
+    """
+    def __init__(self, policy=DROP_OLDEST, high_watermark=262144, low_watermark=65536):
+        if low_watermark > high_watermark:
+            raise ValueError("low_watermark must not be larger than high_watermark")
+        self.policy = policy
+        self.high_watermark = high_watermark
+        self.low_watermark = low_watermark
+        # [frame, droppable] of every queued frame, frame is None once it is dropped
+        self.frames = deque()
+        # The entries of the droppable frames in self.frames, the oldest first
+        self.droppable = deque()
+        # Number of queued frames, not counting the dropped ones
+        self.count = 0
+        # Number of queued bytes, not counting the part of the first frame already written
+        self.size = 0
+        # Number of bytes of the first frame already written
+        self.offset = 0
+        self.dropped = 0
+        self.backpressure = False
+
+    def __len__(self):
+        return self.count
+
+    def push(self, frame, droppable=False):
+        """ Queue a frame for sending.
+            param: frame [bytes]
+                   droppable [bool, if the frame may be dropped under the DROP_OLDEST policy]
+            return: dropped [int, number of frames dropped to make room]
+        """
+        entry = [frame, droppable]
+        self.frames.append(entry)
+        self.count += 1
+        self.size += len(frame)
+        if droppable:
+            self.droppable.append(entry)
+        if self.size <= self.high_watermark:
+            return 0
+        self.backpressure = True
+        if self.policy != DROP_OLDEST:
+            return 0
+        dropped = 0
+        # The frame just pushed is never dropped
+        while self.size > self.low_watermark and self.droppable and \
+                self.droppable[0] is not entry:
+            oldest = self.droppable.popleft()
+            # A frame that is partially written must be finished or the stream is corrupted
+            if self.offset and oldest is self.frames[0]:
+                continue
+            self.size -= len(oldest[0])
+            oldest[0] = None
+            self.count -= 1
+            dropped += 1
+        self.dropped += dropped
+        return dropped
+
+    def flush(self, sock):
+        """ Write as much as the socket accepts without blocking.
+            param: sock [socket, non-blocking]
+            return: [bool, True if the queue is empty]
+        """
+        while self.frames:
+            entry = self.frames[0]
+            frame = entry[0]
+            if frame is None:
+                self.frames.popleft()
+                continue
+            try:
+                sent = sock.send(memoryview(frame)[self.offset:])
+            except (BlockingIOError, InterruptedError):
+                break
+            self.offset += sent
+            self.size -= sent
+            if self.offset < len(frame):
+                break
+            self.frames.popleft()
+            self.count -= 1
+            self.offset = 0
+            if self.droppable and self.droppable[0] is entry:
+                self.droppable.popleft()
+        if self.backpressure and self.size <= self.low_watermark:
+            self.backpressure = False
+        return not self.frames
+
+    def depth(self):
+        """ Return the current depth of the queue.
+            param: N/A
+            return: [dictionary]
+        """
+        return {"frames": self.count, "bytes": self.size, "dropped": self.dropped,
+                "backpressure": self.backpressure}
@@ -0,0 +1,155 @@
+""" Book keeping of the clients connected to the kernel server.
+"""
+
+from .framing import FrameBuffer
+from .outbound import OutboundQueue
+
+
+class Connection(object):
+    """ The server side state of one client socket.
+    """
+    __slots__ = ("sock", "fd", "addr", "name", "topics", "binary", "frame_buffer", "outbound")
+
+    def __init__(self, sock, addr):
+        self.sock = sock
+        # The file descriptor is kept since sock.fileno() returns -1 once the socket is closed
+        self.fd = sock.fileno()
+        self.addr = addr
+        # The name is given by the client_type handshake
+        self.name = None
+        self.topics = set()
+        # Text framing until binary framing is negotiated in the handshake
+        self.binary = False
+        self.frame_buffer = FrameBuffer()
+        self.outbound = OutboundQueue()
+
+    def __repr__(self):
+        return "Connection({}, {})".format(self.name, self.addr)
+
+
+class RoutingTable(object):
+    """ Indexes the open connections both by client name and by file descriptor, so that finding
+        the recipients of a message or the name of a socket does not depend on the number of
+        connected clients. Several connections may share the same client name, e.g. when more
+        than one hololens is connected. A connection can also subscribe to topics, a message sent
+        to a topic is delivered to every subscriber.
+    """
+    def __init__(self):
+        self.by_name = {}
+        self.by_fd = {}
+        self.by_topic = {}
+
+    def __len__(self):
+        return len(self.by_fd)
+
+    def add(self, connection):
+        """ Add a newly accepted connection that has not presented itself yet. A connection left
+            behind on the same file descriptor is dropped first, since the operating system
+            reuses the numbers of closed sockets.
+            param: connection [Connection]
+            return: stale [Connection or None]
+        """
+        stale = self.by_fd.get(connection.fd)
+        if stale is not None:
+            self.remove(stale)
+        self.by_fd[connection.fd] = connection
+        return stale
+
+    def register(self, connection, name):
+        """ Give the connection a client name. A connection that presents itself again is moved
+            from its old name to the new one in one step.
+            param: connection [Connection]
+                   name [String]
+            return: None
+        """
+        if connection.name is not None:
+            self._unlink(connection)
+        connection.name = name
+        self.by_name.setdefault(name, []).append(connection)
+        self.by_fd[connection.fd] = connection
+
+    def remove(self, connection):
+        """ Remove the connection from both indexes.
+            param: connection [Connection]
+            return: None
+        """
+        if self.by_fd.get(connection.fd) is connection:
+            del self.by_fd[connection.fd]
+        if connection.name is not None:
+            self._unlink(connection)
+        for topic in list(connection.topics):
+            self.unsubscribe(connection, topic)
+
+    def subscribe(self, connection, topic):
+        """ Subscribe the connection to a topic.
+            param: connection [Connection]
+                   topic [String]
+            return: None
+        """
+        if topic not in connection.topics:
+            connection.topics.add(topic)
+            self.by_topic.setdefault(topic, []).append(connection)
+
+    def unsubscribe(self, connection, topic):
+        """ Cancel the subscription of the connection to a topic.
+            param: connection [Connection]
+                   topic [String]
+            return: None
+        """
+        if topic not in connection.topics:
+            return
+        connection.topics.discard(topic)
+        subscribers = self.by_topic[topic]
+        subscribers.remove(connection)
+        if not subscribers:
+            del self.by_topic[topic]
+
+    def recipients(self, name):
+        """ Return every connection that a message to name should be delivered to, i.e. the
+            clients with that name and the subscribers of the topic with that name.
+            param: name [String]
+            return: [list of Connection]
+        """
+        clients = self.by_name.get(name, ())
+        subscribers = self.by_topic.get(name)
+        if not subscribers:
+            return clients
+        return list(clients) + [connection for connection in subscribers
+                                if connection.name != name]
+
+    def lookup(self, name):
+        """ Return the connections registered under the client name.
+            param: name [String]
+            return: [list of Connection]
+        """
+        return self.by_name.get(name, ())
+
+    def get(self, fd):
+        """ Return the connection with the given file descriptor, if any.
+            param: fd [int]
+            return: [Connection or None]
+        """
+        return self.by_fd.get(fd)
+
+    def topics(self):
+        """ Return the topics that have at least one subscriber.
+            param: N/A
+            return: [list of String]
+        """
+        return list(self.by_topic)
+
+    def names(self):
+        """ Return the names of all the registered clients.
+            param: N/A
+            return: [list of String]
+        """
+        return list(self.by_name)
+
+    def _unlink(self, connection):
+        connections = self.by_name.get(connection.name)
+        if connections is None:
+            return
+        if connection in connections:
+            connections.remove(connection)
+        if not connections:
+            del self.by_name[connection.name]
@@ -2,161 +2,363 @@
     the system.
 """
 
+import json
 import platform
-import select
+import selectors
 import socket
 import traceback
 from datetime import datetime
 from multiprocessing import Process
 from subprocess import check_output
 
+from .framing import GAZE_MESSAGE, TERMINATOR, TEXT_MESSAGE, BinaryFrameBuffer, FramingError, \
+    encode_frame
+from .outbound import DROP_OLDEST, KEEP_ALL, OutboundQueue
+from .routing import Connection, RoutingTable
+
+
+def is_gaze(msg_type, payload):
+    """ Return True if a message only carries gaze, which may be dropped for a slow client since
+        newer gaze replaces it, e.g. 'data;{"P1GP": [0.3, 0.1]}' or a GAZE_MESSAGE.
+        param: msg_type [int, see framing.py]
+               payload [bytes]
+        return: [bool]
+    """
+    if msg_type == GAZE_MESSAGE:
+        return True
+    if msg_type != TEXT_MESSAGE:
+        return False
+    # The payload of a binary frame is a memoryview
+    payload = bytes(payload)
+    if not payload.startswith(b"data;") or b'GP"' not in payload:
+        return False
+    try:
+        fields = json.loads(payload[5:].decode("utf-8"))
+    except ValueError:
+        return False
+    return isinstance(fields, dict) and bool(fields) and all(key.endswith("GP") for key in fields)
+
 
 class Server(Process):
     """ A simple TCP server.
     """
-    def __init__(self, log_queue=None):
+    def __init__(self, log_queue=None, queue_policies=None, high_watermark=262144,
+                 low_watermark=65536, host=None, port=5000):
+        """ Constructor
+        param: log_queue [Queue]
+               queue_policies [dict, client name -> DROP_OLDEST or KEEP_ALL]
+               high_watermark, low_watermark [int, bytes queued for one client]
+               host [String, the address to listen on, None for the local ip]
+               port [int, 0 for any free port]
+        return: Server [Process]
+        """
         super(Server ,self).__init__()
         # Set log behaviour
         self.log_queue = log_queue
 
-        # List to keep track of socket descriptors
-        self.connection_dict = {}
-        self.new_connections = []
+        # Messages to a slow client are queued. Gaze may be dropped when the queue is full, the
+        # other messages are always delivered, and nothing is dropped for yumi.
+        self.queue_policies = {"yumi": KEEP_ALL}
+        if queue_policies:
+            self.queue_policies.update(queue_policies)
+        self.high_watermark = high_watermark
+        self.low_watermark = low_watermark
+
+        # Keep track of the client connections by name and by file descriptor
+        self.routing = RoutingTable()
+        # The selector is created in run() so that it belongs to the server process
+        self.selector = None
         self.recv_buffer = 4096 # Advisable to keep it as an exponent of 2
-        self.port = 5000
+        self.port = port
 
         self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
 
         # In order to get the correct (local) ip we need to detect which platform we are running on
-        server_address = self.get_local_ip(platform.system())
-        server_address = (server_address, self.port)
-        self.server_socket.bind(server_address)
+        if host is None:
+            host = self.get_local_ip(platform.system())
+        self.server_socket.bind((host, self.port))
         self.server_socket.listen(10)
+        self.port = self.server_socket.getsockname()[1]
 
-        # Add server socket to the list of readable connections
-        self.connection_dict["server"] = self.server_socket
         self.log("Server started at addr: {}, port:{} ".format(self.server_socket.getsockname()[0],\
                                                                self.server_socket.getsockname()[1]))
-        self.incomplete_message = ""
 
     def run(self):
-        """ The main loop of the server.
+        """ The main loop of the server. Every socket is registered with the selector once, when
+            it is accepted, and stays registered until it is removed. Each pass of the loop
+            therefore only touches the sockets that are actually ready.
         """
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(self.server_socket, selectors.EVENT_READ)
         while True:
-            # Get the list sockets which are ready to be read through select
-            all_connections = list(self.connection_dict.values()) + self.new_connections
-            read_sockets, _, _ = select.select(all_connections, [], [])
-
-            for sock in read_sockets:
+            for key, events in self.selector.select():
                 #New connection
-                if sock == self.server_socket:
-                    # Handle the case in which there is a new connection recieved through
-                    # server_socket
-                    sockfd, addr = self.server_socket.accept()
-                    self.new_connections.append(sockfd)
-                    self.log("Client (%s, %s) connected" % addr)
-
+                if key.fileobj is self.server_socket:
+                    self.accept()
+                    continue
+                connection = key.data
+                # The client is ready to receive more of its queued messages
+                if events & selectors.EVENT_WRITE:
+                    self.write(connection)
                 #Some incoming message from a client
-                else:
-                    # Data recieved from client, process it
-                    try:
-                        #In Windows, sometimes when a TCP program closes abruptly,
-                        # a "Connection reset by peer" exception will be thrown
-                        data = sock.recv(self.recv_buffer)
-                        if data:
-                            self.parse(sock, data)
-                    except:
-                        self.log("Client (%s, %s) is offline" % addr)
-                        traceback.print_exc()
-                        sock.close()
-                        self.remove_socket(sock)
-                        continue
+                if events & selectors.EVENT_READ and connection.sock.fileno() >= 0:
+                    self.read(connection)
 
         self.server_socket.close()
 
-    def remove_socket(self, socket_rem):
-        """ Remove a socket from the dictionary of sockets if they appear to be broken.
-        """
-        clients_to_pop = []
-        # Iterate through the dictionary to find the client to pop. Can't pop the clien during the
-        # iteration because the dictionary size will change and you will get the error:
-        # RuntimeError: dictionary changed size during iteration
-        # Instead save the clients to pop in the clients_to_pop list.
-        for client, sock in self.connection_dict.items():
-            if sock == socket_rem:
-                clients_to_pop.append(client)
-
-        # Now iterate through the clients_to_pop list and remove the clients from the dictionary.
-        if len(clients_to_pop) > 0:
-            for client in clients_to_pop:
-                self.connection_dict.pop(client, None)
-                self.log("Client: {} ".format(client) + "has been removed from the connection" \
-                         + "list, due to a broken socket.")
-
-    def parse(self, sock, data):
-        """ Split the data at figure out whether this is a new client presenting itself or a
-            message that should be sent to a specific clien.
+    def accept(self):
+        """ Accept a new connection on the server socket and register it with the selector.
+        """
+        sockfd, addr = self.server_socket.accept()
+        sockfd.setblocking(False)
+        connection = Connection(sockfd, addr)
+        connection.outbound = OutboundQueue(DROP_OLDEST, self.high_watermark, self.low_watermark)
+        stale = self.routing.add(connection)
+        if stale is not None:
+            self.log("Dropped stale connection {} on reused descriptor".format(stale))
+        self.selector.register(sockfd, selectors.EVENT_READ, connection)
+        self.log("Client (%s, %s) connected" % addr)
+
+    def read(self, connection):
+        """ Read whatever is available on a client socket and pass it on to the parser.
         """
-        data = data.decode("utf-8")
-        tmp = ""
-        # Clean up if the client sent faulty chars
-        for char in data:
-            if not ord(char) < 32 or ord(char) > 126:
-                tmp += char
-        in_data = tmp
-        data = in_data.split(";")
-        if data[0] == "close me":
-            self.remove_socket(sock)
-
-        if data[0] == "client_type":
-            self.log("A new client, '{}', has joined with addr {}".format(data[1], \
-                     sock.getpeername()))
-            # New client
-            for new_socket in self.new_connections:
-                if new_socket == sock:
-                    self.connection_dict[data[1]] = new_socket
-                    self.new_connections.remove(new_socket)
-                    return
-            self.log("Warning! The new client: {} was not found in".format(data[1]) \
-                     + " the list of connections")
+        try:
+            #In Windows, sometimes when a TCP program closes abruptly,
+            # a "Connection reset by peer" exception will be thrown
+            data = connection.sock.recv(self.recv_buffer)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            traceback.print_exc()
+            data = b""
+        if data:
+            self.parse(connection, data)
         else:
-            # A message that should be forwarded
-            sent = False
-            # Reatatch tail
-            if len(data) > 2:
-                data[1] = ";".join(data[1:])
-            # Check if the end-message symbol, $, is read, if not save the message.
-            if not in_data.endswith("$"):
-                self.incomplete_message += in_data
-                self.log("incomplete_message: {}".format(self.incomplete_message))
-                return
-            for client, recipient_socket in self.connection_dict.items():
-                if client == data[0]:
-                    sent = True
-                    self.send(recipient_socket, data[1])
+            # An empty read means that the client has closed the connection
+            self.log("Client (%s, %s) is offline" % connection.addr)
+            self.remove_connection(connection)
+
+    def remove_connection(self, connection):
+        """ Remove a connection from the routing table, unregister it from the selector and close
+            its socket.
+        """
+        self.routing.remove(connection)
+        if connection.name is not None:
+            self.log("Client: {} ".format(connection.name) + "has been removed from the " \
+                     + "connection list.")
+        if self.selector and connection.sock.fileno() >= 0:
+            try:
+                self.selector.unregister(connection.sock)
+            except KeyError:
+                pass
+        connection.sock.close()
+
+    def parse(self, connection, data):
+        """ Add the data to the receive buffer of the connection and handle every frame that has
+            been completed by it.
+        """
+        connection.frame_buffer.feed(data)
+        try:
+            frame = connection.frame_buffer.next_frame()
+            if frame is None and connection.frame_buffer.is_legacy_command():
+                # The handshake and "close me" are sent without the end-message symbol
+                frame = connection.frame_buffer.take_pending()
+            while frame is not None:
+                if isinstance(frame, bytes):
+                    self.handle_frame(connection, frame)
+                else:
+                    self.handle_binary_frame(connection, frame)
+                if connection.sock.fileno() < 0:
+                    # The connection was closed by the frame
                     break
-            if not sent:
-                if self.incomplete_message:
-                        # Try attaching the message with a previosly incomplete one
-                        new_data = self.incomplete_message + in_data
-                        self.incomplete_message = ""
-                        self.parse(None, new_data.encode("utf-8"))
-                elif len(data) > 1:
-                    self.log("Couldn't send '{}' to client '{}', client not in list.".format(data[1], data[0]))
-
-    def send(self, recipient_socket, message):
+                # The handshake may have replaced the frame buffer of the connection
+                frame = connection.frame_buffer.next_frame()
+        except FramingError as error:
+            self.log("Client '{}' sent a broken frame: {}".format(connection.name, error))
+            self.remove_connection(connection)
+
+    def handle_frame(self, connection, frame):
+        """ Split the frame and figure out whether this is a new client presenting itself or a
+            message that should be sent to a specific clien.
+        """
+        recipient, _, payload = frame.partition(b";")
+        recipient = recipient.decode("utf-8", "replace")
+        if recipient == "close me":
+            self.remove_connection(connection)
+            return
+
+        if recipient == "client_type":
+            self.handshake(connection, payload.decode("utf-8", "replace").split(";"))
+        elif recipient == "server":
+            # A request to the server itself
+            self.handle_request(connection, payload.decode("utf-8", "replace"))
+        else:
+            self.route(recipient, TEXT_MESSAGE, payload)
+
+    def handle_binary_frame(self, connection, frame):
+        """ Handle a frame from a client that uses binary framing. Only the header is read, the
+            payload is passed on as it is.
+        """
+        if frame.recipient == "close me":
+            self.remove_connection(connection)
+        elif frame.recipient == "server":
+            self.handle_request(connection, bytes(frame.payload).decode("utf-8", "replace"))
+        else:
+            self.route(frame.recipient, frame.msg_type, frame.payload, frame.raw)
+
+    def handshake(self, connection, fields):
+        """ Register a client that presents itself. The handshake may carry options after the
+            name, e.g. "client_type;hololens;topics=highlight,trajectory;framing=binary". A
+            connection under the same name that its client has already closed, e.g. of a client
+            that reconnected before the server read the end of its old connection, is removed.
+            A connection that is still open is kept next to the new one, which is logged unless
+            the option "multiple" says that the client expects others with its name, e.g.
+            "client_type;hololens;multiple" for one of several hololenses.
+        """
+        client = fields[0]
+        self.log("A new client, '{}', has joined with addr {}".format(client, connection.addr))
+        others = [other for other in self.routing.lookup(client) if other is not connection]
+        for other in others:
+            if self.closed_by_peer(other):
+                self.log("Removed the closed connection {} of client '{}'".format(other.addr,
+                                                                                 client))
+                self.remove_connection(other)
+            elif "multiple" not in fields[1:]:
+                self.log("Client '{}' is also connected from {}, both connections are kept"
+                         .format(client, other.addr))
+        self.routing.register(connection, client)
+        connection.outbound.policy = self.queue_policies.get(client, DROP_OLDEST)
+        for option in fields[1:]:
+            key, _, value = option.partition("=")
+            if key == "topics":
+                for topic in value.split(","):
+                    if topic:
+                        self.routing.subscribe(connection, topic)
+            elif key == "framing" and value == "binary" and not connection.binary:
+                # Everything after the handshake is binary
+                connection.binary = True
+                connection.frame_buffer = BinaryFrameBuffer(connection.frame_buffer.take_pending())
+
+    def closed_by_peer(self, connection):
+        """ Return True if the client has closed or reset the connection, without taking any data
+            from the socket.
+            param: connection [Connection]
+            return: [bool]
+        """
+        try:
+            return connection.sock.recv(1, socket.MSG_PEEK) == b""
+        except (BlockingIOError, InterruptedError):
+            return False
+        except OSError:
+            return True
+
+    def route(self, recipient, msg_type, payload, raw=None):
+        """ Forward a message to a client or to the subscribers of a topic. The message is encoded
+            at most once per framing and the same buffer is queued for every recipient.
+            param: recipient [String]
+                   msg_type [int, see framing.py]
+                   payload [bytes]
+                   raw [bytes, the binary frame as received, if any]
+            return: None
+        """
+        recipients = self.routing.recipients(recipient)
+        if not recipients:
+            self.log("Couldn't send a message to client '{}', client not in list.".format(\
+                     recipient))
+            return
+        text_message = None
+        binary_message = raw
+        droppable = is_gaze(msg_type, payload)
+        for recipient_connection in list(recipients):
+            if recipient_connection.binary:
+                if binary_message is None:
+                    binary_message = encode_frame(msg_type, recipient, payload)
+                self.send(recipient_connection, binary_message, droppable)
+            elif msg_type == TEXT_MESSAGE:
+                if text_message is None:
+                    text_message = bytes(payload) + TERMINATOR
+                self.send(recipient_connection, text_message, droppable)
+            else:
+                self.log("Can't send a binary message of type {} to text client '{}'".format(\
+                         msg_type, recipient_connection.name))
+        self.log("A message of {} bytes has been sent to '{}' ({} clients)".format(\
+                 len(payload), recipient, len(recipients)))
+
+    def reply(self, connection, message):
+        """ Send a message from the server itself to a client.
+            param: connection [Connection]
+                   message [String]
+            return: None
+        """
+        message = message.encode("utf-8")
+        if connection.binary:
+            self.send(connection, encode_frame(TEXT_MESSAGE, "server", message))
+        else:
+            self.send(connection, message + TERMINATOR)
+
+    def handle_request(self, connection, request):
+        """ Answer a request addressed to the server. The requests are
+                "server;queue_depth$"           the depth of the outbound queue of every client
+                "server;subscribe;<topic>$"     subscribe to a topic
+                "server;unsubscribe;<topic>$"   cancel a subscription
+        """
+        request = request.split(";")
+        if request[0] == "queue_depth":
+            self.reply(connection, "queue_depth;{}".format(json.dumps(self.queue_depths())))
+        elif request[0] == "subscribe" and len(request) > 1:
+            self.routing.subscribe(connection, request[1])
+            self.log("Client '{}' subscribed to '{}'".format(connection.name, request[1]))
+        elif request[0] == "unsubscribe" and len(request) > 1:
+            self.routing.unsubscribe(connection, request[1])
+            self.log("Client '{}' unsubscribed from '{}'".format(connection.name, request[1]))
+        else:
+            self.log("Unknown server request: {}".format(";".join(request)))
+
+    def send(self, connection, message, droppable=False):
         """ The send command handles the forwarding of messages to different clients of the system.
+            The message is queued for the client and as much as possible is written at once, the
+            rest is written when the selector reports the socket as writable.
+            param: connection [Connection]
+                   message [bytes]
+                   droppable [bool, if the message may be dropped when the client is too slow]
+            return: None
+        """
+        outbound = connection.outbound
+        was_empty = not outbound
+        had_backpressure = outbound.backpressure
+        dropped = outbound.push(message, droppable)
+        if dropped:
+            self.log("Dropped {} queued messages to client '{}'".format(dropped, connection.name))
+        elif outbound.backpressure and not had_backpressure:
+            self.log("Client '{}' is not keeping up, {} bytes queued".format(connection.name, \
+                     outbound.size))
+        if was_empty:
+            self.write(connection)
+
+    def write(self, connection):
+        """ Write the queued messages of a client and watch the socket for writability only while
+            there is something left in its queue.
         """
         try:
-            recipient_socket.send(message.encode('utf-8'))
-            for client, sock in self.connection_dict.items():
-                if sock == recipient_socket:
-                    self.log("A message '{}' has been sent to client '{}'".format(message, client))
-        except:
+            empty = connection.outbound.flush(connection.sock)
+        except OSError:
             # Broken socket connection may be, chat client pressed ctrl+c for example
-            recipient_socket.close()
-            self.remove_socket(recipient_socket)
+            self.remove_connection(connection)
+            return
+        events = selectors.EVENT_READ if empty else selectors.EVENT_READ | selectors.EVENT_WRITE
+        if self.selector.get_key(connection.sock).events != events:
+            self.selector.modify(connection.sock, events, connection)
+
+    def queue_depths(self):
+        """ Return the depth of the outbound queue of every client.
+            param: N/A
+            return: depths [dictionary, client name -> list of queue depths]
+        """
+        depths = {}
+        for name in self.routing.names():
+            depths[name] = [connection.outbound.depth() for connection in self.routing.lookup(name)]
+        return depths
 
     def get_local_ip(self, system):
         """ The socket.gethostbyname(socket.gethostname()) - method does, apparently, not work on
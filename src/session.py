@@ -0,0 +1,348 @@
+""" The dialogue state of the participants that interact with the robot. Every participant has a
+    Session with its own attention table, while the scene, i.e. the blocks reported in update
+    messages, is shared by all of them.
+"""
+import time
+
+from .attention import AttentionTable
+from .decoder import BlockUpdate
+from .disambiguation import apply_gaze
+from .timing_wheel import TimingWheel
+
+
+def hsv_to_string(hsv):
+    """ Return the name of the color with the given hue.
+        param: hsv [int, hue in degrees/2]
+        return: [String]
+    """
+    hsv *= 2
+    # Test if yellow
+    if hsv > 30 and hsv <= 90:
+        return "yellow"
+    # Test if green
+    elif hsv > 90 and hsv <= 180:
+        return "green"
+    elif hsv > 180 and hsv <= 300:
+        return "blue"
+    return "red"
+
+
+class Session(object):
+    """ The attention model of one participant. The settings, i.e. engine, known_attr,
+        likelihood_threshold, gaze_batch_size, gaze_latency, attention_window,
+        attention_half_life and attention_history, are read from config, the Interpreter or the
+        shard worker that owns the session, when they are used. Actions are
+        handed to send(recipient, message).
+    """
+    def __init__(self, participant, config, send):
+        self.participant = participant
+        self.config = config
+        self.send = send
+        # Gaze-only data messages waiting to be applied, and when the oldest of them arrived
+        self.pending_gaze = []
+        self.pending_since = None
+        self._reset()
+
+    def _reset(self):
+        self.current_action = "pick"
+        self.attention_table = AttentionTable(window=self.config.attention_window,
+                                              half_life=self.config.attention_half_life,
+                                              history_size=self.config.attention_history)
+        self.first_verbal = False
+        self.first_disamb = False
+
+    def handle(self, data):
+        """ Apply a data message of the participant, gaze-only messages are batched.
+            param: data [decoder.DataMessage]
+            return: None
+        """
+        if self._is_gaze(data):
+            self._queue_gaze(data.gaze)
+            return
+        # Everything else sees the gaze that arrived before it
+        self.flush_gaze()
+        self._disambiguate(data)
+
+    def _is_gaze(self, data):
+        """ Test if a data message only carries gaze, i.e. if it can be batched.
+        """
+        return self.config.gaze_batch_size > 1 and data.attributes is None and \
+            data.feedback is None
+
+    def _queue_gaze(self, attention_pos):
+        """ Add a gaze sample to the pending batch, and apply the batch if it is full or its
+            oldest sample has waited long enough.
+        """
+        if not self.pending_gaze:
+            self.pending_since = time.monotonic()
+        self.pending_gaze.append(attention_pos)
+        if len(self.pending_gaze) >= self.config.gaze_batch_size or \
+           time.monotonic() - self.pending_since >= self.config.gaze_latency:
+            self.flush_gaze()
+
+    def flush_gaze(self):
+        """ Apply the pending gaze samples together. This is the same as disambiguating the
+            samples one at a time, except that the likelihood threshold is only tested after the
+            last one.
+        """
+        if not self.pending_gaze:
+            return
+        positions = [pos for pos in self.pending_gaze if pos]
+        self.pending_gaze = []
+        apply_gaze(self.attention_table, positions)
+        self._test_if_execute()
+
+    def _disambiguate(self, data):
+        """ Apply a data message to the attention table.
+            param: data [decoder.DataMessage]
+            return: None
+        """
+        p1a = []
+        attention_pos = []
+        # Extract verbal requests
+        if data.attributes is not None:
+            p1a = [attr for attr in data.attributes if attr in self.config.known_attr]
+        # Extract gaze
+        if data.gaze is not None:
+            attention_pos = data.gaze
+        # Set the first_disamb flag to indicate that there exists information.
+        if p1a and self.attention_table:
+            self.first_disamb = True
+
+        # Filter and apply the gaze, the table keeps the likelihoods up to date
+        self.config.engine.disambiguate(self.attention_table, p1a, attention_pos)
+
+        # Test if the likelihood is high enough, if so execute command. If the likelihood is not
+        # high enough but there is a positive feedback in the feedback field then the action
+        # should be executed any way.
+        if data.feedback is not None:
+            if "yes" in data.feedback:
+                self._test_if_execute(th=0)
+            elif "no" in data.feedback:
+                self._forget_info()
+                return
+            else:
+                self._test_if_execute()
+        else:
+            self._test_if_execute()
+
+    def _forget_info(self):
+        """ Forget the information and start over.
+        """
+        self.attention_table.forget()
+        self.first_disamb = False
+
+    def _test_if_execute(self, th=None):
+        """ Test if the likelihood is high enough, if so send a execute command to YuMi.
+        """
+        if th is None:
+            th = self.config.likelihood_threshold
+
+        if not self.first_disamb:
+            return True
+        # Extract the block with the highest likelihood, after the gaze that is too old to count
+        # has been let go
+        self.attention_table.expire()
+        most_likely_block = self.attention_table.best()
+        if most_likely_block is not None and most_likely_block.lh >= th:
+            self.send("yumi", "{};{};{}".format(self.current_action,
+                                               most_likely_block.x,
+                                               most_likely_block.y))
+            self._reset()
+            return True
+        return False
+
+    def update(self, blocks):
+        """ Update the attention table, either add new blocks or edit their positions and colors.
+            param: blocks [list of decoder.BlockUpdate]
+            return: None
+        """
+        self.flush_gaze()
+        for new_block in blocks:
+            # Add the block or update it if it has been seen before, using its id.
+            block = self.attention_table.upsert(new_block.as_dict())
+            # Comform the HSV colors to string values.
+            if isinstance(block.c, int):
+                block.c = hsv_to_string(block.c)
+
+    def remove(self, bid):
+        """ Remove a block from the attention table.
+            param: bid [id of the block]
+            return: None
+        """
+        self.flush_gaze()
+        self.attention_table.remove(bid)
+
+    def state(self, now=None):
+        """ Return the dialogue state and the attention table, see AttentionTable.state().
+            param: now [float, as given by time.monotonic()]
+            return: [dictionary]
+        """
+        self.flush_gaze()
+        return {"participant": self.participant,
+                "current_action": self.current_action,
+                "first_verbal": self.first_verbal,
+                "first_disamb": self.first_disamb,
+                "attention_table": self.attention_table.state(now)}
+
+    def restore(self, state, now=None):
+        """ Continue from a state returned by state().
+            param: state [dictionary]
+                   now [float, as given by time.monotonic()]
+            return: None
+        """
+        self._reset()
+        self.current_action = state["current_action"]
+        self.first_verbal = state["first_verbal"]
+        self.first_disamb = state["first_disamb"]
+        self.attention_table.restore(state["attention_table"], now)
+
+
+class Sessions(object):
+    """ The sessions of the participants handled by one process, created when a participant is
+        first heard from. The blocks of every update message are kept in the scene, so that a
+        new session starts out with the blocks that have been seen so far. If config.object_ttl
+        is set, the blocks that have not been in an update message for that many seconds are
+        evicted from the scene and every session by evict().
+    """
+    def __init__(self, config, send):
+        self.config = config
+        self.send = send
+        self.sessions = {}
+        # Block id -> the latest values of the block, in the order the blocks were first seen
+        self.scene = {}
+        self.expiry = None
+        if config.object_ttl:
+            self.expiry = TimingWheel(config.object_ttl)
+        self.evicted = 0
+
+    def __len__(self):
+        return len(self.sessions)
+
+    def __iter__(self):
+        return iter(self.sessions.values())
+
+    def get(self, participant):
+        """ Return the session of a participant, created if it doesn't exist.
+            param: participant [int]
+            return: [Session]
+        """
+        session = self.sessions.get(participant)
+        if session is None:
+            session = Session(participant, self.config, self.send)
+            if self.scene:
+                session.update(self.scene.values())
+            self.sessions[participant] = session
+        return session
+
+    def update(self, blocks, now=None):
+        """ Apply an update message to the scene and to every session.
+            param: blocks [list of decoder.BlockUpdate]
+                   now [float, the time of the message as given by time.monotonic()]
+            return: None
+        """
+        if now is None:
+            now = time.monotonic()
+        for block in blocks:
+            known = self.scene.get(block.id)
+            self.scene[block.id] = block if known is None else known.merge(block)
+            if self.expiry is not None:
+                self.expiry.touch(block.id, now)
+        for session in self.sessions.values():
+            session.update(blocks)
+
+    def replace_scene(self, blocks, now=None):
+        """ Apply a scene message, the blocks in it are the whole scene and every other block is
+            removed.
+            param: blocks [list of decoder.BlockUpdate]
+                   now [float, the time of the message as given by time.monotonic()]
+            return: None
+        """
+        ids = set(block.id for block in blocks)
+        self.remove([bid for bid in self.scene if bid not in ids])
+        self.update(blocks, now)
+
+    def remove(self, bids):
+        """ Remove blocks from the scene and from every session.
+            param: bids [list of block ids]
+            return: None
+        """
+        for bid in bids:
+            if self.scene.pop(bid, None) is None:
+                continue
+            if self.expiry is not None:
+                self.expiry.discard(bid)
+            for session in self.sessions.values():
+                session.remove(bid)
+
+    def evict(self, now=None):
+        """ Remove the blocks that have not been seen for config.object_ttl seconds.
+            param: now [float, as given by time.monotonic()]
+            return: [list of the ids of the removed blocks]
+        """
+        if self.expiry is None or not self.scene:
+            return []
+        if now is None:
+            now = time.monotonic()
+        expired = self.expiry.expire(now)
+        for bid in expired:
+            del self.scene[bid]
+            for session in self.sessions.values():
+                session.remove(bid)
+        self.evicted += len(expired)
+        return expired
+
+    def state(self, now=None):
+        """ Return the scene and the state of every session, as plain lists and dictionaries that
+            can be stored as JSON.
+            param: now [float, as given by time.monotonic()]
+            return: [dictionary]
+        """
+        if now is None:
+            now = time.monotonic()
+        return {"scene": [list(block) for block in self.scene.values()],
+                "sessions": [session.state(now) for session in self.sessions.values()],
+                "evicted": self.evicted}
+
+    def restore(self, state, now=None):
+        """ Continue from a state returned by state(). The blocks of the scene count as seen now.
+            param: state [dictionary]
+                   now [float, as given by time.monotonic()]
+            return: None
+        """
+        if now is None:
+            now = time.monotonic()
+        self.sessions = {}
+        self.scene = {}
+        if self.expiry is not None:
+            self.expiry = TimingWheel(self.config.object_ttl)
+        for values in state["scene"]:
+            block = BlockUpdate(*values)
+            self.scene[block.id] = block
+            if self.expiry is not None:
+                self.expiry.touch(block.id, now)
+        for values in state["sessions"]:
+            session = Session(values["participant"], self.config, self.send)
+            session.restore(values, now)
+            self.sessions[session.participant] = session
+        self.evicted = state["evicted"]
+
+    def stats(self):
+        """ Return the number of blocks in the scene and the number that have been evicted.
+            param: N/A
+            return: [dictionary]
+        """
+        return {"objects": len(self.scene), "evicted": self.evicted}
+
+    def handle(self, data):
+        """ Apply a data message to the session of its participant.
+            param: data [decoder.DataMessage]
+            return: None
+        """
+        self.get(data.participant).handle(data)
+
+    def flush_gaze(self):
+        """ Apply the pending gaze of every session.
+        """
+        for session in self.sessions.values():
+            session.flush_gaze()
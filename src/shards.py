@@ -0,0 +1,145 @@
+""" Sharding of the participant sessions over worker processes. Every participant belongs to one
+    shard, participant % number of shards, and the data messages of a participant are handled,
+    in order, by the worker of its shard. Update messages go to every worker so that they all
+    see the same scene.
+"""
+import queue
+import threading
+from multiprocessing import Process, Queue
+
+from .session import Sessions
+
+
+class ShardWorker(Process):
+    """ A worker process with the sessions of one shard. The settings of the sessions are copied
+        from config, the Interpreter, when the worker is created. Actions are put in outbox as
+        (recipient, message).
+    """
+    def __init__(self, index, config, outbox):
+        super(ShardWorker, self).__init__()
+        self.daemon = True
+        self.index = index
+        self.engine = config.engine
+        self.known_attr = list(config.known_attr)
+        self.likelihood_threshold = config.likelihood_threshold
+        self.gaze_batch_size = config.gaze_batch_size
+        self.gaze_latency = config.gaze_latency
+        self.attention_window = config.attention_window
+        self.attention_half_life = config.attention_half_life
+        self.attention_history = config.attention_history
+        self.object_ttl = config.object_ttl
+        self.inbox = Queue()
+        self.outbox = outbox
+
+    def run(self):
+        sessions = Sessions(self, self._send)
+        while True:
+            # Handle everything that is waiting before the pending gaze is applied
+            items = [self.inbox.get()]
+            try:
+                while items[-1] is not None:
+                    items.append(self.inbox.get_nowait())
+            except queue.Empty:
+                pass
+            for item in items:
+                if item is None:
+                    sessions.flush_gaze()
+                    return
+                kind, records = item
+                if kind == "update":
+                    sessions.update(records)
+                elif kind == "scene":
+                    sessions.replace_scene(records)
+                elif kind == "remove":
+                    sessions.remove(records)
+                else:
+                    sessions.handle(records)
+            sessions.flush_gaze()
+            sessions.evict()
+
+    def _send(self, recipient, message):
+        self.outbox.put((recipient, message))
+
+
+class ShardPool(object):
+    """ The shard workers of an Interpreter. It is used like session.Sessions, the actions of
+        the workers are handed to send(recipient, message) from a background thread.
+    """
+    def __init__(self, workers, config, send):
+        self.send = send
+        self.outbox = Queue()
+        self.workers = [ShardWorker(i, config, self.outbox) for i in range(workers)]
+        self.forwarder = threading.Thread(target=self._forward, daemon=True)
+
+    def __len__(self):
+        return len(self.workers)
+
+    def start(self):
+        """ Start the workers.
+        """
+        for worker in self.workers:
+            worker.start()
+        self.forwarder.start()
+
+    def stop(self, timeout=1.0):
+        """ Let the workers finish what they have been given and stop them.
+        """
+        for worker in self.workers:
+            worker.inbox.put(None)
+        for worker in self.workers:
+            worker.join(timeout)
+        self.outbox.put(None)
+        self.forwarder.join(timeout)
+
+    def shard(self, participant):
+        """ Return the worker of a participant.
+            param: participant [int]
+            return: [ShardWorker]
+        """
+        return self.workers[participant % len(self.workers)]
+
+    def update(self, blocks):
+        """ Send an update message to every worker.
+            param: blocks [list of decoder.BlockUpdate]
+            return: None
+        """
+        for worker in self.workers:
+            worker.inbox.put(("update", blocks))
+
+    def replace_scene(self, blocks):
+        """ Send a scene message to every worker.
+            param: blocks [list of decoder.BlockUpdate]
+            return: None
+        """
+        for worker in self.workers:
+            worker.inbox.put(("scene", blocks))
+
+    def remove(self, bids):
+        """ Send the ids of removed blocks to every worker.
+            param: bids [list of block ids]
+            return: None
+        """
+        for worker in self.workers:
+            worker.inbox.put(("remove", bids))
+
+    def handle(self, data):
+        """ Send a data message to the worker of its participant.
+            param: data [decoder.DataMessage]
+            return: None
+        """
+        self.shard(data.participant).inbox.put(("data", data))
+
+    def flush_gaze(self):
+        # The workers apply their pending gaze when they run out of messages
+        pass
+
+    def evict(self):
+        # The workers evict the blocks that have not been seen after every batch of messages
+        return []
+
+    def _forward(self):
+        while True:
+            item = self.outbox.get()
+            if item is None:
+                break
+            self.send(*item)
@@ -0,0 +1,247 @@
+""" A uniform grid over the table plane for finding the objects closest to a position, e.g. the
+    block a gaze point falls on or the catalogue item an update message refers to.
+"""
+
+import math
+
+# Objects closer than this (in meters) to a reported position are taken to be the same object
+MATCH_TOLERANCE = 0.02
+
+
+class GridIndex(object):
+    """ Points, each with a key, bucketed into square cells of cell_size meters. Moving a point
+        only touches its old and new cell, and queries only look at the cells around the query
+        position, falling back to a scan of all points when that would be cheaper.
+        Ties in nearest() go to the point that was inserted first. A point at a position that
+        isn't finite, e.g. NaN, is kept but in no cell and is never found, and a query at such a
+        position finds nothing.
+    """
+    def __init__(self, cell_size=MATCH_TOLERANCE):
+        self.cell_size = float(cell_size)
+        # cell -> {key: (x, y)}
+        self.cells = {}
+        # key -> (x, y, cell, order), cell is None if the position isn't finite
+        self.points = {}
+        self.inserted = 0
+        # Bounding box of the occupied cells, may be larger than needed after removals
+        self.bounds = None
+
+    def __len__(self):
+        return len(self.points)
+
+    def __contains__(self, key):
+        return key in self.points
+
+    def _cell(self, x, y):
+        """ The cell of a position, or None if it isn't finite.
+        """
+        x = x / self.cell_size
+        y = y / self.cell_size
+        if not (math.isfinite(x) and math.isfinite(y)):
+            return None
+        return (math.floor(x), math.floor(y))
+
+    def insert(self, key, x, y):
+        """ Insert a point, or move it if the key is already in the index.
+            param: key [hashable]
+                   x, y [float]
+            return: None
+        """
+        x = float(x)
+        y = float(y)
+        cell = self._cell(x, y)
+        point = self.points.get(key)
+        if point is None:
+            order = self.inserted
+            self.inserted += 1
+        else:
+            order = point[3]
+            if point[2] != cell:
+                self._remove_from_cell(key, point[2])
+        self.points[key] = (x, y, cell, order)
+        if cell is None:
+            return
+        self.cells.setdefault(cell, {})[key] = (x, y)
+        if self.bounds is None:
+            self.bounds = [cell[0], cell[1], cell[0], cell[1]]
+        else:
+            bounds = self.bounds
+            bounds[0] = min(bounds[0], cell[0])
+            bounds[1] = min(bounds[1], cell[1])
+            bounds[2] = max(bounds[2], cell[0])
+            bounds[3] = max(bounds[3], cell[1])
+
+    move = insert
+
+    def extend(self, keys, xs, ys):
+        """ Insert many points, e.g. every item of a catalogue, faster than one insert() each.
+            param: keys [iterable of hashable]
+                   xs, ys [iterables of float]
+            return: None
+        """
+        cells = self.cells
+        points = self.points
+        size = self.cell_size
+        floor = math.floor
+        for key, x, y in zip(keys, xs, ys):
+            if key in points:
+                self.insert(key, x, y)
+                continue
+            x = float(x)
+            y = float(y)
+            column = x / size
+            row = y / size
+            if not (math.isfinite(column) and math.isfinite(row)):
+                self.insert(key, x, y)
+                continue
+            cell = (floor(column), floor(row))
+            points[key] = (x, y, cell, self.inserted)
+            self.inserted += 1
+            bucket = cells.get(cell)
+            if bucket is None:
+                cells[cell] = {key: (x, y)}
+            else:
+                bucket[key] = (x, y)
+        # The bounds of the occupied cells, once rather than for every point
+        if cells:
+            columns = [cell[0] for cell in cells]
+            rows = [cell[1] for cell in cells]
+            self.bounds = [min(columns), min(rows), max(columns), max(rows)]
+
+    def remove(self, key):
+        """ Remove a point.
+            param: key [hashable]
+            return: None
+        """
+        point = self.points.pop(key, None)
+        if point is not None:
+            self._remove_from_cell(key, point[2])
+        if not self.points:
+            self.bounds = None
+
+    def clear(self):
+        """ Remove all points.
+        """
+        self.cells = {}
+        self.points = {}
+        self.bounds = None
+
+    def _remove_from_cell(self, key, cell):
+        if cell is None:
+            return
+        bucket = self.cells[cell]
+        del bucket[key]
+        if not bucket:
+            del self.cells[cell]
+
+    def _ring(self, center, ring):
+        """ Generate the cells at Chebyshev distance ring from center.
+        """
+        cx, cy = center
+        if ring == 0:
+            yield center
+            return
+        for i in range(-ring, ring + 1):
+            yield (cx + i, cy - ring)
+            yield (cx + i, cy + ring)
+        for j in range(-ring + 1, ring):
+            yield (cx - ring, cy + j)
+            yield (cx + ring, cy + j)
+
+    def _max_ring(self, center):
+        """ The ring beyond which there are no occupied cells.
+        """
+        bounds = self.bounds
+        return max(center[0] - bounds[0], bounds[2] - center[0],
+                   center[1] - bounds[1], bounds[3] - center[1], 0)
+
+    def nearest(self, x, y, max_dist=None):
+        """ Find the point closest to (x, y).
+            param: x, y [float]
+                   max_dist [float, only points strictly closer than this are considered]
+            return: (key, dist) [or (None, None) if there is no such point]
+        """
+        x = float(x)
+        y = float(y)
+        center = self._cell(x, y)
+        if center is None or self.bounds is None:
+            return None, None
+        best = None
+        best_dist = max_dist
+        best_order = None
+        max_ring = self._max_ring(center)
+        visited = 0
+        ring = 0
+        while ring <= max_ring:
+            # Every point in this ring is at least (ring - 1) cells away
+            if best_dist is not None and (ring - 1) * self.cell_size > best_dist:
+                break
+            for cell in self._ring(center, ring):
+                bucket = self.cells.get(cell)
+                visited += 1
+                if not bucket:
+                    continue
+                for key, (px, py) in bucket.items():
+                    dist = math.hypot(px - x, py - y)
+                    if best_dist is None or dist < best_dist or \
+                       (dist == best_dist and best is not None and
+                        self.points[key][3] < best_order):
+                        best = key
+                        best_dist = dist
+                        best_order = self.points[key][3]
+            # Scanning rings of cells only pays off while it touches fewer cells than there are
+            # points, e.g. not for a position far outside the occupied area
+            if visited > len(self.points) * 4:
+                return self._scan(x, y, max_dist)
+            ring += 1
+        if best is None:
+            return None, None
+        return best, best_dist
+
+    def _scan(self, x, y, max_dist=None):
+        """ Find the closest point by looking at every point, in insertion order.
+        """
+        best = None
+        best_dist = max_dist
+        best_order = None
+        for key, (px, py, cell, order) in self.points.items():
+            if cell is None:
+                continue
+            dist = math.hypot(px - x, py - y)
+            if best_dist is None or dist < best_dist or \
+               (dist == best_dist and best is not None and order < best_order):
+                best = key
+                best_dist = dist
+                best_order = order
+        if best is None:
+            return None, None
+        return best, best_dist
+
+    def within(self, x, y, radius=MATCH_TOLERANCE):
+        """ Find the points within radius of (x, y).
+            param: x, y [float]
+                   radius [float]
+            return: [list of (key, dist), closest first]
+        """
+        x = float(x)
+        y = float(y)
+        low = self._cell(x - radius, y - radius)
+        high = self._cell(x + radius, y + radius)
+        if low is None or high is None:
+            return []
+        x_min, y_min = low
+        x_max, y_max = high
+        found = []
+        if (x_max - x_min + 1) * (y_max - y_min + 1) > len(self.points):
+            candidates = ((key, point[0], point[1]) for key, point in self.points.items()
+                          if point[2] is not None)
+        else:
+            candidates = ((key, px, py) for i in range(x_min, x_max + 1)
+                          for j in range(y_min, y_max + 1)
+                          for key, (px, py) in self.cells.get((i, j), {}).items())
+        for key, px, py in candidates:
+            dist = math.hypot(px - x, py - y)
+            if dist <= radius:
+                found.append((key, dist, self.points[key][3]))
+        found.sort(key=lambda item: (item[1], item[2]))
+        return [(key, dist) for key, dist, _ in found]
@@ -0,0 +1,95 @@
+""" A timing wheel for letting go of the objects that have not been seen for a while, e.g. the
+    blocks that have left the view of the camera.
+"""
+
+import math
+
+
+class TimingWheel(object):
+    """ Keys with the time they were last seen, expired ttl seconds later. The time is divided
+        into ticks of resolution seconds and every key is kept in the bucket of the tick it was
+        last seen in. The buckets form a ring that covers ttl, so seeing a key again only moves
+        it between two buckets and expire() only looks at the buckets that have run out, both
+        independent of the number of keys. A key is expired at most resolution seconds after
+        its ttl.
+    """
+    def __init__(self, ttl, resolution=None):
+        self.ttl = float(ttl)
+        self.resolution = float(resolution) if resolution else self.ttl / 8
+        # The ring has a bucket for every tick that can hold keys that have not expired
+        self.buckets = [set() for _ in range(int(math.ceil(self.ttl / self.resolution)) + 2)]
+        # key -> [time last seen, tick]
+        self.seen = {}
+        # The last tick whose bucket has been expired
+        self.expired_tick = None
+
+    def __len__(self):
+        return len(self.seen)
+
+    def __contains__(self, key):
+        return key in self.seen
+
+    def _tick(self, now):
+        return int(math.floor(now / self.resolution))
+
+    def last_seen(self, key):
+        """ Return the time a key was last seen, or None.
+            param: key [hashable]
+            return: [float or None]
+        """
+        entry = self.seen.get(key)
+        return None if entry is None else entry[0]
+
+    def touch(self, key, now):
+        """ Mark a key as seen.
+            param: key [hashable]
+                   now [float, seconds]
+            return: None
+        """
+        tick = self._tick(now)
+        if self.expired_tick is None:
+            self.expired_tick = tick - 1
+        entry = self.seen.get(key)
+        if entry is None:
+            self.seen[key] = [now, tick]
+        else:
+            if entry[1] != tick:
+                self.buckets[entry[1] % len(self.buckets)].discard(key)
+            entry[0] = now
+            entry[1] = tick
+        self.buckets[tick % len(self.buckets)].add(key)
+
+    def discard(self, key):
+        """ Forget a key without expiring it.
+            param: key [hashable]
+            return: None
+        """
+        entry = self.seen.pop(key, None)
+        if entry is not None:
+            self.buckets[entry[1] % len(self.buckets)].discard(key)
+
+    def expire(self, now):
+        """ Remove and return the keys that were last seen in a tick that ended ttl seconds ago.
+            param: now [float, seconds]
+            return: [list of keys, in no particular order]
+        """
+        if self.expired_tick is None:
+            return []
+        last = self._tick(now - self.ttl) - 1
+        if last <= self.expired_tick:
+            return []
+        expired = []
+        ring = len(self.buckets)
+        # After a long pause every bucket has run out, each is only looked at once
+        for tick in range(max(self.expired_tick + 1, last - ring + 1), last + 1):
+            bucket = self.buckets[tick % ring]
+            if not bucket:
+                continue
+            # Without calls to expire() a bucket may also hold keys seen a lap later
+            stale = [key for key in bucket if self.seen[key][1] <= last]
+            for key in stale:
+                del self.seen[key]
+                bucket.discard(key)
+            expired.extend(stale)
+        self.expired_tick = last
+        return expired
@@ -0,0 +1,124 @@
+import asyncio
+import itertools
+import random
+import time
+
+from src.async_client import AsyncClient, SyncClient
+from src.client import backoff_delays
+from src.framing import TERMINATOR
+
+
+def test_backoff_delays():
+    random.seed(0)
+    delays = list(itertools.islice(backoff_delays(base=0.1, maximum=10.0), 2000))
+    for attempt, delay in enumerate(delays):
+        assert 0 <= delay <= min(10.0, 0.1 * 2 ** min(attempt, 10))
+    # Jittered, and still growing to the maximum after a long outage
+    assert len(set(delays)) == len(delays)
+    assert max(delays[-100:]) > 5.0
+
+
+def test_pending_messages_are_a_bounded_ring():
+    client = AsyncClient("interpreter", host="127.0.0.1", buffer_size=3)
+    for i in range(5):
+        client.send("yumi", "pick;{}".format(i))
+    assert list(client.pending) == [b"yumi;pick;2$", b"yumi;pick;3$", b"yumi;pick;4$"]
+
+
+class Server(object):
+    """ A server that records what every connection sends, and closes the first connection
+        after the handshake.
+    """
+    def __init__(self):
+        self.connections = []
+        self.received = asyncio.Queue()
+
+    async def handle(self, reader, writer):
+        self.connections.append(writer)
+        data = b""
+        while True:
+            chunk = await reader.read(4096)
+            if not chunk:
+                break
+            data += chunk
+            while TERMINATOR in data:
+                frame, data = data.split(TERMINATOR, 1)
+                await self.received.put((len(self.connections), frame))
+                if frame == b"close me":
+                    writer.close()
+                    return
+                if len(self.connections) == 1:
+                    writer.close()
+                    return
+
+    async def next(self):
+        return await asyncio.wait_for(self.received.get(), 5)
+
+
+def test_reconnects_and_sends_what_was_buffered():
+    async def run():
+        server = Server()
+        listener = await asyncio.start_server(server.handle, "127.0.0.1", 0)
+        port = listener.sockets[0].getsockname()[1]
+        client = AsyncClient("interpreter", host="127.0.0.1", port=port, topics=["gaze"])
+        backoff = client.backoff = iter([0.2] * 10)
+        await client.connect()
+        assert await server.next() == (1, b"client_type;interpreter;topics=gaze")
+        # Closed by the server, the client waits for the backoff before reconnecting
+        while client.connected:
+            await asyncio.sleep(0.01)
+        disconnected = time.monotonic()
+        client.send("yumi", "pick;1")
+        assert list(client.pending) == [b"yumi;pick;1$"]
+        assert await server.next() == (2, b"client_type;interpreter;topics=gaze")
+        assert time.monotonic() - disconnected >= 0.15
+        assert await server.next() == (2, b"yumi;pick;1")
+        # The connection was short, so the backoff didn't start over
+        assert client.backoff is backoff
+        assert not client.pending
+        server.connections[-1].write(b"interpreter;hello$")
+        assert await asyncio.wait_for(client.__anext__(), 5) == "interpreter;hello"
+        await client.close()
+        assert await server.next() == (2, b"close me")
+        listener.close()
+        await listener.wait_closed()
+
+    asyncio.run(run())
+
+
+def test_gives_up_after_the_connection_attempts():
+    async def run():
+        listener = await asyncio.start_server(lambda reader, writer: None, "127.0.0.1", 0)
+        port = listener.sockets[0].getsockname()[1]
+        listener.close()
+        await listener.wait_closed()
+        client = AsyncClient("interpreter", host="127.0.0.1", port=port, connection_attempts=2)
+        try:
+            await client.connect()
+        except OSError:
+            return True
+        return False
+
+    assert asyncio.run(run())
+
+
+def test_sync_client_round_trip():
+    async def serve(reader, writer):
+        data = b""
+        while not data.endswith(b"pick;1$"):
+            data += await reader.read(4096)
+        writer.write(b"interpreter;done$")
+        await writer.drain()
+
+    loop = asyncio.new_event_loop()
+    listener = loop.run_until_complete(asyncio.start_server(serve, "127.0.0.1", 0))
+    port = listener.sockets[0].getsockname()[1]
+    client = SyncClient("interpreter", host="127.0.0.1", port=port)
+    client.start(timeout=5)
+    client.send("yumi", "pick;1")
+    message = loop.run_until_complete(loop.run_in_executor(None, client.receive, 5))
+    assert message == "interpreter;done"
+    client.close(timeout=5)
+    listener.close()
+    loop.run_until_complete(listener.wait_closed())
+    loop.close()
@@ -0,0 +1,155 @@
+import random
+
+import pytest
+
+from src.attention import AttentionTable, GazeHistory
+
+
+def check(table):
+    """ Compare the bookkeeping of the table with a recompute from its columns.
+    """
+    included = [slot for slot in range(len(table)) if table.include[slot]]
+    total = sum(table.at[slot] for slot in included)
+    assert table.n_included == len(included)
+    assert table.tot_att == pytest.approx(total, rel=1e-9, abs=1e-12)
+    if not len(table):
+        assert table.best() is None
+        return
+    best = max(included, key=table.at.__getitem__, default=0)
+    assert table.slots[table.best().id] == best
+    for slot in range(len(table)):
+        if slot not in included:
+            expected = 0.0
+        elif total:
+            expected = table.at[slot] / total
+        else:
+            expected = 1.0 / len(included)
+        assert table.likelihood(slot) == pytest.approx(expected, rel=1e-9, abs=1e-12)
+    assert [table.slots[bid] for bid in table.ids] == list(range(len(table)))
+
+
+@pytest.mark.parametrize("seed, window, half_life", [(0, None, None), (1, None, None),
+                                                     (2, 5.0, None), (3, None, 2.0),
+                                                     (4, 5.0, 2.0)])
+def test_bookkeeping_against_a_recompute(seed, window, half_life):
+    rng = random.Random(seed)
+    table = AttentionTable(window=window, half_life=half_life, history_size=50)
+    now = 0.0
+    for _ in range(3000):
+        now += rng.expovariate(10.0)
+        op = rng.random()
+        if op < 0.15 or not len(table):
+            bid = rng.randrange(30)
+            table.upsert({"id": bid, "x": rng.random(), "y": rng.random(),
+                          "c": rng.choice(["red", "blue"])})
+        elif op < 0.2:
+            table.remove(rng.choice(table.ids))
+        elif op < 0.3:
+            # A filter, as the interpreter applies them
+            table.set(rng.choice(table.ids), "include", rng.random() < 0.5)
+        elif op < 0.33:
+            table.set_include([rng.random() < 0.5 for _ in range(len(table))])
+        elif op < 0.35:
+            table.forget()
+        elif op < 0.37:
+            table.set(rng.choice(table.ids), "at", rng.choice([0, 1, 3]))
+        elif op < 0.4:
+            table.expire(now)
+        else:
+            # Gaze
+            slot = table.nearest(rng.random(), rng.random())
+            if slot is not None:
+                table.add_attention(slot, now)
+        check(table)
+
+
+def test_best_after_the_best_block_is_removed():
+    table = AttentionTable()
+    for bid in range(3):
+        table.upsert({"id": bid, "x": bid, "y": 0.0, "c": "red"})
+    table.add_attention(1)
+    table.add_attention(1)
+    table.add_attention(2)
+    assert table.best().id == 1
+    table.remove(1)
+    assert table.best().id == 2
+    table.set(2, "include", False)
+    assert table.best().id == 0
+    table.set(0, "include", False)
+    assert table.best().id == 0
+    assert table.likelihood(0) == 0.0
+    check(table)
+
+
+def test_gaze_history_ring_buffer():
+    history = GazeHistory(3)
+    assert [history.push(t, t, 1.0) for t in range(3)] == [None, None, None]
+    assert history.push(3, 3, 2.0) == (0, 1.0)
+    assert (len(history), history.oldest()) == (3, 1)
+    assert history.pop() == (1, 1.0)
+    history.push(4, 4, 1.0)
+    history.scale(0.5)
+    assert [history.pop() for _ in range(3)] == [(2, 0.5), (3, 1.0), (4, 0.5)]
+    assert len(history) == 0
+    history.push(5, 5, 1.0)
+    history.clear()
+    assert len(history) == 0
+
+
+def naive_likelihoods(table, hits, now, window, half_life, capacity):
+    """ The likelihoods from the hits alone: with a window the ones in the window among the
+        latest capacity hits, and every hit without, each weighted 2 ** (time / half_life).
+    """
+    at = dict.fromkeys(table.ids, 0.0)
+    if window is not None:
+        hits = hits[-capacity:]
+    for time, bid in hits:
+        if window is None or time > now - window:
+            at[bid] += 1.0 if half_life is None else 2.0 ** (time / half_life)
+    total = sum(at.values())
+    return [at[bid] / total if total else 1.0 / len(at) for bid in table.ids]
+
+
+@pytest.mark.parametrize("window, half_life, capacity", [(2.0, None, 1000), (2.0, None, 8),
+                                                         (None, 0.5, 1000), (4.0, 0.25, 1000),
+                                                         (4.0, 0.25, 16)])
+def test_window_and_half_life_against_a_naive_model(window, half_life, capacity):
+    rng = random.Random(0)
+    table = AttentionTable(window=window, half_life=half_life, history_size=capacity)
+    for bid in range(4):
+        table.upsert({"id": bid, "x": float(bid), "y": 0.0, "c": "red"})
+    hits = []
+    now = 0.0
+    rebased = False
+    # The weight is rebased every 64 half-lives
+    while now < 60.0:
+        now += rng.expovariate(20.0)
+        bid = rng.choice([0, 0, 1, 2, 3]) if now < 30.0 else rng.choice([2, 3, 3])
+        origin = table.origin
+        table.add_attention(table.slots[bid], now)
+        rebased = rebased or (origin is not None and table.origin != origin)
+        hits.append((now, bid))
+        if rng.random() < 0.1:
+            now += rng.choice([0.5, 3.0])
+            table.expire(now)
+            assert table.lh == pytest.approx(
+                naive_likelihoods(table, hits, now, window, half_life, capacity), rel=1e-6)
+        check(table)
+    table.expire(now)
+    assert table.lh == pytest.approx(
+        naive_likelihoods(table, hits, now, window, half_life, capacity), rel=1e-6)
+    assert len(table.history or ()) <= capacity
+    assert rebased == (half_life is not None)
+
+
+def test_window_expires_every_hit():
+    table = AttentionTable(window=1.0)
+    table.upsert({"id": 1, "x": 0.0, "y": 0.0, "c": "red"})
+    table.upsert({"id": 2, "x": 1.0, "y": 0.0, "c": "red"})
+    table.add_attention(0, 10.0)
+    table.add_attention(1, 10.5)
+    table.expire(11.0)
+    assert table.lh == [0.0, 1.0]
+    table.expire(11.5)
+    assert (table.at, table.tot_att, table.lh) == ([0, 0], 0, [0.5, 0.5])
+    check(table)
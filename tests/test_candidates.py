@@ -0,0 +1,84 @@
+import random
+from os.path import abspath, dirname, join
+
+import pytest
+
+from src.candidates import CandidateCursor
+from src.data_handler import DataHandler
+
+LEGO = join(dirname(dirname(abspath(__file__))), "lego")
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_cursor_against_a_list(seed):
+    """ Random assign, next, move, rank, clear and highlight calls against a list of the rows.
+    """
+    rng = random.Random(seed)
+    rows = [[str(i), rng.randrange(10)] for i in range(50)]
+    cursor = CandidateCursor(lambda row: row[0], lambda row: "{},{}".format(*row))
+    model = []
+    score = None
+    for _ in range(2000):
+        op = rng.random()
+        if op < 0.1:
+            cursor.clear()
+            model = []
+        elif op < 0.3:
+            model = rng.sample(rows, rng.randrange(len(rows)))
+            cursor.assign(model)
+            if score is not None:
+                model = sorted(model, key=score)
+        elif op < 0.5 and model:
+            assert cursor.peek() is model[0]
+            assert cursor.next() is model.pop(0)
+        elif op < 0.65:
+            row = rng.choice(rows)
+            row[1] = rng.randrange(10)
+            cursor.touch(row)
+        elif op < 0.7:
+            score = rng.choice([None, lambda row: row[1], lambda row: -int(row[0])])
+            cursor.rank(score)
+            if score is not None:
+                model = sorted(model, key=score)
+        else:
+            assert cursor.highlight() == [cursor.entry(row) for row in model]
+        assert list(cursor) == model
+        assert len(cursor) == len(model)
+
+
+@pytest.mark.parametrize("catalogue", ["Lego_DB1_shuffle1.csv", "Lego_DB2_shuffle1.csv"])
+def test_data_handler_offers_the_filter_in_order(catalogue):
+    """ The blocks offered and highlighted by a DataHandler against the rows selected by a scan
+        with _score().
+    """
+    rng = random.Random(catalogue)
+    data_handler = DataHandler(join(LEGO, catalogue))
+    words = ["red", "dark", "brick", "round", "2x4", "bright red", "green", "blue", "regular"]
+    model = []
+    score = None
+    for _ in range(300):
+        op = rng.random()
+        if op < 0.15:
+            data_handler.reset_filter()
+            model = []
+        elif op < 0.4:
+            data_handler.filter([rng.choice(words) for _ in range(rng.randrange(2))])
+            model = [row for row in data_handler.data if data_handler._score(row) >=
+                     len(data_handler.current_attributes)]
+            if score is not None:
+                model = sorted(model, key=score)
+        elif op < 0.55 and model:
+            assert data_handler.peek_next_block() == data_handler._block(model[0])
+            assert data_handler.get_next_block() == data_handler._block(model.pop(0))
+        elif op < 0.7:
+            row = data_handler.data[rng.randrange(len(data_handler.data))]
+            x = "{:.3f}".format(float(row[data_handler.x_idx]) + rng.choice([0.001, -0.001]))
+            data_handler.update({"x": x, "y": row[data_handler.y_idx]})
+        elif op < 0.75:
+            score = data_handler.distance_to(rng.random(), rng.random())
+            data_handler.rank(score)
+            model = sorted(model, key=score)
+        else:
+            entries = [data_handler._highlight_entry(row) for row in model]
+            assert data_handler.get_highlight() == entries
+        assert data_handler.get_all_considered() == [data_handler._block(row) for row in model]
@@ -0,0 +1,89 @@
+import random
+from array import array
+from os.path import abspath, dirname, join
+
+import pytest
+
+from src.attribute_index import AttributeIndex
+from src.catalogue import code_bits, load_catalogue
+from src.data_handler import DataHandler
+from src.spatial_index import GridIndex
+
+LEGO = join(dirname(dirname(abspath(__file__))), "lego")
+CATALOGUES = ["Lego_DB1_shuffle1.csv", "Lego_DB1_shuffle2.csv", "Lego_DB2_shuffle1.csv",
+              "Lego_DB2_shuffle2.csv"]
+
+
+@pytest.mark.parametrize("distinct", [1, 20, 256, 400])
+def test_code_bits(distinct):
+    rng = random.Random(distinct)
+    codes = array("I", [rng.randrange(distinct) for _ in range(3000)])
+    bits = code_bits(list(range(distinct)), codes)
+    assert bits == [sum(1 << row for row, code in enumerate(codes) if code == value)
+                    for value in range(distinct)]
+    assert code_bits(list(range(distinct)), array("I")) == [0] * distinct
+
+
+@pytest.mark.parametrize("catalogue", CATALOGUES)
+def test_index_from_the_columns(catalogue, tmp_path):
+    """ The attribute index made from the codes, read from the CSV and from the cache, against
+        the index made from the rows.
+    """
+    for _ in range(2):
+        columns = load_catalogue(join(LEGO, catalogue), str(tmp_path))
+        fields = [i for i, field in enumerate(columns.header) if field.startswith("#")]
+        rows = columns.rows()
+        expected = AttributeIndex([row[i] for i in fields] for row in rows)
+        index = AttributeIndex(columns.row_values(fields), columns.postings(fields))
+        assert index.postings == expected.postings
+        assert index.universe == expected.universe
+        assert [index.row_values[i] for i in range(len(rows))] == expected.row_values
+    assert columns.cached
+
+
+def test_row_values_follow_the_index():
+    columns = load_catalogue(join(LEGO, CATALOGUES[0]))
+    fields = [i for i, field in enumerate(columns.header) if field.startswith("#")]
+    index = AttributeIndex(columns.row_values(fields), columns.postings(fields))
+    index.set(3, ["purple"])
+    row = index.add(["purple", "brick"])
+    assert index.row_values[3] == {"purple"} and index.row_values[row] == {"purple", "brick"}
+    assert index.postings["purple"] == (1 << 3) | (1 << row)
+    assert len(index.row_values) == len(columns) + 1
+    with pytest.raises(IndexError):
+        index.row_values[row + 1]
+
+
+def test_grid_extend():
+    rng = random.Random(4)
+    points = [(rng.uniform(-1, 1), rng.uniform(-1, 1)) for _ in range(2000)]
+    inserted = GridIndex()
+    for key, (x, y) in enumerate(points):
+        inserted.insert(key, x, y)
+    extended = GridIndex()
+    extended.insert(5, 9.0, 9.0)
+    extended.extend(range(len(points)), *zip(*points))
+    inserted.insert(5, *points[5])
+    assert extended.points.keys() == inserted.points.keys()
+    assert extended.cells == inserted.cells
+    assert extended.nearest(0.1, 0.2) == inserted.nearest(0.1, 0.2)
+    assert extended.bounds == inserted.bounds
+
+
+@pytest.mark.parametrize("catalogue", CATALOGUES[::2])
+def test_data_handler_from_the_cache(catalogue, tmp_path):
+    path = join(LEGO, catalogue)
+    parsed = DataHandler(path)
+    DataHandler(path, cache_dir=str(tmp_path))
+    cached = DataHandler(path, cache_dir=str(tmp_path))
+    assert cached.data == parsed.data
+    for attributes in [["red"], ["brick", "dark"], ["regular"], ["round", "2x2"]]:
+        parsed.reset_filter()
+        cached.reset_filter()
+        assert list(cached.filter(attributes)) == list(parsed.filter(attributes))
+    row = parsed.data[7]
+    for handler in (parsed, cached):
+        handler.update({"x": row[handler.x_idx], "y": row[handler.y_idx]})
+        handler._set_cell(7, handler.searchable_fields_idx[0], "purple")
+        handler.reset_filter()
+        assert [block[handler.id_idx] for block in handler.filter(["purple"])] == ["7"]
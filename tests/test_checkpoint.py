@@ -0,0 +1,173 @@
+""" Tests of the checkpoint file and of saving and restoring the state of the sessions.
+"""
+import os
+
+import pytest
+
+from src.checkpoint import FILE_HEADER, SLOT_HEADER, Checkpoint
+from src.decoder import BlockUpdate
+from src.session import Sessions
+
+
+class Config(object):
+    likelihood_threshold = 1.2
+    known_attr = ["red", "blue", "green", "yellow"]
+    engine = None
+    gaze_batch_size = 1
+    attention_window = 10.0
+    attention_half_life = 2.0
+    attention_history = 64
+    object_ttl = None
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / "state.ckpt")
+    checkpoint = Checkpoint(path)
+    assert checkpoint.load() is None
+    for i in range(5):
+        checkpoint.save({"i": i, "blocks": list(range(i))})
+    checkpoint.close()
+    checkpoint = Checkpoint(path)
+    assert checkpoint.load() == {"i": 4, "blocks": [0, 1, 2, 3]}
+    # The sequence continues after the latest checkpoint, so the next one is the latest
+    checkpoint.save({"i": 5})
+    checkpoint.close()
+    assert Checkpoint(path).load() == {"i": 5}
+
+
+def test_grows_for_a_large_checkpoint(tmp_path):
+    path = str(tmp_path / "state.ckpt")
+    checkpoint = Checkpoint(path, capacity=64)
+    state = {"blocks": [str(i) * 10 for i in range(1000)]}
+    checkpoint.save({"small": True})
+    checkpoint.save(state)
+    checkpoint.close()
+    assert Checkpoint(path).load() == state
+
+
+def test_capacity_must_be_positive(tmp_path):
+    path = str(tmp_path / "state.ckpt")
+    with pytest.raises(ValueError):
+        Checkpoint(path, capacity=0)
+    # A file that has no room at all grows like any other
+    with open(path, "wb") as f:
+        f.write(FILE_HEADER.pack(b"ICKP", 1, 0))
+    checkpoint = Checkpoint(path)
+    checkpoint.save({"i": 1})
+    checkpoint.close()
+    assert Checkpoint(path).load() == {"i": 1}
+
+
+def test_torn_write_keeps_the_previous_checkpoint(tmp_path):
+    path = str(tmp_path / "state.ckpt")
+    checkpoint = Checkpoint(path)
+    checkpoint.save({"i": 1})
+    checkpoint.save({"i": 2})
+    # A third checkpoint whose payload was written over the oldest one, but not its header
+    start = checkpoint._offset(3 % 2) + SLOT_HEADER.size
+    checkpoint.map[start:start + 8] = b"\xff" * 8
+    checkpoint.close()
+    assert Checkpoint(path).load() == {"i": 2}
+
+
+def test_corrupt_latest_checkpoint_falls_back(tmp_path):
+    path = str(tmp_path / "state.ckpt")
+    checkpoint = Checkpoint(path)
+    checkpoint.save({"i": 1})
+    checkpoint.save({"i": 2})
+    start = checkpoint._offset(2 % 2) + SLOT_HEADER.size
+    checkpoint.map[start] ^= 0xFF
+    checkpoint.close()
+    assert Checkpoint(path).load() == {"i": 1}
+
+
+def test_torn_header_keeps_the_previous_checkpoint(tmp_path):
+    path = str(tmp_path / "state.ckpt")
+    checkpoint = Checkpoint(path)
+    checkpoint.save({"i": 1})
+    checkpoint.save({"i": 2})
+    # The sequence number of the latest slot half written
+    checkpoint.map[checkpoint._offset(0) + 4] ^= 0x01
+    checkpoint.close()
+    assert Checkpoint(path).load() == {"i": 1}
+
+
+@pytest.mark.parametrize("size", [FILE_HEADER.size, 20, 50, 100, 200])
+def test_short_file(tmp_path, size):
+    path = str(tmp_path / "state.ckpt")
+    checkpoint = Checkpoint(path)
+    checkpoint.save({"i": 1})
+    checkpoint.save({"i": 2})
+    checkpoint.close()
+    with open(path, "r+b") as f:
+        f.truncate(size)
+    # The slots cut short read as empty, a slot that is still whole is loaded
+    checkpoint = Checkpoint(path)
+    assert checkpoint.load() in (None, {"i": 2})
+    checkpoint.save({"i": 3})
+    checkpoint.close()
+    assert Checkpoint(path).load() == {"i": 3}
+
+
+@pytest.mark.parametrize("contents", [b"", b"ICKP", b"some notes\n" * 100])
+def test_other_file_is_not_replaced(tmp_path, contents):
+    path = str(tmp_path / "notes.txt")
+    with open(path, "wb") as f:
+        f.write(contents)
+    checkpoint = Checkpoint(path)
+    with pytest.raises(ValueError):
+        checkpoint.load()
+    with pytest.raises(ValueError):
+        checkpoint.save({"i": 1})
+    with open(path, "rb") as f:
+        assert f.read() == contents
+
+
+def test_other_version_is_not_replaced(tmp_path):
+    path = str(tmp_path / "state.ckpt")
+    with open(path, "wb") as f:
+        f.write(FILE_HEADER.pack(b"ICKP", 99, 64) + bytes(200))
+    with pytest.raises(ValueError):
+        Checkpoint(path).load()
+    assert os.path.getsize(path) == FILE_HEADER.size + 200
+
+
+def sessions_with_gaze(now):
+    sessions = Sessions(Config(), lambda recipient, msg: None)
+    sessions.update([BlockUpdate(i, 0.1 * i, 0.1, "red", None) for i in range(4)], now)
+    table = sessions.get(1).attention_table
+    for i, t in enumerate((now - 8, now - 4, now - 1, now)):
+        table.add_attention(table.slots[i % 2], t)
+    return sessions
+
+
+def test_sessions_round_trip(tmp_path):
+    sessions = sessions_with_gaze(100.0)
+    path = str(tmp_path / "state.ckpt")
+    checkpoint = Checkpoint(path)
+    checkpoint.save(sessions.state(100.0))
+    checkpoint.close()
+    restored = Sessions(Config(), lambda recipient, msg: None)
+    restored.restore(Checkpoint(path).load(), 100.0)
+    assert list(restored.scene) == list(sessions.scene)
+    before = sessions.get(1).attention_table
+    after = restored.get(1).attention_table
+    assert after.snapshot() == before.snapshot()
+
+
+@pytest.mark.parametrize("restored_at", [3.0, 100.0, 1e6])
+def test_times_are_restored_as_ages(restored_at):
+    # time.monotonic() starts over after a reboot, the ages of the hits are what is kept
+    state = sessions_with_gaze(100.0).state(100.0)
+    restored = Sessions(Config(), lambda recipient, msg: None)
+    restored.restore(state, restored_at)
+    reference = sessions_with_gaze(restored_at)
+    table = restored.get(1).attention_table
+    expected = reference.get(1).attention_table
+    assert list(table.history.times[:4]) == pytest.approx(list(expected.history.times[:4]))
+    assert table.origin == pytest.approx(expected.origin)
+    # 6 seconds later the hit of 8 seconds before is out of the 10 second window in both
+    table.expire(restored_at + 6)
+    expected.expire(restored_at + 6)
+    assert table.lh == pytest.approx(expected.lh)
+    assert table.at == pytest.approx(expected.at)
@@ -0,0 +1,93 @@
+import io
+import json
+import queue
+from urllib.request import urlopen
+
+from src.dashboard import CLEAR_BELOW, CLEAR_LINE, CLEAR_SCREEN, MOVE_TO, Dashboard, \
+    format_table
+
+
+class Terminal(io.StringIO):
+    def isatty(self):
+        return True
+
+
+def make_snapshot(lh, best=1, malformed=0):
+    return {"id": [2, 1], "x": [0.5, 0.25], "y": [0.1, 0.2], "c": ["red", "blue"],
+            "at": [1, 3], "include": [True, True], "lh": lh, "best": best, "action": "pick",
+            "decoder": {"decoded": 4, "fallbacks": 0, "malformed": malformed,
+                        "malformed_syntax": malformed},
+            "scene": {}}
+
+
+def test_format_table():
+    lines = format_table(make_snapshot([0.25, 0.75], malformed=2))
+    assert lines[0] == lines[-1] == "_" * 124
+    assert lines[1].split() == ["id", "x", "y", "c", "at", "include", "lh"]
+    # Sorted on id, the best block marked
+    assert lines[2].startswith("1 ") and lines[2].endswith("75.00%\t<==")
+    assert "[" + "|" * 37 + " " * 13 + "]" in lines[2]
+    assert lines[3].startswith("2 ") and "0.5000" in lines[3]
+    assert "Malformed messages: 2 syntax" in lines
+
+
+def test_only_the_changed_lines_are_redrawn():
+    dashboard = Dashboard(stream=Terminal())
+    first = format_table(make_snapshot([0.25, 0.75]))
+    dashboard._draw(first)
+    assert dashboard.stream.getvalue().startswith(CLEAR_SCREEN)
+    assert all(line + CLEAR_LINE in dashboard.stream.getvalue() for line in first)
+    second = format_table(make_snapshot([0.5, 0.5], best=2))
+    dashboard.stream = Terminal()
+    dashboard._draw(second)
+    changed = [i for i, line in enumerate(second) if line != first[i]]
+    assert changed == [2, 3]
+    assert dashboard.stream.getvalue() == "".join(MOVE_TO.format(i + 1) + second[i] + CLEAR_LINE
+                                                  for i in changed)
+    # The same frame again draws nothing, a shorter one clears what is below it
+    dashboard.stream = Terminal()
+    dashboard._draw(second)
+    assert dashboard.stream.getvalue() == ""
+    dashboard._draw(second[:2])
+    assert dashboard.stream.getvalue() == MOVE_TO.format(3) + CLEAR_BELOW
+
+
+def test_whole_frames_without_a_terminal():
+    dashboard = Dashboard(stream=io.StringIO())
+    lines = format_table(make_snapshot([0.25, 0.75]))
+    dashboard._draw(lines)
+    dashboard._draw(lines)
+    assert dashboard.stream.getvalue() == "\n".join(lines) + "\n"
+
+
+def test_publish_keeps_the_latest_snapshot():
+    dashboard = Dashboard(render=False)
+    for i in range(3):
+        dashboard.publish({"i": i})
+    assert dashboard.queue.get(timeout=1.0) == {"i": 2}
+    try:
+        dashboard.queue.get(timeout=0.1)
+        assert False, "More than one snapshot was kept"
+    except queue.Empty:
+        pass
+
+
+def test_http_endpoint():
+    dashboard = Dashboard(render=False, port=0)
+    server = dashboard._serve()
+    url = "http://127.0.0.1:{}/".format(dashboard.port)
+    try:
+        with urlopen(url, timeout=5) as response:
+            assert json.loads(response.read().decode("utf-8")) == {}
+        dashboard.latest = make_snapshot([0.25, 0.75])
+        with urlopen(url, timeout=5) as response:
+            assert response.headers["Content-Type"] == "application/json"
+            body = json.loads(response.read().decode("utf-8"))
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert [block["id"] for block in body["blocks"]] == [1, 2]
+    assert body["blocks"][0] == {"id": 1, "x": 0.25, "y": 0.2, "c": "blue", "at": 3,
+                                 "include": True, "lh": 0.75}
+    assert (body["best"], body["action"], body["scene"]) == (1, "pick", {})
+    assert body["decoder"]["decoded"] == 4
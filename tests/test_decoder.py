@@ -0,0 +1,84 @@
+import math
+
+import pytest
+
+from src.decoder import DEFAULT_PARTICIPANT, BlockUpdate, DataMessage, DecodeError, Decoder
+from src.framing import GAZE_MESSAGE, UPDATE_MESSAGE, BinaryFrameBuffer, encode_frame, \
+    pack_gaze, pack_update
+
+
+def frame(msg_type, payload):
+    frame_buffer = BinaryFrameBuffer()
+    frame_buffer.feed(encode_frame(msg_type, "interpreter", payload))
+    return frame_buffer.next_frame()
+
+
+def test_json_and_python_literals():
+    decoder = Decoder()
+    json_message = decoder.decode('update;{"id": 3, "x": 0.5, "y": 1, "c": "red", "s": true}')
+    literal_message = decoder.decode("update;{'id': 3, 'x': 0.5, 'y': 1, 'c': 'red', 's': True}")
+    assert json_message == literal_message
+    assert json_message.records == [BlockUpdate(3, 0.5, 1.0, "red", {"s": True})]
+    assert decoder.stats() == {"decoded": 2, "fallbacks": 1, "malformed": 0}
+
+
+def test_data_message_per_participant():
+    decoder = Decoder()
+    message = decoder.decode('data;{"P1GP": [0.3, 0.1], "P2A": ["red"], "P2N": 4, "t": 1.5}$')
+    assert message.kind == "data"
+    assert message.records == [DataMessage(1, None, [0.3, 0.1], None, {"t": 1.5}),
+                               DataMessage(2, ["red"], None, None, {"t": 1.5, "N": 4})]
+    message = decoder.decode('data;{"t": 1.5}')
+    assert message.records == [DataMessage(DEFAULT_PARTICIPANT, None, None, None, {"t": 1.5})]
+
+
+@pytest.mark.parametrize("message, reason", [
+    ("update;{\"id\": 3, \"x\": 0.5", "syntax"),
+    ("update;{'id': 3, 'x': foo}", "syntax"),
+    ("update;[1, 2]", "schema"),
+    ("update;{\"x\": 0.5}", "schema"),
+    ("update;{\"id\": true}", "schema"),
+    ("update;{\"id\": 3, \"x\": \"0.5\"}", "schema"),
+    ("update;{\"id\": 3, \"c\": 1.5}", "schema"),
+    ("update;{\"id\": 3, \"x\": NaN}", "schema"),
+    ("update;{\"id\": 3, \"y\": -Infinity}", "schema"),
+    ("update;{'id': 3, 'x': float('nan')}", "syntax"),
+    ("update;{\"id\": 3, \"x\": 1" + "0" * 400 + "}", "schema"),
+    ("scene", "schema"),
+    ("scene;{\"id\": 3}", "schema"),
+    ("delta", "schema"),
+    ("delta;[]", "schema"),
+    ("delta;{\"removed\": 3}", "schema"),
+    ("delta;{\"removed\": [0.5]}", "schema"),
+    ("data", "schema"),
+    ("data;[]", "schema"),
+    ("data;{\"P1A\": \"red\"}", "schema"),
+    ("data;{\"P1GP\": [0.3]}", "schema"),
+    ("data;{\"P1GP\": [0.3, Infinity]}", "schema"),
+    ("data;{\"P1F\": [1]}", "schema"),
+    ("update;{'id': 3, 1: 2}", "schema"),
+    ("data;{1: 2}", "schema"),
+    ("data;{'P1GP': [0.3, 0.1], (1, 2): 3}", "schema"),
+    ("move;{\"id\": 3}", "unknown"),
+])
+def test_malformed_messages_are_counted(message, reason):
+    decoder = Decoder()
+    with pytest.raises(DecodeError) as error:
+        decoder.decode(message)
+    assert error.value.reason == reason
+    stats = decoder.stats()
+    del stats["fallbacks"]
+    assert stats == {"decoded": 0, "malformed": 1, "malformed_" + reason: 1}
+
+
+def test_binary_frames_that_are_not_finite():
+    decoder = Decoder()
+    blocks = [{"id": 1, "x": 0.1, "y": 0.2, "c": 10}]
+    assert decoder.decode_frame(frame(UPDATE_MESSAGE, pack_update(blocks)))[0].records == \
+        [BlockUpdate(1, pytest.approx(0.1), pytest.approx(0.2), 10, None)]
+    with pytest.raises(DecodeError):
+        decoder.decode_frame(frame(UPDATE_MESSAGE, pack_update([dict(blocks[0], x=math.nan)])))
+    with pytest.raises(DecodeError):
+        decoder.decode_frame(frame(GAZE_MESSAGE, pack_gaze([(0.1, 0.2), (math.inf, 0.2)])))
+    assert decoder.stats() == {"decoded": 1, "fallbacks": 0, "malformed": 2,
+                               "malformed_schema": 2}
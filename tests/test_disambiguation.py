@@ -0,0 +1,53 @@
+import random
+
+import pytest
+
+from src.attention import AttentionTable
+from src.disambiguation import NumpyEngine, PythonEngine, make_engine
+
+COLORS = ["red", "blue", "green", "yellow", 120, None]
+
+
+def test_unknown_engine():
+    with pytest.raises(ValueError):
+        make_engine("fortran")
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_numpy_engine_matches_python_engine(seed):
+    pytest.importorskip("numpy")
+    rng = random.Random(seed)
+    engines = [PythonEngine(), NumpyEngine()]
+    # Two participants, so that the numpy engine has to notice the table it is given changed
+    tables = [[AttentionTable(), AttentionTable()] for _ in engines]
+    for _ in range(2000):
+        op = rng.random()
+        participant = rng.randrange(2)
+        if op < 0.2:
+            values = {"id": rng.randrange(40), "x": rng.uniform(-1, 1), "y": rng.uniform(-1, 1),
+                      "c": rng.choice(COLORS)}
+            for pair in tables:
+                pair[participant].upsert(dict(values))
+        elif op < 0.25 and tables[0][participant].ids:
+            bid = rng.choice(tables[0][participant].ids)
+            for pair in tables:
+                pair[participant].remove(bid)
+        elif op < 0.3 and tables[0][participant].ids:
+            bid = rng.choice(tables[0][participant].ids)
+            color = rng.choice(COLORS)
+            for pair in tables:
+                pair[participant].set(bid, "c", color)
+        elif op < 0.32:
+            for pair in tables:
+                pair[participant].forget()
+        else:
+            p1a = rng.sample(COLORS[:5] + ["purple"], rng.randrange(3))
+            gaze = [] if rng.random() < 0.2 else [rng.uniform(-1, 1), rng.uniform(-1, 1)]
+            for engine, pair in zip(engines, tables):
+                engine.disambiguate(pair[participant], p1a, gaze)
+        for python_table, numpy_table in zip(*tables):
+            assert numpy_table.snapshot() == python_table.snapshot()
+            assert numpy_table.n_included == python_table.n_included
+            assert numpy_table.tot_att == python_table.tot_att
+            if python_table:
+                assert numpy_table.best().id == python_table.best().id
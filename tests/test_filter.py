@@ -0,0 +1,124 @@
+import random
+from os.path import abspath, dirname, join
+
+import pytest
+
+from src.attribute_index import at_least, count_at_least, count_bits
+from src.data_handler import DataHandler
+from src.filter_cache import FilterCache, FilterResult
+
+LEGO = join(dirname(dirname(abspath(__file__))), "lego")
+CATALOGUES = ["Lego_DB1_shuffle1.csv", "Lego_DB2_shuffle2.csv"]
+
+
+def counts(digits, bits):
+    return [sum(((digit >> bit) & 1) << i for i, digit in enumerate(digits))
+            for bit in range(bits)]
+
+
+def test_count_bits():
+    rng = random.Random(1)
+    for _ in range(500):
+        bitsets = [rng.getrandbits(40) for _ in range(rng.randrange(20))]
+        expected = [sum((bits >> bit) & 1 for bits in bitsets) for bit in range(40)]
+        assert counts(count_bits(bitsets), 40) == expected
+        # Adding to the counter of an earlier call
+        split = rng.randrange(len(bitsets) + 1)
+        digits = count_bits(bitsets[split:], count_bits(bitsets[:split]))
+        assert counts(digits, 40) == expected
+
+
+def test_count_at_least():
+    rng = random.Random(2)
+    universe = (1 << 40) - 1
+    for _ in range(2000):
+        bitsets = [rng.getrandbits(40) for _ in range(rng.randrange(12))]
+        k = rng.randrange(-1, 14)
+        expected = sum(1 << bit for bit in range(40)
+                       if sum((bits >> bit) & 1 for bits in bitsets) >= k)
+        assert count_at_least(count_bits(bitsets), k, universe) == expected
+        assert at_least(bitsets, k, universe) == expected
+
+
+def scan(data_handler):
+    """ The rows selected by the scan that DataHandler.filter replaced.
+    """
+    k = len(data_handler.current_attributes)
+    return [row for row in data_handler.data if data_handler._score(row) >= k]
+
+
+@pytest.mark.parametrize("catalogue", CATALOGUES)
+def test_filter_against_the_scan(catalogue):
+    rng = random.Random(catalogue)
+    data_handler = DataHandler(join(LEGO, catalogue))
+    vocabulary = sorted(data_handler.attributes.postings)
+    words = vocabulary + ["red", "dark", "brick", "nonsense", "2x4", "bright red", "x"]
+    for _ in range(200):
+        data_handler.reset_filter()
+        for _ in range(rng.randrange(1, 4)):
+            data_handler.filter([rng.choice(words) for _ in range(rng.randrange(3))])
+            assert list(data_handler.current_filter) == scan(data_handler)
+    stats = data_handler.filters.stats()
+    assert stats["hits"] and stats["refinements"]
+
+
+@pytest.mark.parametrize("catalogue", CATALOGUES)
+@pytest.mark.parametrize("cache_size", [0, 2, 64])
+def test_filter_after_changes(catalogue, cache_size):
+    """ Random filters, changed cells and updates, the cached results must follow the changes.
+    """
+    rng = random.Random("{}{}".format(catalogue, cache_size))
+    data_handler = DataHandler(join(LEGO, catalogue), filter_cache_size=cache_size)
+    vocabulary = sorted(data_handler.attributes.postings)
+    words = vocabulary + ["red", "dark", "brick", "round", "2x4", "x", "purple", "roof"]
+    values = vocabulary + ["purple brick", "round roof", "dark red", "brick 9x9", "x"]
+    for _ in range(600):
+        if rng.random() < 0.15:
+            row = rng.randrange(len(data_handler.data))
+            field = rng.choice(data_handler.searchable_fields_idx)
+            data_handler._set_cell(row, field, rng.choice(values))
+        if rng.random() < 0.15:
+            row = data_handler.data[rng.randrange(len(data_handler.data))]
+            data_handler.update({"x": row[data_handler.x_idx], "y": row[data_handler.y_idx]})
+        if rng.random() < 0.3:
+            data_handler.reset_filter()
+        data_handler.filter([rng.choice(words) for _ in range(rng.randrange(3))])
+        assert list(data_handler.current_filter) == scan(data_handler)
+        if data_handler.current_filter and rng.random() < 0.2:
+            data_handler.get_next_block()
+    assert len(data_handler.filters) <= cache_size
+    if cache_size == 64:
+        assert data_handler.filters.invalidated
+
+
+def result(attributes, values, rows):
+    return FilterResult(attributes, frozenset(values), [], rows, [])
+
+
+def test_invalidate():
+    cache = FilterCache()
+    cache.put(result(("red",), {"red", "dark red"}, 0b0011))
+    cache.put(result(("brick",), {"brick 2x4"}, 0b0100))
+    cache.put(result(("roof",), {"roof tile"}, 0b0000))
+    # A row in a result
+    cache.invalidate(1)
+    assert ("red",) not in cache and len(cache) == 2
+    # A row that lost a value of a result
+    cache.invalidate(3, removed={"brick 2x4"})
+    assert ("brick",) not in cache
+    # A row that gained a value containing an attribute, and one that didn't
+    cache.invalidate(3, added={"flat tile"})
+    assert ("roof",) in cache
+    cache.invalidate(3, added={"roof 2x2"})
+    assert len(cache) == 0 and cache.invalidated == 3
+
+
+def test_least_recently_used_is_dropped():
+    cache = FilterCache(2)
+    for attributes in [("a",), ("b",)]:
+        cache.put(result(attributes, (), 0))
+    cache.get(("a",))
+    cache.put(result(("c",), (), 0))
+    assert ("a",) in cache and ("c",) in cache and ("b",) not in cache
+    assert cache.get(("b",)) is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
@@ -0,0 +1,93 @@
+import struct
+
+import pytest
+
+from src.framing import GAZE_MESSAGE, HEADER, MAX_FRAME_SIZE, TEXT_MESSAGE, BinaryFrameBuffer, \
+    FrameBuffer, FramingError, encode_frame, pack_gaze, unpack_gaze
+
+
+def test_header():
+    frame = encode_frame(GAZE_MESSAGE, "interpreter", b"payload")
+    assert HEADER.size == 6
+    assert frame[:HEADER.size] == b"\x00\x00\x00\x07\x02\x0b"
+    assert frame[HEADER.size:] == b"interpreterpayload"
+
+
+def test_text_frames_split_over_reads():
+    frame_buffer = FrameBuffer()
+    assert frame_buffer.frames(b"interpreter;da") == []
+    assert frame_buffer.frames(b"ta;{}") == []
+    assert frame_buffer.frames(b"$hololens;") == [b"interpreter;data;{}"]
+    assert len(frame_buffer) == len(b"hololens;")
+    assert frame_buffer.frames(b"x$") == [b"hololens;x"]
+    assert len(frame_buffer) == 0
+
+
+def test_text_frames_in_one_read():
+    frame_buffer = FrameBuffer()
+    assert frame_buffer.frames(b"a;1$b;2$\r\nc;3$d") == [b"a;1", b"b;2", b"c;3"]
+    assert frame_buffer.take_pending() == b"d"
+    assert frame_buffer.frames(b"$") == [b""]
+
+
+def test_terminator_split_over_reads():
+    frame_buffer = FrameBuffer(terminator=b"$$")
+    assert frame_buffer.frames(b"a;1$") == []
+    assert frame_buffer.frames(b"$b;2$$") == [b"a;1", b"b;2"]
+
+
+def test_legacy_commands():
+    frame_buffer = FrameBuffer()
+    frame_buffer.feed(b"client_type;hololens\n")
+    assert frame_buffer.next_frame() is None
+    assert frame_buffer.is_legacy_command()
+    assert frame_buffer.take_pending() == b"client_type;hololens\n"
+    frame_buffer.feed(b"close me")
+    assert frame_buffer.is_legacy_command()
+    frame_buffer.take_pending()
+    frame_buffer.feed(b"interpreter;close me")
+    assert not frame_buffer.is_legacy_command()
+    assert not BinaryFrameBuffer(b"close me").is_legacy_command()
+
+
+def test_binary_frames_split_over_reads():
+    first = encode_frame(GAZE_MESSAGE, "interpreter", pack_gaze([(0.1, 0.2), (0.3, 0.4)]))
+    data = first + encode_frame(TEXT_MESSAGE, "hololens", b"data;{}")
+    frame_buffer = BinaryFrameBuffer()
+    frames = []
+    for i in range(len(data)):
+        frames.extend(frame_buffer.frames(data[i:i + 1]))
+        assert len(frames) == (i >= len(first) - 1) + (i == len(data) - 1)
+    assert [(frame.msg_type, frame.recipient) for frame in frames] == \
+        [(GAZE_MESSAGE, "interpreter"), (TEXT_MESSAGE, "hololens")]
+    assert unpack_gaze(frames[0].payload) == [(0.1, 0.2), (0.3, 0.4)]
+    assert bytes(frames[1].payload) == b"data;{}"
+    assert b"".join(frame.raw for frame in frames) == data
+    assert len(frame_buffer) == 0
+
+
+def test_binary_frames_in_one_read():
+    data = b"".join(encode_frame(TEXT_MESSAGE, "r{}".format(i), str(i).encode())
+                    for i in range(5))
+    frame_buffer = BinaryFrameBuffer()
+    frames = frame_buffer.frames(data + data[:3])
+    assert [bytes(frame.payload) for frame in frames] == [b"0", b"1", b"2", b"3", b"4"]
+    assert frame_buffer.take_pending() == data[:3]
+
+
+def test_empty_binary_frame():
+    frame_buffer = BinaryFrameBuffer(encode_frame(TEXT_MESSAGE, "", b""))
+    frame = frame_buffer.next_frame()
+    assert (frame.recipient, bytes(frame.payload)) == ("", b"")
+    assert frame_buffer.next_frame() is None
+
+
+def test_oversized_binary_frame():
+    frame_buffer = BinaryFrameBuffer()
+    assert frame_buffer.frames(HEADER.pack(MAX_FRAME_SIZE, TEXT_MESSAGE, 0)) == []
+    frame_buffer = BinaryFrameBuffer()
+    with pytest.raises(FramingError):
+        frame_buffer.frames(HEADER.pack(MAX_FRAME_SIZE + 1, TEXT_MESSAGE, 0))
+    # A recipient that doesn't fit the header at all
+    with pytest.raises(struct.error):
+        encode_frame(TEXT_MESSAGE, "x" * 256, b"")
@@ -0,0 +1,68 @@
+import json
+import queue
+
+import pytest
+
+from src.decoder import DEFAULT_PARTICIPANT
+from src.framing import GAZE_MESSAGE, REMOVE_MESSAGE, SCENE_MESSAGE, TEXT_MESSAGE, \
+    UPDATE_MESSAGE, BinaryFrameBuffer, encode_frame, pack_gaze, pack_remove, pack_update
+from src.interpreter import Interpreter
+from src.shards import ShardPool
+
+
+def test_attention_table_of_the_default_participant():
+    interpreter = Interpreter(log_queue=queue.Queue(), dashboard=False)
+    session = interpreter.sessions.get(DEFAULT_PARTICIPANT)
+    assert interpreter.attention_table is session.attention_table
+
+
+def test_attention_table_with_workers():
+    interpreter = Interpreter(log_queue=queue.Queue(), dashboard=False, workers=2)
+    interpreter.sessions = ShardPool(2, interpreter, interpreter._send)
+    with pytest.raises(RuntimeError, match="2 worker processes"):
+        interpreter.attention_table
+
+
+def test_checkpoint_with_workers():
+    with pytest.raises(ValueError, match="not available with workers"):
+        Interpreter(log_queue=queue.Queue(), dashboard=False, workers=2, checkpoint="x.ckpt")
+
+
+def frame(msg_type, payload):
+    """ A frame as the interpreter receives it with binary framing.
+    """
+    frame_buffer = BinaryFrameBuffer()
+    frame_buffer.feed(encode_frame(msg_type, "interpreter", payload))
+    return frame_buffer.next_frame()
+
+
+def test_binary_frames_match_the_text_messages():
+    blocks = [{"id": 1, "x": 0.1, "y": 0.2, "c": 10}, {"id": 2, "x": 0.3, "y": 0.2, "c": 200},
+              {"id": 3, "x": 0.5, "y": 0.1, "c": 90}]
+    text = ["scene;{}".format(json.dumps(blocks)),
+            'delta;{"removed": [2]}',
+            "update;{}".format(json.dumps({"id": 4, "x": 0.7, "y": 0.3, "c": 30})),
+            'data;{"P1GP": [0.1, 0.2]}',
+            'data;{"P1GP": [0.7, 0.3]}']
+    binary = [frame(SCENE_MESSAGE, pack_update(blocks)),
+              frame(REMOVE_MESSAGE, pack_remove([2])),
+              frame(UPDATE_MESSAGE, pack_update([{"id": 4, "x": 0.7, "y": 0.3, "c": 30}])),
+              frame(GAZE_MESSAGE, pack_gaze([(0.1, 0.2), (0.7, 0.3)]))]
+    snapshots = []
+    for messages in (text, binary, [frame(TEXT_MESSAGE, message.encode()) for message in text]):
+        interpreter = Interpreter(log_queue=queue.Queue(), dashboard=False, gaze_batch_size=1)
+        for message in messages:
+            interpreter._parse(message)
+        interpreter.sessions.flush_gaze()
+        snapshots.append(interpreter.attention_table.snapshot())
+    assert [block["id"] for block in snapshots[0]] == [1, 3, 4]
+    assert snapshots[1] == snapshots[0]
+    assert snapshots[2] == snapshots[0]
+
+
+def test_broken_binary_frame_is_logged():
+    log_queue = queue.Queue()
+    interpreter = Interpreter(log_queue=log_queue, dashboard=False)
+    interpreter._parse(frame(SCENE_MESSAGE, b"\x00" * 5))
+    assert interpreter.decoder.malformed["syntax"] == 1
+    assert not log_queue.empty()
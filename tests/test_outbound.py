@@ -0,0 +1,104 @@
+import random
+
+import pytest
+
+from src.framing import GAZE_MESSAGE, TEXT_MESSAGE, UPDATE_MESSAGE
+from src.outbound import DROP_OLDEST, KEEP_ALL, OutboundQueue
+from src.server import is_gaze
+
+
+class Socket(object):
+    """ Accepts at most limit bytes per send.
+    """
+    def __init__(self):
+        self.limit = 0
+        self.received = bytearray()
+
+    def send(self, data):
+        if not self.limit:
+            raise BlockingIOError
+        sent = min(self.limit, len(data))
+        self.received += data[:sent]
+        return sent
+
+
+def test_only_droppable_frames_are_dropped():
+    queue = OutboundQueue(DROP_OLDEST, high_watermark=100, low_watermark=40)
+    frames = [(bytes([i]) * 10, i % 3 == 0) for i in range(30)]
+    dropped = sum(queue.push(frame, droppable) for frame, droppable in frames)
+    sock = Socket()
+    sock.limit = 1000
+    assert queue.flush(sock)
+    kept = [frame for frame, droppable in frames if not droppable]
+    # The 20 frames that must arrive are more than the high watermark, so every gaze is dropped
+    assert dropped == queue.dropped == 10
+    assert bytes(sock.received) == b"".join(kept)
+
+@pytest.mark.parametrize("policy", [DROP_OLDEST, KEEP_ALL])
+def test_random_pushes_and_flushes(policy):
+    """ The queue against a list of the frames, every frame not dropped is written whole and in
+        order, and only droppable frames are dropped.
+    """
+    rng = random.Random(policy)
+    queue = OutboundQueue(policy, high_watermark=200, low_watermark=50)
+    sock = Socket()
+    sent = []
+    for i in range(3000):
+        if rng.random() < 0.6:
+            frame = bytes([i % 256]) * rng.randint(1, 40)
+            droppable = rng.random() < 0.5
+            before = queue.dropped
+            queue.push(frame, droppable)
+            sent.append((i, frame, droppable))
+            assert queue.dropped == before or policy == DROP_OLDEST
+        else:
+            sock.limit = rng.choice([0, 1, 7, 30, 100])
+            queue.flush(sock)
+        assert queue.size == sum(len(entry[0]) for entry in queue.frames
+                                 if entry[0] is not None) - queue.offset
+        assert len(queue) == sum(entry[0] is not None for entry in queue.frames)
+    sock.limit = 10 ** 6
+    assert queue.flush(sock) and len(queue) == 0 and queue.size == 0
+    # Match the received bytes against the pushed frames, skipping droppable ones
+    received = bytes(sock.received)
+    position = 0
+    skipped = 0
+    for _, frame, droppable in sent:
+        if received.startswith(frame, position):
+            position += len(frame)
+        else:
+            assert droppable
+            skipped += 1
+    assert position == len(received)
+    assert skipped == queue.dropped
+    if policy == KEEP_ALL:
+        assert skipped == 0
+
+
+def test_partially_written_frame_is_finished():
+    queue = OutboundQueue(DROP_OLDEST, high_watermark=30, low_watermark=0)
+    sock = Socket()
+    queue.push(b"a" * 20, True)
+    sock.limit = 5
+    queue.flush(sock)
+    queue.push(b"b" * 20, True)
+    queue.push(b"c" * 20, True)
+    sock.limit = 100
+    queue.flush(sock)
+    assert bytes(sock.received) == b"a" * 20 + b"c" * 20
+
+
+@pytest.mark.parametrize("msg_type, payload, expected", [
+    (TEXT_MESSAGE, b'data;{"P1GP": [0.3, 0.1]}', True),
+    (TEXT_MESSAGE, b'data;{"P1GP": [0.3, 0.1], "P2GP": [0.1, 0.2]}', True),
+    (TEXT_MESSAGE, b'data;{"P1GP": [0.3, 0.1], "P1A": ["red"]}', False),
+    (TEXT_MESSAGE, b'data;{"P1F": ["yes"]}', False),
+    (TEXT_MESSAGE, b'data;{"P1GP": ', False),
+    (TEXT_MESSAGE, b'update;{"1GP": {"x": 1}}', False),
+    (TEXT_MESSAGE, b'highlight;1,2,3', False),
+    (GAZE_MESSAGE, b"", True),
+    (UPDATE_MESSAGE, b"", False),
+])
+def test_is_gaze(msg_type, payload, expected):
+    assert is_gaze(msg_type, payload) == expected
+    assert is_gaze(msg_type, memoryview(payload)) == expected
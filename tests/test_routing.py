@@ -0,0 +1,43 @@
+from src.routing import Connection, RoutingTable
+
+
+class Socket(object):
+    count = 0
+
+    def __init__(self):
+        Socket.count += 1
+        self.fd = Socket.count
+
+    def fileno(self):
+        return self.fd
+
+
+def connect(routing, name, topics=()):
+    connection = Connection(Socket(), ("127.0.0.1", Socket.count))
+    routing.add(connection)
+    for topic in topics:
+        routing.subscribe(connection, topic)
+    routing.register(connection, name)
+    return connection
+
+
+def test_connections_share_a_name():
+    routing = RoutingTable()
+    first = connect(routing, "hololens", topics=["highlight"])
+    second = connect(routing, "hololens")
+    assert routing.recipients("hololens") == [first, second]
+    assert routing.recipients("highlight") == [first]
+    routing.remove(first)
+    assert routing.recipients("hololens") == [second]
+    assert routing.topics() == []
+    assert len(routing) == 1
+
+
+def test_presenting_again_keeps_the_connection():
+    routing = RoutingTable()
+    connection = connect(routing, "architecture")
+    routing.register(connection, "architecture")
+    assert routing.recipients("architecture") == [connection]
+    routing.register(connection, "the_architecture")
+    assert routing.names() == ["the_architecture"]
+    assert routing.recipients("the_architecture") == [connection]
@@ -0,0 +1,78 @@
+import queue
+import selectors
+import socket
+import threading
+import time
+
+import pytest
+
+from src.async_client import SyncClient
+from src.server import Server
+
+
+@pytest.fixture
+def server():
+    server = Server(log_queue=queue.Queue(), host="127.0.0.1", port=0)
+    yield server
+    server.server_socket.close()
+
+
+def connect(server):
+    """ Connect a socket to the server and accept it, without running the server loop.
+    """
+    if server.selector is None:
+        server.selector = selectors.DefaultSelector()
+    sock = socket.create_connection(("127.0.0.1", server.port))
+    known = set(server.routing.by_fd.values())
+    server.accept()
+    connection, = set(server.routing.by_fd.values()) - known
+    return sock, connection
+
+
+def logged(server):
+    messages = []
+    while not server.log_queue.empty():
+        messages.append(server.log_queue.get())
+    return messages
+
+
+def test_closed_connection_is_replaced(server):
+    old_sock, old = connect(server)
+    server.parse(old, b"client_type;interpreter")
+    # The client reconnects before the server has read the end of the old connection
+    old_sock.close()
+    time.sleep(0.05)
+    sock, new = connect(server)
+    server.parse(new, b"client_type;interpreter")
+    assert list(server.routing.recipients("interpreter")) == [new]
+    assert old.sock.fileno() < 0
+    assert any("Removed the closed connection" in message for message in logged(server))
+    sock.close()
+
+
+@pytest.mark.parametrize("option, warned", [(b"", True), (b";multiple", False)])
+def test_open_connections_are_kept(server, option, warned):
+    first_sock, first = connect(server)
+    server.parse(first, b"client_type;hololens" + option)
+    second_sock, second = connect(server)
+    server.parse(second, b"client_type;hololens" + option)
+    assert list(server.routing.recipients("hololens")) == [first, second]
+    assert any("both connections are kept" in message
+               for message in logged(server)) == warned
+    first_sock.close()
+    second_sock.close()
+
+
+def test_two_clients_with_the_same_name(server):
+    """ Two live clients with the same name stay connected, neither evicts the other.
+    """
+    threading.Thread(target=server.run, daemon=True).start()
+    clients = [SyncClient("interpreter", host="127.0.0.1", port=server.port) for _ in range(2)]
+    for client in clients:
+        client.start()
+    time.sleep(1.0)
+    joined = [message for message in logged(server) if "has joined" in message]
+    assert len(joined) == 2
+    assert len(server.routing.lookup("interpreter")) == 2
+    for client in clients:
+        client.close()
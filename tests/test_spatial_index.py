@@ -0,0 +1,98 @@
+import math
+import random
+from os.path import abspath, dirname, join
+
+import pytest
+
+from src.attention import AttentionTable
+from src.data_handler import DataHandler
+from src.spatial_index import GridIndex
+
+LEGO = join(dirname(dirname(abspath(__file__))), "lego")
+CELL_SIZE = 0.05
+# Positions that aren't finite, that have no finite cell, or that are just far away
+NON_FINITE = [math.nan, math.inf, -math.inf, 1e308, -1e200]
+
+
+def findable(x, y):
+    return math.isfinite(x / CELL_SIZE) and math.isfinite(y / CELL_SIZE)
+
+
+def scan(points, x, y, max_dist=None):
+    """ The closest point as a linear scan finds it, ties to the first inserted.
+    """
+    best = None
+    if not findable(x, y):
+        return None, None
+    for order, (key, (px, py)) in enumerate(points.items()):
+        if not findable(px, py):
+            continue
+        dist = math.hypot(px - x, py - y)
+        if math.isfinite(dist) and (max_dist is None or dist < max_dist) and \
+                (best is None or dist < best[0]):
+            best = (dist, order, key)
+    return (None, None) if best is None else (best[2], best[0])
+
+
+def position(rng):
+    if rng.random() < 0.1:
+        return rng.choice(NON_FINITE), rng.uniform(-1, 1)
+    return rng.uniform(-1, 1), rng.uniform(-1, 1)
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_nearest_against_a_scan(seed):
+    rng = random.Random(seed)
+    index = GridIndex(cell_size=CELL_SIZE)
+    points = {}
+    for _ in range(1500):
+        op = rng.random()
+        if op < 0.4:
+            key = rng.randrange(200)
+            x, y = position(rng)
+            index.insert(key, x, y)
+            points[key] = (x, y)
+        elif op < 0.5 and points:
+            key = rng.choice(list(points))
+            index.remove(key)
+            del points[key]
+        else:
+            x, y = position(rng)
+            max_dist = rng.choice([None, 0.01, 0.1, 1.0])
+            assert index.nearest(x, y, max_dist) == scan(points, x, y, max_dist)
+            radius = rng.choice([0.02, 0.3])
+            found = set(key for key, _ in index.within(x, y, radius))
+            assert found == set(key for key, (px, py) in points.items()
+                                if findable(x - radius, y - radius) and
+                                findable(x + radius, y + radius) and findable(px, py) and
+                                math.hypot(px - x, py - y) <= radius)
+        assert len(index) == len(points)
+
+
+def test_extend_with_positions_that_are_not_finite():
+    index = GridIndex()
+    index.extend(range(4), [0.1, math.nan, math.inf, 0.3], [0.1, 0.2, 0.2, 1e308])
+    assert len(index) == 4
+    assert index.nearest(0.1, 0.2) == (0, pytest.approx(0.1))
+    assert index.nearest(math.nan, 0.2) == (None, None)
+    index.move(1, 0.1, 0.2)
+    assert index.nearest(0.1, 0.2) == (1, 0.0)
+
+
+def test_attention_table_with_a_position_that_is_not_finite():
+    table = AttentionTable()
+    table.upsert({"id": 1, "x": 0.1, "y": 0.1, "c": "red"})
+    table.upsert({"id": 2, "x": math.nan, "y": 0.1, "c": "red"})
+    assert table.nearest(0.1, 0.1) == table.slots[1]
+    assert table.nearest(math.inf, 0.1) is None
+    table.set(1, "x", math.inf)
+    assert table.nearest(0.1, 0.1, 1.0) is None
+    table.remove(2)
+
+
+def test_data_handler_update_that_is_not_finite():
+    data_handler = DataHandler(join(LEGO, "Lego_DB1_shuffle1.csv"))
+    data = [list(row) for row in data_handler.data]
+    for x, y in [("nan", "0.1"), ("inf", "0"), ("0.1", "-inf")]:
+        data_handler.update({"x": x, "y": y})
+    assert data_handler.data == data
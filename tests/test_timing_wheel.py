@@ -0,0 +1,72 @@
+import random
+
+import pytest
+
+from src.timing_wheel import TimingWheel
+
+# Times are multiples of 1/64 s so that the bounds below are exact
+STEP = 1 / 64.0
+
+
+@pytest.mark.parametrize("seed, ttl", [(0, 2.0), (1, 2.0), (2, 0.5)])
+def test_expired_within_ttl_and_a_resolution(seed, ttl):
+    rng = random.Random(seed)
+    wheel = TimingWheel(ttl)
+    assert wheel.resolution == ttl / 8
+    seen = {}
+    now = 0.0
+    for _ in range(5000):
+        # Mostly short steps, now and then a pause longer than a lap of the ring
+        now += STEP * (rng.randrange(4) if rng.random() < 0.99 else rng.randrange(1000))
+        if rng.random() < 0.6:
+            key = rng.randrange(50)
+            wheel.touch(key, now)
+            seen[key] = now
+        elif rng.random() < 0.05 and seen:
+            key = rng.choice(list(seen))
+            wheel.discard(key)
+            del seen[key]
+        else:
+            for key in wheel.expire(now):
+                # Never early
+                assert now - seen.pop(key) >= ttl
+            for key, last_seen in seen.items():
+                # At most a resolution late
+                assert now - last_seen < ttl + wheel.resolution
+                assert wheel.last_seen(key) == last_seen
+        assert len(wheel) == len(seen)
+        assert all(key in wheel for key in seen)
+
+
+def test_touch_again_keeps_a_key():
+    wheel = TimingWheel(1.0)
+    wheel.touch("a", 0.0)
+    wheel.touch("b", 0.0)
+    for now in (0.5, 1.0):
+        wheel.touch("a", now)
+        assert wheel.expire(now) == []
+    assert wheel.expire(1.25) == ["b"]
+    assert wheel.expire(2.0) == []
+    assert wheel.expire(2.125) == ["a"]
+    assert len(wheel) == 0
+
+
+def test_key_seen_a_lap_later_is_kept():
+    wheel = TimingWheel(1.0, resolution=0.25)
+    ring = len(wheel.buckets)
+    wheel.touch("a", 0.0)
+    # Same bucket a lap later, without calls to expire() in between
+    wheel.touch("b", ring * 0.25)
+    assert wheel.buckets[0] == {"a", "b"}
+    assert wheel.expire(ring * 0.25 + 0.5) == ["a"]
+    assert wheel.expire(ring * 0.25 + 1.25) == ["b"]
+
+
+def test_discard():
+    wheel = TimingWheel(1.0)
+    wheel.touch("a", 0.0)
+    wheel.discard("a")
+    wheel.discard("b")
+    assert "a" not in wheel
+    assert wheel.last_seen("a") is None
+    assert wheel.expire(10.0) == []